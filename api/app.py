@@ -3,15 +3,35 @@ import sys
 import uvicorn
 import asyncio
 import uuid
-from typing import Optional
+import time
+import shutil
+import json
+import queue
+import hashlib
+import re
+from typing import Optional, Literal, Dict, List, Union
 
 from src.components.data_ingestion import DataIngestion
 from src.components.data_transformation import DataTransformation
-from src.components.model_trainer import ModelTraining
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from src.components.embedding_cache import EmbeddingCache
+from src.components.worker_pool import WorkerPool, QueueFullError
+from src.components.job_queue import JobQueue
+from src.components.vector_store_registry import VectorStoreRegistry
+from src.components.answer_cache import AnswerCache
+from src.components.summary_cache import SummaryCache
+from src.components.summarizer import DocumentSummarizer
+from src.components.summary_index import SummaryIndex
+from src.components.upload_session import UploadSessions, UploadOffsetError
+from src.components.metrics import MetricsRegistry
+from src.components.query_batcher import QueryBatcher
+from src.components.model_trainer import ModelTraining, ChainFactory
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, ValidationError, field_validator
 from src.exception import CustomException
 from src.logger import logging
+from api.worker import start_workers
 from langserve import add_routes
 from langchain_core.runnables import RunnableLambda
 from langchain_community.document_loaders import (
@@ -23,6 +43,132 @@ from langchain_community.vectorstores import Chroma, FAISS, LanceDB
 # Set maximum file size to 1GB
 MAX_FILE_SIZE = 1 * 1024 * 1024 * 1024  # 1GB in bytes
 
+# Embedding is done in batches with a bounded pool of concurrent requests
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))
+EMBED_MAX_WORKERS = int(os.getenv("EMBED_MAX_WORKERS", 4))
+
+# Chunks are embedded by the Ollama server ("ollama") or in process on the CPU with
+# sentence-transformers ("local") or its ONNX runtime ("onnx"), using EMBEDDING_THREADS cores
+# and batches of about EMBEDDING_MAX_BATCH_TOKENS tokens
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "ollama")
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", 0))
+EMBEDDING_MAX_BATCH_TOKENS = int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", 16384))
+
+# FAISS stores can be quantized once built: "int8" scalar quantization, "ivfpq" (IVF with product
+# quantization, for large collections) or "auto" (ivfpq from IVFPQ_MIN_VECTORS vectors on, int8 below).
+# The best RESCORE_FACTOR * k candidates are re-ranked with the exact vectors, memory-mapped from disk
+VECTOR_COMPRESSION = os.getenv("VECTOR_COMPRESSION", "none")
+RESCORE_FACTOR = int(os.getenv("RESCORE_FACTOR", 4))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", 16))
+IVFPQ_MIN_VECTORS = int(os.getenv("IVFPQ_MIN_VECTORS", 50000))
+
+# Chunk embeddings are cached on disk so re-uploaded documents skip the embedding server
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "cache/embeddings.sqlite")
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", 500000))
+
+# Parsing runs in a process pool and embedding in a thread pool so the event loop stays free
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", 2))
+INDEX_WORKERS = int(os.getenv("INDEX_WORKERS", 4))
+MAX_QUEUE_DEPTH = int(os.getenv("MAX_QUEUE_DEPTH", 16))
+
+# Stream PDF pages, blocks of .txt files and .csv rows through split -> embed -> index instead of
+# loading the whole file first. Memory stays flat; PDF page ranges are still parsed in the process
+# pool, text and CSV are read in the indexing thread. .docx/.xlsx are always parsed in the pool
+STREAMING_INGESTION = os.getenv("STREAMING_INGESTION", "1") == "1"
+
+# PDFs are parsed in parallel page ranges, each job worker process uses its own pool of this size
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", 4))
+
+# Resumable uploads are sent in chunks of UPLOAD_CHUNK_SIZE bytes. txt uploads (and csv without
+# TABULAR_INGESTION) sent in one request are parsed and embedded while they are still arriving
+UPLOAD_SESSION_DIR = os.getenv("UPLOAD_SESSION_DIR", "temp/uploads")
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+OVERLAP_UPLOAD_PARSING = os.getenv("OVERLAP_UPLOAD_PARSING", "1") == "1"
+
+# Background uploads go through a SQLite job queue served by separate worker processes.
+# Set JOB_WORKERS=0 when workers are started on their own with `python -m api.worker`
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "cache/jobs.sqlite")
+JOB_TTL = int(os.getenv("JOB_TTL", 24 * 60 * 60))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 1))
+
+# Every upload becomes a named collection persisted under INDEX_DIR, loaded collections
+# are kept in memory up to INDEX_MEMORY_BUDGET_MB and evicted least recently used first
+INDEX_DIR = os.getenv("INDEX_DIR", "indexes")
+INDEX_MEMORY_BUDGET_MB = int(os.getenv("INDEX_MEMORY_BUDGET_MB", 2048))
+
+# Identical files indexed with the same splitter settings, embedding model and store type reuse
+# the existing collection. Once all collections take more than INDEX_DISK_BUDGET_MB on disk
+# the least recently used ones are deleted (0 keeps everything)
+INDEX_DISK_BUDGET_MB = int(os.getenv("INDEX_DISK_BUDGET_MB", 0))
+
+# Documents are split into chunks of CHUNK_TOKENS tokens overlapping by CHUNK_OVERLAP_TOKENS, cut at
+# paragraph, line, sentence or word boundaries by SPLIT_WORKERS threads. TEXT_SPLITTER=recursive uses
+# langchain's RecursiveCharacterTextSplitter with chunks of CHUNK_SIZE characters instead
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 2000))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 500))
+TEXT_SPLITTER = os.getenv("TEXT_SPLITTER", "tokens")
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", CHUNK_SIZE // 4))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", CHUNK_OVERLAP // 4))
+SPLIT_WORKERS = int(os.getenv("SPLIT_WORKERS", 4))
+
+# Answers are reused for near-duplicate questions on the same collection
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.95))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", 60 * 60))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 1000))
+
+# Chunks are retrieved from the vector store and a BM25 index fused with reciprocal rank fusion.
+# In "auto" mode bare lookups (quoted phrases, part numbers and codes) skip embedding the query
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "auto")
+HYBRID_VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", 1.0))
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", 1.0))
+RRF_K = int(os.getenv("RRF_K", 60))
+
+# Concurrent queries arriving within QUERY_BATCH_WAIT_MS of each other are embedded in one call per
+# model and searched with one matrix search per FAISS store, at most QUERY_BATCH_MAX_SIZE together.
+# The last QUERY_EMBED_CACHE_SIZE query embeddings are kept in memory (0 disables the cache)
+QUERY_BATCHING = os.getenv("QUERY_BATCHING", "1") == "1"
+QUERY_BATCH_WAIT_MS = float(os.getenv("QUERY_BATCH_WAIT_MS", 2))
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", 32))
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", 10000))
+
+# Defaults for the retrieval options a query can override: number of chunks, and the size
+# in tokens the retrieved context is packed into (0 means no limit)
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", 4))
+MAX_CONTEXT_TOKENS = int(os.getenv("MAX_CONTEXT_TOKENS", 0))
+
+# Overlapping neighbour chunks are merged before generation. With a SENTENCE_THRESHOLD above 0
+# sentences less similar to the query are dropped too, at the cost of embedding every sentence
+CONTEXT_COMPRESSION = os.getenv("CONTEXT_COMPRESSION", "1") == "1"
+SENTENCE_THRESHOLD = float(os.getenv("SENTENCE_THRESHOLD", 0))
+
+# Whole-document summaries are built map-reduce style with at most SUMMARY_MAX_WORKERS concurrent
+# LLM calls over passages of SUMMARY_GROUP_TOKENS. Intermediate summaries are cached on disk
+SUMMARY_CACHE_PATH = os.getenv("SUMMARY_CACHE_PATH", "cache/summaries.sqlite")
+SUMMARY_MAX_WORKERS = int(os.getenv("SUMMARY_MAX_WORKERS", 4))
+SUMMARY_GROUP_TOKENS = int(os.getenv("SUMMARY_GROUP_TOKENS", 3000))
+
+# With INGEST_SUMMARIES=1 page, section and document summaries are generated right after indexing.
+# Summarize queries are then answered from them without generation, and for large documents
+# retrieval is narrowed to the pages of the COARSE_SECTIONS sections closest to the query
+INGEST_SUMMARIES = os.getenv("INGEST_SUMMARIES", "0") == "1"
+COARSE_SECTIONS = int(os.getenv("COARSE_SECTIONS", 3))
+
+# .csv and .xlsx files are read as tables: rows are grouped into chunks of TABLE_CHUNK_TOKENS with
+# the column names on top, and the raw tables are kept so aggregate questions (counts, totals,
+# averages, highest/lowest) are computed instead of generated. TABULAR_INGESTION=0 restores the
+# row-per-document CSVLoader and UnstructuredExcelLoader
+TABULAR_INGESTION = os.getenv("TABULAR_INGESTION", "1") == "1"
+TABLE_CHUNK_TOKENS = int(os.getenv("TABLE_CHUNK_TOKENS", CHUNK_SIZE // 4))
+
+# Upload, ingestion, query and cache metrics are served in the Prometheus text format on /metrics.
+# Background job workers write theirs to METRICS_DIR after every job, they are added to the server's
+METRICS_DIR = os.getenv("METRICS_DIR", "cache/metrics")
+
+RETRIEVAL_OPTIONS = (
+    "mode", "k", "search_type", "fetch_k", "lambda_mult", "score_threshold", "filter", "max_context_tokens",
+    "compress", "sentence_threshold", "summaries", "coarse_sections", "tables"
+)
+
 app = FastAPI(
     title='RAG server',
     version='1.0',
@@ -61,10 +207,123 @@ models = {
     ".docx": "allam-2-7b"
 }
 
+embedding_options = {} if EMBEDDING_BACKEND == "ollama" else {
+    "threads": EMBEDDING_THREADS or None,
+    "max_batch_tokens": EMBEDDING_MAX_BATCH_TOKENS
+}
+
+compression = None if VECTOR_COMPRESSION == "none" else {
+    "method": VECTOR_COMPRESSION,
+    "rescore": RESCORE_FACTOR,
+    "nprobe": IVF_NPROBE,
+    "ivfpq_min_vectors": IVFPQ_MIN_VECTORS
+}
+
+embedding_cache = EmbeddingCache(path=EMBED_CACHE_PATH, max_entries=EMBED_CACHE_MAX_ENTRIES)
+worker_pool = WorkerPool(process_workers=PARSE_WORKERS, thread_workers=INDEX_WORKERS, max_queue_depth=MAX_QUEUE_DEPTH)
+job_queue = JobQueue(path=JOB_DB_PATH, ttl=JOB_TTL)
+summary_cache = SummaryCache(path=SUMMARY_CACHE_PATH)
+upload_sessions = UploadSessions(root_dir=UPLOAD_SESSION_DIR, max_file_size=MAX_FILE_SIZE)
+chain_factory = ChainFactory()
+query_batcher = QueryBatcher(
+    max_wait_ms=QUERY_BATCH_WAIT_MS,
+    max_batch_size=QUERY_BATCH_MAX_SIZE,
+    cache_size=QUERY_EMBED_CACHE_SIZE
+) if QUERY_BATCHING else None
+answer_cache = AnswerCache(
+    similarity=ANSWER_CACHE_SIMILARITY,
+    ttl=ANSWER_CACHE_TTL,
+    max_entries=ANSWER_CACHE_MAX_ENTRIES
+)
+
+metrics = MetricsRegistry(shared_directory=METRICS_DIR)
+upload_bytes = metrics.counter("rag_upload_bytes_total", "Bytes received by uploads")
+upload_seconds = metrics.histogram("rag_upload_seconds", "Time to receive an upload sent in one request")
+upload_rate = metrics.histogram(
+    "rag_upload_bytes_per_second", "Receive rate of uploads sent in one request",
+    buckets=[megabytes * 1024 * 1024 for megabytes in (1, 5, 10, 25, 50, 100, 250, 500, 1000)]
+)
+ingest_stage_seconds = metrics.histogram(
+    "rag_ingest_stage_seconds", "Time indexing a file waited on each pipeline stage", ["stage", "extension"]
+)
+ingest_seconds = metrics.histogram("rag_ingest_seconds", "Time to parse, split, embed and index a file", ["extension"])
+chunks_embedded = metrics.counter("rag_chunks_embedded_total", "Chunks sent to the embedding model", ["extension"])
+embedding_cache_lookups = metrics.counter("rag_embedding_cache_lookups_total", "Chunk embedding cache lookups", ["result"])
+query_stage_seconds = metrics.histogram("rag_query_stage_seconds", "Time spent in each stage of a query", ["stage"])
+query_seconds = metrics.histogram("rag_query_seconds", "Time to answer a query", ["answer_source"])
+llm_seconds = metrics.histogram("rag_llm_seconds", "Time to generate an answer", ["model"])
+llm_first_token_seconds = metrics.histogram("rag_llm_first_token_seconds", "Time from a streamed query to its first token", ["model"])
+llm_tokens = metrics.counter("rag_llm_tokens_total", "Estimated prompt and answer tokens of generated answers", ["model", "kind"])
+metrics.counter(
+    "rag_answer_cache_lookups_total", "Answer cache lookups", ["result"],
+    function=lambda: {("hit",): answer_cache.hits, ("miss",): answer_cache.misses}
+)
+metrics.counter(
+    "rag_summary_cache_lookups_total", "Summary cache lookups of summaries built by the server", ["result"],
+    function=lambda: {("hit",): summary_cache.hits, ("miss",): summary_cache.misses}
+)
+if query_batcher is not None:
+    metrics.counter(
+        "rag_query_embedding_cache_lookups_total", "Query embedding cache lookups", ["result"],
+        function=lambda: {("hit",): query_batcher.cache.hits, ("miss",): query_batcher.cache.misses} if query_batcher.cache else {}
+    )
+    metrics.counter("rag_query_batches_total", "Batched query embeddings and searches run", ["kind"],
+                    function=lambda: {(kind,): count for kind, count in query_batcher.batches.items()})
+    metrics.counter("rag_query_batched_requests_total", "Query embeddings and searches run in batches", ["kind"],
+                    function=lambda: {(kind,): count for kind, count in query_batcher.batched.items()})
+metrics.gauge("rag_queue_depth", "Uploads queued or running in the worker pool", function=lambda: worker_pool.depth)
+metrics.gauge("rag_queued_jobs", "Background uploads waiting for a job worker", function=lambda: job_queue.depth())
+
+def record_ingestion(extension, stats, parse_seconds=0.0):
+    """Metrics of one indexed file from its DataTransformation stats"""
+    stages = dict(stats.get("stage_seconds", {}))
+    stages["load"] = stages.get("load", 0.0) + parse_seconds
+    for stage, seconds in stages.items():
+        ingest_stage_seconds.observe(seconds, stage=stage, extension=extension)
+    ingest_seconds.observe(stats.get("seconds", 0.0) + parse_seconds, extension=extension)
+    chunks_embedded.inc(stats["cache_misses"], extension=extension)
+    embedding_cache_lookups.inc(stats["cache_hits"], result="hit")
+    embedding_cache_lookups.inc(stats["cache_misses"], result="miss")
+
+def record_query(trainer_obj):
+    """Metrics of one answered query from the timings of its ModelTraining"""
+    timings = trainer_obj.timings
+    for name, value in timings.items():
+        if name.endswith("_ms") and name not in ("total_ms", "first_token_ms"):
+            query_stage_seconds.observe(value / 1000, stage=name[:-3])
+    query_seconds.observe(timings["total_ms"] / 1000, answer_source=trainer_obj.answer_source or "generation")
+    if "generation_ms" not in timings:
+        return
+    model = trainer_obj.model
+    llm_seconds.observe(timings["generation_ms"] / 1000, model=model)
+    if "first_token_ms" in timings:
+        llm_first_token_seconds.observe(timings["first_token_ms"] / 1000, model=model)
+    llm_tokens.inc((trainer_obj.context_tokens or {}).get("prompt_after", 0), model=model, kind="prompt")
+    llm_tokens.inc(timings.get("answer_tokens", 0), model=model, kind="answer")
+
+def forget_collection(collection_id):
+    # Chains and answers built on a deleted or evicted collection must not be served again
+    chain_factory.invalidate(collection_id)
+    answer_cache.invalidate(collection_id)
+
+vector_store_registry = VectorStoreRegistry(
+    root_dir=INDEX_DIR,
+    databases=vector_db,
+    embeddings=vector_embeddings,
+    memory_budget_mb=INDEX_MEMORY_BUDGET_MB,
+    disk_budget_mb=INDEX_DISK_BUDGET_MB,
+    pipeline_config={
+        "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP, "text_splitter": TEXT_SPLITTER,
+        "chunk_tokens": CHUNK_TOKENS, "chunk_overlap_tokens": CHUNK_OVERLAP_TOKENS, "compression": VECTOR_COMPRESSION,
+        "tabular_ingestion": TABULAR_INGESTION, "table_chunk_tokens": TABLE_CHUNK_TOKENS
+    },
+    on_delete=forget_collection,
+    embedding_backend=EMBEDDING_BACKEND,
+    embedding_options=embedding_options
+)
+
 # Global variables
-db = None
-temp_path = None
-processing_status = {}
+job_workers = []
 
 @app.get("/")
 async def root():
@@ -72,132 +331,413 @@ async def root():
     return {
         "status": "running",
         "max_file_size_mb": MAX_FILE_SIZE / (1024 * 1024),
-        "max_file_size_gb": MAX_FILE_SIZE / (1024 * 1024 * 1024)
+        "max_file_size_gb": MAX_FILE_SIZE / (1024 * 1024 * 1024),
+        "workers": worker_pool.status(),
+        "queued_jobs": job_queue.depth(),
+        "collections": vector_store_registry.status()
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics of this server and its background job workers"""
+    content = await run_in_threadpool(metrics.render)
+    return PlainTextResponse(content, media_type="text/plain; version=0.0.4")
+
+@app.on_event("startup")
+def startup():
+    upload_sessions.cleanup()
+    metrics.clearShared()
+    job_workers.extend(start_workers(JOB_WORKERS, JOB_DB_PATH, JOB_TTL))
+
+@app.on_event("shutdown")
+def shutdown():
+    for worker in job_workers:
+        worker.terminate()
+    worker_pool.shutdown()
+    if query_batcher is not None:
+        query_batcher.close()
+    embedding_cache.close()
+    summary_cache.close()
+    job_queue.close()
+    vector_store_registry.close()
+
+async def save_upload(file, temp_path, on_chunk=None):
+    """
+    Write an upload to temp_path in chunks while hashing it.
+    Returns (size in bytes, sha256 hex digest); on_chunk is awaited with every chunk.
+    """
+    file_size = 0
+    chunk_size = 10 * 1024 * 1024  # 10MB chunks for faster processing
+    log_every = 100 * 1024 * 1024
+    next_log = log_every
+    hasher = hashlib.sha256()
+    start = time.perf_counter()
+    
+    logging.info(f"Starting upload: {file.filename}")
+    
+    # Write file in chunks
+    with open(temp_path, 'wb') as f:
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+            
+            file_size += len(chunk)
+            upload_bytes.inc(len(chunk))
+            
+            # Check size limit
+            if file_size > MAX_FILE_SIZE:
+                f.close()
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File too large. Maximum size is {MAX_FILE_SIZE / (1024**3):.1f}GB. "
+                           f"Your file is {file_size / (1024**3):.2f}GB"
+                )
+            
+            f.write(chunk)
+            hasher.update(chunk)
+            if on_chunk is not None:
+                await on_chunk(chunk)
+            
+            # Log progress for large files, every 100MB whatever size the chunks come in
+            if file_size >= next_log:
+                logging.info(f"Uploaded: {file_size / (1024**2):.1f}MB")
+                next_log = (file_size // log_every + 1) * log_every
+    
+    elapsed = time.perf_counter() - start
+    upload_seconds.observe(elapsed)
+    if elapsed > 0:
+        upload_rate.observe(file_size / elapsed)
+    logging.info(f"File saved successfully: {file_size / (1024**2):.2f}MB")
+    return file_size, hasher.hexdigest()
+
+def table_options(collection_path):
+    """DataIngestion options of the tabular path, tables are stored in the collection directory"""
+    if not TABULAR_INGESTION:
+        return {}
+    return {"table_chunk_tokens": TABLE_CHUNK_TOKENS, "table_directory": collection_path}
+
+def ingestion_documents(temp_path, collection_path):
+    """Streamed documents of the formats that can be read piece by piece, None for worker_pool.parse"""
+    if not STREAMING_INGESTION:
+        return None
+    ingestion = DataIngestion(
+        file_name=temp_path,
+        loaders=document_loaders,
+        executor=worker_pool.getProcessPool(),
+        **table_options(collection_path)
+    )
+    # Formats parsed whole (.docx, .xlsx, tables) stay in the process pool, off the indexing thread
+    return ingestion.lazyLoadFile() if ingestion.canLazyLoad() else None
+
+def duplicate_response(manifest, file_size, filename):
+    logging.info(f"Duplicate upload of {filename}, reusing collection {manifest['collection_id']}")
+    return {
+        "status": "success",
+        "message": "Identical file already indexed, reusing it",
+        "duplicate": True,
+        "file_size_mb": round(file_size / (1024**2), 2),
+        "documents_count": manifest["stats"].get("documents"),
+        "embedding": manifest["stats"],
+        "collection_id": manifest["collection_id"],
+        "filename": filename
+    }
+
+def build_summaries(collection_id, extension, embeddings):
+    """
+    Ingest-time page, section and document summaries of a collection. Returns their stats;
+    a failure only leaves the collection without summaries.
+    """
+    try:
+        docs = vector_store_registry.documentChunks(collection_id)
+        if not docs:
+            return None
+        model = models.get(extension)
+        summarizer = DocumentSummarizer(
+            llm=chain_factory.getLLM(model),
+            model=model,
+            cache=summary_cache,
+            max_workers=SUMMARY_MAX_WORKERS,
+            group_tokens=SUMMARY_GROUP_TOKENS
+        )
+        summary_index = SummaryIndex.build(summarizer, docs, embeddings)
+        vector_store_registry.setSummaryIndex(collection_id, summary_index)
+        return summary_index.stats
+    except Exception as e:
+        logging.error(f"Summaries for collection {collection_id} failed: {str(e)}")
+        return None
+
+def store_collection(collection_id, filename, extension, stats, digest, db, lexical_index):
+    """
+    Registers an indexed collection and keeps it loaded. Blocking (disk budget eviction,
+    loading the summary index and tables), so it runs in the worker pool threads.
+    """
+    vector_store_registry.register(collection_id, filename, extension, stats, digest)
+    vector_store_registry.put(collection_id, db, lexical_index)
+
+async def index_file(temp_path, filename, file_size, digest, documents=None, upload=None):
+    """
+    Index a saved upload into a new collection and return the upload response. upload, for
+    files indexed while they arrive, is a future of their (file_size, digest) once saved.
+    """
+    collection_id, collection_path = vector_store_registry.newCollection()
+    try:
+        with worker_pool.reserve():
+            # Data Ingestion
+            logging.info("Starting document ingestion...")
+            if documents is None:
+                documents = ingestion_documents(temp_path, collection_path)
+            parse_seconds = 0.0
+            if documents is None:
+                start = time.perf_counter()
+                documents = await worker_pool.parse(temp_path, document_loaders, **table_options(collection_path))
+                parse_seconds = time.perf_counter() - start
+                logging.info(f"Loaded {len(documents)} documents")
+            
+            # Data Transformation
+            logging.info("Starting document transformation and embedding...")
+            transformation_obj = DataTransformation(
+                documents=documents, 
+                file_name=temp_path, 
+                databases=vector_db, 
+                embeddings=vector_embeddings,
+                batch_size=EMBED_BATCH_SIZE,
+                max_workers=EMBED_MAX_WORKERS,
+                cache=embedding_cache,
+                persist_directory=collection_path,
+                chunk_size=CHUNK_SIZE,
+                chunk_overlap=CHUNK_OVERLAP,
+                text_splitter=TEXT_SPLITTER,
+                chunk_tokens=CHUNK_TOKENS,
+                chunk_overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                split_workers=SPLIT_WORKERS,
+                embedding_backend=EMBEDDING_BACKEND,
+                embedding_options=embedding_options,
+                compression=compression
+            )
+            db = await worker_pool.run(transformation_obj.transformDocuments)
+            if db is None:
+                raise HTTPException(status_code=422, detail="No text could be extracted from the file")
+            if upload is not None:
+                # Only known once the last byte arrived. A duplicate is discarded before it is
+                # registered, so it never counts against the disk budget or evicts the original
+                file_size, digest = await upload
+                duplicate = vector_store_registry.findByDigest(digest, transformation_obj.extension)
+                if duplicate is not None:
+                    shutil.rmtree(collection_path, ignore_errors=True)
+                    return duplicate_response(duplicate, file_size, filename)
+            await worker_pool.run(
+                store_collection, collection_id, filename, transformation_obj.extension,
+                transformation_obj.stats, digest, db, transformation_obj.lexical_index
+            )
+            record_ingestion(transformation_obj.extension, transformation_obj.stats, parse_seconds)
+            logging.info("Vector DB created successfully")
+            
+            summaries = None
+            if INGEST_SUMMARIES:
+                summaries = await worker_pool.run(build_summaries, collection_id, transformation_obj.extension, db.embeddings)
+    except BaseException:
+        shutil.rmtree(collection_path, ignore_errors=True)
+        raise
+    
+    return {
+        "status": "success",
+        "message": "File uploaded and processed successfully",
+        "duplicate": False,
+        "file_size_mb": round((file_size or 0) / (1024**2), 2),
+        "documents_count": transformation_obj.stats["documents"],
+        "embedding": transformation_obj.stats,
+        "summaries": summaries,
+        "collection_id": collection_id,
+        "filename": filename
+    }
+
+async def index_while_uploading(file, temp_path):
+    """
+    For formats that parse incrementally (txt/csv) the pipeline consumes the upload while
+    it is still arriving instead of waiting for the whole file. The hash is only known at
+    the end, so unlike other uploads a duplicate is still parsed and embedded; it is caught
+    before registration and the existing collection is returned.
+    """
+    feed = queue.Queue(maxsize=8)
+    upload = asyncio.get_running_loop().create_future()
+    documents = DataIngestion(file_name=temp_path, loaders=document_loaders).loadFromStream(iter(feed.get, None))
+    indexing = asyncio.ensure_future(index_file(temp_path, file.filename, None, None, documents=documents, upload=upload))
+    
+    async def put(chunk):
+        # Never block the event loop on a full queue, gives up once indexing has stopped
+        while not indexing.done():
+            try:
+                feed.put_nowait(chunk)
+                return True
+            except queue.Full:
+                await asyncio.sleep(0.005)
+        return False
+    
+    async def feed_chunk(chunk):
+        if not await put(chunk):
+            # Indexing failed (e.g. the queue is full), surface its error and stop the upload
+            indexing.result()
+    
+    try:
+        upload.set_result(await save_upload(file, temp_path, on_chunk=feed_chunk))
+    except BaseException as e:
+        # index_file discards its partial collection when the upload it waits for failed
+        upload.set_exception(e if isinstance(e, Exception) else RuntimeError("Upload interrupted"))
+        await put(None)
+        await asyncio.gather(indexing, return_exceptions=True)
+        raise
+    await put(None)
+    return await indexing
+
 @app.post("/upload")
 async def uploadFile(file: UploadFile = File(...)):
     """
     Upload large files (up to 1GB) with chunked reading
     """
+    temp_path = None
     try:
-        global db, temp_path
-        
         os.makedirs("temp", exist_ok=True)
-        temp_path = f"temp/{uuid.uuid4()}{os.path.splitext(file.filename)[1].lower()}"
-        
-        file_size = 0
-        chunk_size = 10 * 1024 * 1024  # 10MB chunks for faster processing
-        
-        logging.info(f"Starting upload: {file.filename}")
+        extension = os.path.splitext(file.filename)[1].lower()
+        temp_path = f"temp/{uuid.uuid4()}{extension}"
         
-        # Write file in chunks
-        with open(temp_path, 'wb') as f:
-            while True:
-                chunk = await file.read(chunk_size)
-                if not chunk:
-                    break
-                
-                file_size += len(chunk)
-                
-                # Check size limit
-                if file_size > MAX_FILE_SIZE:
-                    f.close()
-                    if os.path.exists(temp_path):
-                        os.remove(temp_path)
-                    raise HTTPException(
-                        status_code=413,
-                        detail=f"File too large. Maximum size is {MAX_FILE_SIZE / (1024**3):.1f}GB. "
-                               f"Your file is {file_size / (1024**3):.2f}GB"
-                    )
-                
-                f.write(chunk)
-                
-                # Log progress for large files
-                if file_size % (100 * 1024 * 1024) == 0:  # Log every 100MB
-                    logging.info(f"Uploaded: {file_size / (1024**2):.1f}MB")
+        if OVERLAP_UPLOAD_PARSING and (extension == ".txt" or (extension == ".csv" and not TABULAR_INGESTION)):
+            return await index_while_uploading(file, temp_path)
         
-        logging.info(f"File saved successfully: {file_size / (1024**2):.2f}MB")
+        file_size, digest = await save_upload(file, temp_path)
         
-        # Data Ingestion
-        logging.info("Starting document ingestion...")
-        ingestion_obj = DataIngestion(file_name=temp_path, loaders=document_loaders)
-        documents = ingestion_obj.loadFile()
-        logging.info(f"Loaded {len(documents)} documents")
-        
-        # Data Transformation
-        logging.info("Starting document transformation and embedding...")
-        transformation_obj = DataTransformation(
-            documents=documents, 
-            file_name=temp_path, 
-            databases=vector_db, 
-            embeddings=vector_embeddings
-        )
-        db = transformation_obj.transformDocuments()
-        logging.info("Vector DB created successfully")
+        # Identical files are caught by their hash before any parsing happens
+        duplicate = vector_store_registry.findByDigest(digest, extension)
+        if duplicate is not None:
+            return duplicate_response(duplicate, file_size, file.filename)
         
+        return await index_file(temp_path, file.filename, file_size, digest)
+    
+    except QueueFullError as qe:
+        raise HTTPException(status_code=503, detail=str(qe))
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logging.error(f"Upload error: {str(e)}")
+        raise CustomException(e, sys)
+    finally:
         # Clean up
-        if os.path.exists(temp_path):
+        if temp_path and os.path.exists(temp_path):
             os.remove(temp_path)
             logging.info("Temp file cleaned up")
+
+class UploadSessionRequest(BaseModel):
+    filename: str
+    size: int
+
+@app.post("/uploads")
+async def create_upload(request: UploadSessionRequest):
+    """Start a resumable chunked upload"""
+    try:
+        session = upload_sessions.create(request.filename, request.size)
+    except ValueError as ve:
+        raise HTTPException(status_code=413, detail=str(ve))
+    session["chunk_size"] = UPLOAD_CHUNK_SIZE
+    return session
+
+@app.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """How many bytes of a resumable upload have been received"""
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+@app.put("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, offset: int, request: Request):
+    """Append the raw request body at `offset`"""
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Offset must not be negative")
+    # The body is capped before it is read, a chunk never holds more than this in memory
+    limit = min(UPLOAD_CHUNK_SIZE, max(session["size"] - offset, 0))
+    too_large = f"Chunks take at most {limit} bytes at offset {offset}"
+    if int(request.headers.get("content-length") or 0) > limit:
+        raise HTTPException(status_code=413, detail=too_large)
+    parts = []
+    size = 0
+    async for part in request.stream():
+        size += len(part)
+        if size > limit:
+            raise HTTPException(status_code=413, detail=too_large)
+        parts.append(part)
+    data = b"".join(parts)
+    try:
+        received = await run_in_threadpool(upload_sessions.append, upload_id, offset, data)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except UploadOffsetError as oe:
+        raise HTTPException(status_code=409, detail={"message": str(oe), "received": oe.received})
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    upload_bytes.inc(len(data))
+    return {"upload_id": upload_id, "received": received}
+
+@app.post("/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str):
+    """Index a fully received upload, or reuse the collection of an identical file"""
+    temp_path = None
+    try:
+        session = upload_sessions.get(upload_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        extension = os.path.splitext(session["filename"])[1].lower()
+        temp_path = f"temp/{upload_id}{extension}"
+        try:
+            session, digest = await run_in_threadpool(upload_sessions.finish, upload_id, temp_path)
+        except UploadOffsetError as oe:
+            raise HTTPException(status_code=409, detail={"message": "Upload is incomplete", "received": oe.received})
+        except KeyError:
+            # Completed by an earlier request in the meantime
+            raise HTTPException(status_code=404, detail="Upload not found")
         
-        return {
-            "status": "success",
-            "message": "File uploaded and processed successfully",
-            "file_size_mb": round(file_size / (1024**2), 2),
-            "documents_count": len(documents),
-            "filename": file.filename
-        }
+        duplicate = vector_store_registry.findByDigest(digest, extension)
+        if duplicate is not None:
+            return duplicate_response(duplicate, session["size"], session["filename"])
+        return await index_file(temp_path, session["filename"], session["size"], digest)
     
+    except QueueFullError as qe:
+        raise HTTPException(status_code=503, detail=str(qe))
     except HTTPException as he:
         raise he
     except Exception as e:
-        # Clean up on error
-        if temp_path and os.path.exists(temp_path):
-            os.remove(temp_path)
         logging.error(f"Upload error: {str(e)}")
         raise CustomException(e, sys)
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
 
 @app.post("/upload-background")
-async def uploadFileBackground(
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...)
-):
+async def uploadFileBackground(file: UploadFile = File(...)):
     """
     Upload large files in background (for very large files > 100MB)
-    Returns immediately and processes asynchronously
+    Returns immediately, the file is processed by a worker process from the job queue
     """
     try:
         os.makedirs("temp", exist_ok=True)
-        temp_path = f"temp/{file.filename}"
-        job_id = f"{file.filename}_{os.getpid()}"
+        job_id = str(uuid.uuid4())
+        extension = os.path.splitext(file.filename)[1].lower()
+        temp_path = f"temp/{job_id}{extension}"
         
         # Save file first
-        file_size = 0
-        chunk_size = 10 * 1024 * 1024  # 10MB chunks
+        file_size, digest = await save_upload(file, temp_path)
         
-        with open(temp_path, 'wb') as f:
-            while True:
-                chunk = await file.read(chunk_size)
-                if not chunk:
-                    break
-                file_size += len(chunk)
-                
-                if file_size > MAX_FILE_SIZE:
-                    f.close()
-                    os.remove(temp_path)
-                    raise HTTPException(status_code=413, detail="File too large")
-                
-                f.write(chunk)
+        # An identical file that is already indexed is answered right away instead of queued
+        duplicate = vector_store_registry.findByDigest(digest, extension)
+        if duplicate is not None:
+            os.remove(temp_path)
+            return duplicate_response(duplicate, file_size, file.filename)
         
-        # Add processing to background
-        processing_status[job_id] = {"status": "processing", "progress": 0}
-        background_tasks.add_task(
-            process_file_background, 
-            temp_path, 
-            job_id,
-            file_size
-        )
+        job_queue.enqueue(file_path=temp_path, filename=file.filename, file_size=file_size, job_id=job_id, digest=digest)
         
         return {
             "status": "accepted",
@@ -206,82 +746,331 @@ async def uploadFileBackground(
             "check_status_url": f"/status/{job_id}"
         }
     
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logging.error(f"Background upload error: {str(e)}")
         raise CustomException(e, sys)
 
-async def process_file_background(file_path: str, job_id: str, file_size: int):
-    """Background task to process large files"""
+@app.get("/status/{job_id}")
+async def get_status(job_id: str):
+    """Check processing status for background uploads"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": job["progress"],
+        "filename": job["filename"],
+        "result": job["result"],
+        "error": job["error"]
+    }
+
+@app.post("/collections/{collection_id}/update")
+async def update_collection(collection_id: str, file: UploadFile = File(...)):
+    """
+    Re-index an edited version of a document into its existing collection.
+    Only chunks that are new are embedded, chunks that disappeared are deleted.
+    """
+    temp_path = None
     try:
-        global db, temp_path
-        temp_path = file_path
-        
-        processing_status[job_id]["progress"] = 25
+        manifest = vector_store_registry.manifest(collection_id)
+        existing_ids = vector_store_registry.chunkIds(collection_id) if manifest else None
+        if manifest is None:
+            raise HTTPException(status_code=404, detail="Collection not found")
+        if existing_ids is None:
+            raise HTTPException(status_code=409, detail="Collection has no chunk index, upload the file again instead")
         
-        # Ingestion
-        ingestion_obj = DataIngestion(file_name=file_path, loaders=document_loaders)
-        documents = ingestion_obj.loadFile()
+        if manifest.get("embedding_backend", "ollama") != EMBEDDING_BACKEND:
+            raise HTTPException(status_code=409, detail="Collection was embedded with another backend, upload the file again instead")
         
-        processing_status[job_id]["progress"] = 50
+        extension = os.path.splitext(file.filename)[1].lower()
+        if extension and extension != manifest["extension"]:
+            raise HTTPException(status_code=400, detail=f"Collection holds a {manifest['extension']} file")
         
-        # Transformation
-        transformation_obj = DataTransformation(
-            documents=documents,
-            file_name=file_path,
-            databases=vector_db,
-            embeddings=vector_embeddings
-        )
-        db = transformation_obj.transformDocuments()
+        os.makedirs("temp", exist_ok=True)
+        temp_path = f"temp/{uuid.uuid4()}{manifest['extension']}"
+        file_size, digest = await save_upload(file, temp_path)
         
-        processing_status[job_id]["progress"] = 90
+        # Concurrent updates of one collection would diff against the same chunk ids
+        async with vector_store_registry.updateLock(collection_id):
+            existing_ids = vector_store_registry.chunkIds(collection_id)
+            if vector_store_registry.manifest(collection_id) is None or existing_ids is None:
+                raise HTTPException(status_code=404, detail="Collection not found")
+            
+            with worker_pool.reserve():
+                db, _ = await worker_pool.run(vector_store_registry.get, collection_id)
+                lexical_index = await worker_pool.run(vector_store_registry.lexicalIndex, collection_id)
+                collection_path = vector_store_registry.path(collection_id)
+                documents = ingestion_documents(temp_path, collection_path)
+                parse_seconds = 0.0
+                if documents is None:
+                    start = time.perf_counter()
+                    documents = await worker_pool.parse(temp_path, document_loaders, **table_options(collection_path))
+                    parse_seconds = time.perf_counter() - start
+            
+                transformation_obj = DataTransformation(
+                    documents=documents,
+                    file_name=temp_path,
+                    databases=vector_db,
+                    embeddings=vector_embeddings,
+                    batch_size=EMBED_BATCH_SIZE,
+                    max_workers=EMBED_MAX_WORKERS,
+                    cache=embedding_cache,
+                    persist_directory=collection_path,
+                    existing_db=db,
+                    existing_ids=existing_ids,
+                    chunk_size=CHUNK_SIZE,
+                    chunk_overlap=CHUNK_OVERLAP,
+                    text_splitter=TEXT_SPLITTER,
+                    chunk_tokens=CHUNK_TOKENS,
+                    chunk_overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                    split_workers=SPLIT_WORKERS,
+                    embedding_backend=EMBEDDING_BACKEND,
+                    embedding_options=embedding_options,
+                    compression=compression,
+                    lexical_index=lexical_index
+                )
+                await worker_pool.run(transformation_obj.transformDocuments)
+                await worker_pool.run(
+                    store_collection, collection_id, file.filename, manifest["extension"],
+                    transformation_obj.stats, digest, db, transformation_obj.lexical_index
+                )
+                record_ingestion(manifest["extension"], transformation_obj.stats, parse_seconds)
+            
+                # Summaries of the old version are rebuilt, unchanged passages come from the summary cache
+                summaries = None
+                if INGEST_SUMMARIES:
+                    summaries = await worker_pool.run(build_summaries, collection_id, manifest["extension"], db.embeddings)
+                else:
+                    await worker_pool.run(vector_store_registry.setSummaryIndex, collection_id, None)
         
-        # Cleanup
-        if os.path.exists(file_path):
-            os.remove(file_path)
+            # Answers generated from the old version are no longer valid
+            answer_cache.invalidate(collection_id)
         
-        processing_status[job_id] = {
-            "status": "completed",
-            "progress": 100,
+        return {
+            "status": "success",
+            "collection_id": collection_id,
             "file_size_mb": round(file_size / (1024**2), 2),
-            "documents": len(documents)
+            "added": transformation_obj.stats["added"],
+            "unchanged": transformation_obj.stats["unchanged"],
+            "removed": transformation_obj.stats["removed"],
+            "embedding": transformation_obj.stats,
+            "summaries": summaries
         }
-        
+    
+    except QueueFullError as qe:
+        raise HTTPException(status_code=503, detail=str(qe))
+    except HTTPException as he:
+        raise he
     except Exception as e:
-        processing_status[job_id] = {
-            "status": "failed",
-            "error": str(e)
-        }
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        logging.error(f"Collection update error: {str(e)}")
+        raise CustomException(e, sys)
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
 
-@app.get("/status/{job_id}")
-async def get_status(job_id: str):
-    """Check processing status for background uploads"""
-    if job_id not in processing_status:
-        raise HTTPException(status_code=404, detail="Job not found")
-    return processing_status[job_id]
+class SummarizeRequest(BaseModel):
+    max_workers: Optional[int] = Field(default=None, ge=1, le=32)
+    use_cache: bool = True
 
-def query_rag(input_dict):
+@app.post("/collections/{collection_id}/summarize")
+async def summarize_collection(collection_id: str, request: Optional[SummarizeRequest] = None):
+    """
+    Summary of the whole document (not just the retrieved chunks), built map-reduce style.
+    Summaries of unchanged passages come from the cache, so repeated calls are cheap.
+    """
+    request = request or SummarizeRequest()
     try:
-        if db is None:
-            raise ValueError("No database loaded. Please upload a file first.")
-        
-        query = input_dict.get('query', '')
-        if not query:
-            raise ValueError("Query cannot be empty")
+        manifest = vector_store_registry.manifest(collection_id)
+        if manifest is None:
+            raise HTTPException(status_code=404, detail="Collection not found")
+        docs = await run_in_threadpool(vector_store_registry.documentChunks, collection_id)
+        if docs is None:
+            raise HTTPException(status_code=409, detail="Collection has no chunk index, upload the file again instead")
         
-        trainer_obj = ModelTraining(
-            db=db, 
-            query=query, 
-            file_name=temp_path, 
-            models=models
+        model = models.get(manifest["extension"])
+        summarizer = DocumentSummarizer(
+            llm=chain_factory.getLLM(model),
+            model=model,
+            cache=summary_cache if request.use_cache else None,
+            max_workers=request.max_workers or SUMMARY_MAX_WORKERS,
+            group_tokens=SUMMARY_GROUP_TOKENS
         )
-        return trainer_obj.getContext()
+        with worker_pool.reserve():
+            summary = await worker_pool.run(summarizer.summarize, docs)
+        
+        return {
+            "status": "success",
+            "collection_id": collection_id,
+            "summary": summary,
+            "stats": summarizer.stats
+        }
     
+    except QueueFullError as qe:
+        raise HTTPException(status_code=503, detail=str(qe))
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logging.error(f"Summarize error: {str(e)}")
+        raise CustomException(e, sys)
+
+@app.get("/collections")
+async def list_collections():
+    """List indexed documents that can be queried"""
+    return {"collections": vector_store_registry.list()}
+
+@app.delete("/collections/{collection_id}")
+async def delete_collection(collection_id: str):
+    """Remove a collection and its index from disk"""
+    if not await run_in_threadpool(vector_store_registry.delete, collection_id):
+        raise HTTPException(status_code=404, detail="Collection not found")
+    return {"status": "deleted", "collection_id": collection_id}
+
+class InvalidQueryError(ValueError):
+    pass
+
+class CollectionNotFoundError(LookupError):
+    pass
+
+# /query/invoke is served by langserve, its errors reach these handlers instead of an HTTPException
+@app.exception_handler(InvalidQueryError)
+async def invalid_query_handler(request: Request, exc: InvalidQueryError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+@app.exception_handler(CollectionNotFoundError)
+async def collection_not_found_handler(request: Request, exc: CollectionNotFoundError):
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+def retrieval_options(input_dict):
+    """Server defaults overridden by the retrieval options present in a query"""
+    options = {
+        "mode": RETRIEVAL_MODE,
+        "vector_weight": HYBRID_VECTOR_WEIGHT,
+        "lexical_weight": HYBRID_LEXICAL_WEIGHT,
+        "rrf_k": RRF_K,
+        "k": RETRIEVAL_K,
+        "max_context_tokens": MAX_CONTEXT_TOKENS or None,
+        "compress": CONTEXT_COMPRESSION,
+        "sentence_threshold": SENTENCE_THRESHOLD or None,
+        "coarse_sections": COARSE_SECTIONS
+    }
+    options.update({key: input_dict[key] for key in RETRIEVAL_OPTIONS if input_dict.get(key) is not None})
+    if not 1 <= options["k"] <= 50:
+        raise InvalidQueryError("k must be between 1 and 50")
+    if options.get("filter") is not None:
+        if not isinstance(options["filter"], dict):
+            raise InvalidQueryError("filter must map metadata keys to values")
+        # Some stores take the filter as a query expression, keys must be plain field names
+        for key in options["filter"]:
+            if not re.fullmatch(r"\w+", key):
+                raise InvalidQueryError(f"Invalid filter key {key!r}")
+    return options
+
+def build_trainer(input_dict):
+    try:
+        # /query-stream validated the request already, /query/invoke hands over the raw input
+        input_dict = QueryRequest.model_validate(input_dict).model_dump()
+    except ValidationError as e:
+        raise InvalidQueryError("; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()))
+
+    query = input_dict.get('query', '')
+    if not query:
+        raise InvalidQueryError("Query cannot be empty")
+
+    collection_id = input_dict.get('collection_id', '')
+    db, manifest = vector_store_registry.get(collection_id)
+    if db is None:
+        raise CollectionNotFoundError("Collection not found. Please upload a file first.")
+    
+    return ModelTraining(
+        db=db, 
+        query=query, 
+        file_name=manifest["file_name"], 
+        models=models,
+        chain_factory=chain_factory,
+        collection_id=collection_id,
+        answer_cache=answer_cache,
+        use_cache=input_dict.get('use_cache', True),
+        lexical_index=vector_store_registry.lexicalIndex(collection_id),
+        retrieval=retrieval_options(input_dict),
+        summary_index=vector_store_registry.summaryIndex(collection_id),
+        table_store=vector_store_registry.tableStore(collection_id),
+        query_batcher=query_batcher
+    )
+
+def query_rag(input_dict):
+    try:
+        trainer_obj = build_trainer(input_dict)
+        answer = trainer_obj.getContext()
+        record_query(trainer_obj)
+        return answer
+    
+    except (InvalidQueryError, CollectionNotFoundError):
+        raise
     except Exception as e:
         logging.error(f"Query error: {str(e)}")
         raise CustomException(e, sys)
 
+class QueryRequest(BaseModel):
+    query: str
+    collection_id: str
+    use_cache: bool = True
+    mode: Optional[Literal["auto", "vector", "lexical", "hybrid"]] = None
+    # Retrieval options, unset ones fall back to the server defaults
+    k: Optional[int] = Field(default=None, ge=1, le=50)
+    search_type: Optional[Literal["similarity", "mmr"]] = None
+    fetch_k: Optional[int] = Field(default=None, ge=1, le=500)
+    lambda_mult: Optional[float] = Field(default=None, ge=0, le=1)
+    score_threshold: Optional[float] = Field(default=None, ge=0, le=1)
+    filter: Optional[Dict[str, Union[str, int, float, List[Union[str, int, float]]]]] = None
+    max_context_tokens: Optional[int] = Field(default=None, ge=1)
+    compress: Optional[bool] = None
+    sentence_threshold: Optional[float] = Field(default=None, ge=-1, le=1)
+    summaries: Optional[bool] = None
+    coarse_sections: Optional[int] = Field(default=None, ge=0, le=50)
+    tables: Optional[bool] = None
+
+    @field_validator("filter")
+    @classmethod
+    def check_filter(cls, value):
+        # An empty list would match nothing, and is not even valid SQL for LanceDB
+        for key, allowed in (value or {}).items():
+            if isinstance(allowed, list) and not allowed:
+                raise ValueError(f"filter values for {key} must not be an empty list")
+        return value
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/query-stream")
+async def query_stream(request: QueryRequest):
+    """
+    Server-sent events: one `sources` event with the retrieved chunks, then a `token`
+    event per generated piece of the answer and a final `done` event with timings
+    """
+    try:
+        trainer_obj = await run_in_threadpool(build_trainer, request.model_dump())
+    except InvalidQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CollectionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    def events():
+        try:
+            for event, data in trainer_obj.streamContext():
+                if event == "sources":
+                    data = [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in data]
+                yield sse_event(event, data)
+            record_query(trainer_obj)
+        except Exception as e:
+            logging.error(f"Streaming query error: {str(e)}")
+            yield sse_event("error", str(e))
+    
+    # A sync generator is iterated in the threadpool, so generation never blocks the event loop
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 query_chain = RunnableLambda(query_rag)
 
 add_routes(app, query_chain, path='/query')
@@ -111,6 +111,8 @@ QUERY_URL = "http://localhost:8000/query/invoke"
 # Initialize session state
 if 'file_uploaded' not in st.session_state:
     st.session_state.file_uploaded = False
+if 'collection_id' not in st.session_state:
+    st.session_state.collection_id = None
 if 'response' not in st.session_state:
     st.session_state.response = None
 
@@ -140,6 +142,7 @@ if not st.session_state.file_uploaded:
                     
                     if response.status_code == 200:
                         st.session_state.file_uploaded = True
+                        st.session_state.collection_id = response.json().get("collection_id")
                         st.success("✅ File uploaded successfully! You can now ask questions.")
                         st.rerun()
                     else:
@@ -155,6 +158,7 @@ else:
     # Reset button
     if st.button("🔄 Upload New File"):
         st.session_state.file_uploaded = False
+        st.session_state.collection_id = None
         st.session_state.response = None
         st.rerun()
     
@@ -174,7 +178,7 @@ else:
             with st.spinner("🤔 Thinking... Generating answer"):
                 try:
                     # Send query to backend
-                    payload = {"input": {"query": query}}
+                    payload = {"input": {"query": query, "collection_id": st.session_state.collection_id}}
                     response = requests.post(QUERY_URL, json=payload)
                     
                     if response.status_code == 200:
@@ -0,0 +1,162 @@
+import os
+import sys
+import time
+import shutil
+import socket
+import argparse
+import multiprocessing
+
+from src.exception import CustomException
+from src.logger import logging
+from src.components.job_queue import JobQueue
+
+# Progress reported for each stage of a job, embedding fills the range in between
+PARSE_PROGRESS = 5
+EMBED_START_PROGRESS = 20
+EMBED_END_PROGRESS = 95
+
+def process_job(job, job_queue):
+    # Imported here so every worker process builds its own loaders, cache connection etc.
+    from api.app import (
+        document_loaders, vector_db, vector_embeddings, embedding_cache, vector_store_registry,
+        EMBED_BATCH_SIZE, EMBED_MAX_WORKERS, PDF_WORKERS, CHUNK_SIZE, CHUNK_OVERLAP, INGEST_SUMMARIES,
+        TEXT_SPLITTER, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, SPLIT_WORKERS,
+        EMBEDDING_BACKEND, embedding_options, compression, build_summaries, table_options,
+        metrics, record_ingestion
+    )
+    from src.components.data_ingestion import DataIngestion
+    from src.components.data_transformation import DataTransformation
+
+    job_id = job["id"]
+    file_path = job["file_path"]
+    collection_path = None
+    try:
+        # An identical file may have been indexed while this job was waiting in the queue
+        duplicate = vector_store_registry.findByDigest(job.get("digest"), os.path.splitext(file_path)[1])
+        if duplicate is not None:
+            logging.info(f"Job {job_id} reuses collection {duplicate['collection_id']}")
+            job_queue.complete(job_id, {
+                "file_size_mb": round(job["file_size"] / (1024**2), 2),
+                "documents": duplicate["stats"].get("documents"),
+                "embedding": duplicate["stats"],
+                "collection_id": duplicate["collection_id"],
+                "duplicate": True
+            })
+            return
+
+        # The job id doubles as the collection id the document is queried with
+        collection_path = vector_store_registry.path(job_id)
+        job_queue.update(job_id, "parsing", PARSE_PROGRESS)
+        ingestion = DataIngestion(
+            file_name=file_path, loaders=document_loaders, pdf_workers=PDF_WORKERS, **table_options(collection_path)
+        )
+        documents = ingestion.lazyLoadFile()
+        job_queue.update(job_id, "embedding", EMBED_START_PROGRESS)
+
+        def on_progress(fraction):
+            # Fraction of the document consumed so far: PDF pages, else bytes of text and CSV read
+            if fraction is None:
+                fraction = ingestion.progress()
+            if fraction is None:
+                # Formats parsed whole cannot tell, the job must still not look stale to requeueStale
+                job_queue.heartbeat(job_id)
+                return
+            span = EMBED_END_PROGRESS - EMBED_START_PROGRESS
+            job_queue.update(job_id, "embedding", EMBED_START_PROGRESS + span * fraction)
+
+        transformation_obj = DataTransformation(
+            documents=documents,
+            file_name=file_path,
+            databases=vector_db,
+            embeddings=vector_embeddings,
+            batch_size=EMBED_BATCH_SIZE,
+            max_workers=EMBED_MAX_WORKERS,
+            cache=embedding_cache,
+            persist_directory=collection_path,
+            progress_callback=on_progress,
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            text_splitter=TEXT_SPLITTER,
+            chunk_tokens=CHUNK_TOKENS,
+            chunk_overlap_tokens=CHUNK_OVERLAP_TOKENS,
+            split_workers=SPLIT_WORKERS,
+            embedding_backend=EMBEDDING_BACKEND,
+            embedding_options=embedding_options,
+            compression=compression
+        )
+        db = transformation_obj.transformDocuments()
+        if db is None:
+            raise ValueError("No text could be extracted from the file")
+        vector_store_registry.register(
+            job_id, job["filename"], transformation_obj.extension, transformation_obj.stats, job.get("digest")
+        )
+        record_ingestion(transformation_obj.extension, transformation_obj.stats)
+
+        summaries = None
+        if INGEST_SUMMARIES:
+            job_queue.update(job_id, "summarizing", EMBED_END_PROGRESS)
+            summaries = build_summaries(job_id, transformation_obj.extension, db.embeddings)
+
+        job_queue.complete(job_id, {
+            "file_size_mb": round(job["file_size"] / (1024**2), 2),
+            "documents": transformation_obj.stats["documents"],
+            "embedding": transformation_obj.stats,
+            "summaries": summaries,
+            "collection_id": job_id
+        })
+        logging.info(f"Job {job_id} completed")
+    except Exception as e:
+        logging.error(f"Job {job_id} failed: {str(e)}")
+        # A partly written store or table directory must not count against the disk budget
+        if collection_path is not None:
+            shutil.rmtree(collection_path, ignore_errors=True)
+        job_queue.fail(job_id, str(e))
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        # The server adds this process's metrics to its own on /metrics
+        metrics.dump()
+
+def run_worker(job_db_path, job_ttl, poll_interval=1.0, stale_timeout=60 * 60):
+    try:
+        worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        job_queue = JobQueue(path=job_db_path, ttl=job_ttl)
+        job_queue.requeueStale(stale_timeout)
+        logging.info(f"Worker {worker_id} started")
+
+        last_cleanup = 0
+        while True:
+            if time.time() - last_cleanup > 60:
+                job_queue.cleanup()
+                last_cleanup = time.time()
+
+            job = job_queue.claim(worker_id)
+            if job is None:
+                time.sleep(poll_interval)
+                continue
+            process_job(job, job_queue)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        raise CustomException(e, sys)
+
+def start_workers(count, job_db_path, job_ttl):
+    # Spawned (not forked) so no SQLite connection or thread pool is shared with the parent.
+    # Not daemonic, since workers start their own process pools for PDF parsing
+    context = multiprocessing.get_context("spawn")
+    workers = []
+    for _ in range(count):
+        worker = context.Process(target=run_worker, args=(job_db_path, job_ttl))
+        worker.start()
+        workers.append(worker)
+    return workers
+
+if __name__ == "__main__":
+    from api.app import JOB_DB_PATH, JOB_TTL
+
+    parser = argparse.ArgumentParser(description="Process queued background uploads")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    for worker in start_workers(args.workers, JOB_DB_PATH, JOB_TTL):
+        worker.join()
@@ -0,0 +1,75 @@
+import os
+import json
+import time
+import argparse
+
+from langchain_community.document_loaders import TextLoader, PyMuPDFLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from src.components.data_ingestion import DataIngestion
+from src.components.embedding_backends import create_embeddings
+
+SAMPLE_FILES = ["Unit 5 pdf.pdf", "notebooks/speech.txt"]
+MODELS = {".pdf": "snowflake-arctic-embed:335m", ".txt": "nomic-embed-text:v1.5"}
+
+def load_chunks(path, chunk_size, chunk_overlap):
+    loaders = {".pdf": PyMuPDFLoader, ".txt": TextLoader}
+    documents = DataIngestion(file_name=path, loaders=loaders).loadFile()
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return [chunk.page_content for chunk in splitter.split_documents(documents)]
+
+def bench_backend(backend, model, texts, batch_size, repeat, options):
+    try:
+        start = time.perf_counter()
+        embedder = create_embeddings(model, backend, **options)
+        # The first call also loads the model (or wakes up the Ollama server), timed separately
+        embedder.embed_documents(texts[:1])
+        warmup = time.perf_counter() - start
+
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for offset in range(0, len(texts), batch_size):
+                vectors = embedder.embed_documents(texts[offset:offset + batch_size])
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return {
+            "backend": backend,
+            "model": model,
+            "chunks": len(texts),
+            "dimension": len(vectors[0]),
+            "warmup_s": round(warmup, 3),
+            "seconds": round(best, 3),
+            "chunks_per_sec": round(len(texts) / best, 2),
+            "chars_per_sec": round(sum(map(len, texts)) / best, 1)
+        }
+    except Exception as e:
+        return {"backend": backend, "model": model, "error": str(e).splitlines()[-1][:300]}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare embedding throughput of the Ollama and in-process backends")
+    parser.add_argument("--backends", nargs="*", default=["ollama", "local", "onnx"])
+    parser.add_argument("--files", nargs="*", default=SAMPLE_FILES)
+    parser.add_argument("--batch-size", type=int, default=64, help="chunks per call, like EMBED_BATCH_SIZE")
+    parser.add_argument("--threads", type=int, default=None, help="CPU threads of the local backends")
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--chunk-overlap", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None, help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for path in args.files:
+        if not os.path.exists(path):
+            continue
+        texts = load_chunks(path, args.chunk_size, args.chunk_overlap)
+        model = MODELS.get(os.path.splitext(path)[1], "nomic-embed-text:v1.5")
+        for backend in args.backends:
+            options = {} if backend == "ollama" else {"threads": args.threads}
+            result = bench_backend(backend, model, texts, args.batch_size, args.repeat, options)
+            result["file"] = os.path.basename(path)
+            results.append(result)
+            print(json.dumps(result))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,385 @@
+import os
+import sys
+import json
+import time
+import zipfile
+import platform
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pymupdf
+from benchmarks.fake_services import FakeServices
+
+EXTENSIONS = [".txt", ".pdf", ".csv", ".xlsx", ".docx"]
+PDF_PAGE_CHARS = 3000
+TABLE_QUERIES = ["how many rows are there", "total units by region", "average price of pear in South"]
+# Results are compared on these, with the direction that counts as better
+HIGHER_IS_BETTER = ("mb_per_sec", "chunks_per_sec", "queries_per_sec")
+LOWER_IS_BETTER = ("seconds", "p50_ms", "p99_ms", "first_token_p50_ms", "peak_rss_mb")
+
+def vocabulary(size, seed):
+    rng = np.random.default_rng(seed)
+    syllables = ["ka", "lo", "mi", "ren", "ta", "vo", "sel", "dar", "ni", "qu", "pe", "ost", "ra", "tin", "ul", "bex"]
+    return ["".join(rng.choice(syllables, rng.integers(2, 5))) for _ in range(size)]
+
+def synthetic_text(size, words, seed):
+    """About size characters of paragraphs of sentences, word frequencies follow Zipf's law like real text"""
+    rng = np.random.default_rng(seed)
+    paragraphs = []
+    length = 0
+    while length < size:
+        sentences = []
+        for _ in range(rng.integers(3, 8)):
+            picked = [words[index % len(words)] for index in rng.zipf(1.3, rng.integers(8, 21))]
+            sentences.append(" ".join(picked).capitalize() + ".")
+        paragraphs.append(" ".join(sentences))
+        length += len(paragraphs[-1]) + 2
+    return "\n\n".join(paragraphs)[:size]
+
+def synthetic_table(rows, words, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "order_id": np.arange(rows),
+        "region": rng.choice(["North", "South", "East", "West"], rows),
+        "product": rng.choice(["apple", "pear", "plum", "fig", "kiwi"], rows),
+        "units": rng.integers(1, 100, rows),
+        "price": (rng.random(rows) * 10).round(2),
+        "note": [" ".join(words[index % len(words)] for index in rng.zipf(1.3, 4)) for _ in range(rows)]
+    })
+
+def write_docx(path, text):
+    # The smallest package Word (and UnstructuredWordDocumentLoader) opens: content types, the
+    # package relationship and the document with one paragraph per text paragraph
+    escape = lambda value: value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    body = "".join(f"<w:p><w:r><w:t>{escape(paragraph)}</w:t></w:r></w:p>" for paragraph in text.split("\n\n"))
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/></Types>'))
+        docx.writestr("_rels/.rels", (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="word/document.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/></Relationships>'))
+        docx.writestr("word/document.xml", (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:body>{body}</w:body></w:document>'))
+
+def make_document(directory, extension, size_mb, words, seed):
+    """A synthetic file holding about size_mb of text (rows for tables)"""
+    size = int(size_mb * 1024 * 1024)
+    path = os.path.join(directory, f"synthetic-{size_mb:g}mb{extension}")
+    if extension in (".csv", ".xlsx"):
+        frame = synthetic_table(max(1, size // 60), words, seed)
+        frame.to_csv(path, index=False) if extension == ".csv" else frame.to_excel(path, index=False)
+    elif extension == ".pdf":
+        text = synthetic_text(size, words, seed)
+        pdf = pymupdf.open()
+        for start in range(0, len(text), PDF_PAGE_CHARS):
+            pdf.new_page().insert_textbox(pymupdf.Rect(36, 36, 559, 806), text[start:start + PDF_PAGE_CHARS], fontsize=8)
+        pdf.save(path)
+        pdf.close()
+    elif extension == ".docx":
+        write_docx(path, synthetic_text(size, words, seed))
+    else:
+        with open(path, "w") as f:
+            f.write(synthetic_text(size, words, seed))
+    return path
+
+def make_queries(extension, count, words, seed):
+    rng = np.random.default_rng(seed)
+    queries = [
+        f"What does the document say about {words[first % len(words)]} and {words[second % len(words)]}?"
+        for first, second in rng.zipf(1.3, (count, 2))
+    ]
+    if extension in (".csv", ".xlsx"):
+        queries[:len(TABLE_QUERIES)] = TABLE_QUERIES[:count]
+    return queries
+
+class PeakMemory():
+    """Peak resident memory of this process while the block runs, sampled from /proc (Linux only)"""
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.baseline = self.peak = None
+        self.stopped = threading.Event()
+
+    @staticmethod
+    def rss():
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, self.rss())
+
+    def __enter__(self):
+        self.baseline = self.peak = self.rss()
+        if self.baseline is not None:
+            self.thread = threading.Thread(target=self.sample, daemon=True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.baseline is not None:
+            self.stopped.set()
+            self.thread.join()
+            self.peak = max(self.peak, self.rss())
+
+    def result(self):
+        if self.baseline is None:
+            return {"peak_rss_mb": None, "added_rss_mb": None}
+        return {"peak_rss_mb": round(self.peak / 1024**2, 1), "added_rss_mb": round((self.peak - self.baseline) / 1024**2, 1)}
+
+def latency_stats(latencies, elapsed):
+    milliseconds = np.array(latencies) * 1000
+    return {
+        "queries": len(latencies),
+        "p50_ms": round(float(np.percentile(milliseconds, 50)), 1),
+        "p99_ms": round(float(np.percentile(milliseconds, 99)), 1),
+        "mean_ms": round(float(milliseconds.mean()), 1),
+        "queries_per_sec": round(len(latencies) / elapsed, 2) if elapsed > 0 else None
+    }
+
+def error_result(e):
+    return {"error": str(e).splitlines()[-1][:300] if str(e) else type(e).__name__}
+
+def bench_ingestion(app, path, persist_directory):
+    """DataIngestion + DataTransformation with the server's settings, the embedding cache left out"""
+    from src.components.data_ingestion import DataIngestion
+    from src.components.data_transformation import DataTransformation
+
+    megabytes = os.path.getsize(path) / 1024**2
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        documents = DataIngestion(
+            file_name=path, loaders=app.document_loaders, pdf_workers=app.PDF_WORKERS, **app.table_options(persist_directory)
+        ).lazyLoadFile()
+        transformation = DataTransformation(
+            documents=documents,
+            file_name=path,
+            databases=app.vector_db,
+            embeddings=app.vector_embeddings,
+            batch_size=app.EMBED_BATCH_SIZE,
+            max_workers=app.EMBED_MAX_WORKERS,
+            persist_directory=persist_directory,
+            chunk_size=app.CHUNK_SIZE,
+            chunk_overlap=app.CHUNK_OVERLAP,
+            text_splitter=app.TEXT_SPLITTER,
+            chunk_tokens=app.CHUNK_TOKENS,
+            chunk_overlap_tokens=app.CHUNK_OVERLAP_TOKENS,
+            split_workers=app.SPLIT_WORKERS,
+            compression=app.compression
+        )
+        db = transformation.transformDocuments()
+        elapsed = time.perf_counter() - start
+    stats = transformation.stats
+    return {
+        "seconds": round(elapsed, 3),
+        "mb_per_sec": round(megabytes / elapsed, 2),
+        "documents": stats["documents"],
+        "chunks": stats["chunks"],
+        "chunks_per_sec": round(stats["chunks"] / elapsed, 1),
+        "stage_seconds": stats.get("stage_seconds"),
+        **memory.result()
+    }, db, transformation
+
+def bench_model(app, path, db, transformation, persist_directory, queries):
+    """Sequential queries through ModelTraining.streamContext, the answer cache left out"""
+    from src.components.model_trainer import ModelTraining
+    from src.components.table_store import TableStore
+
+    table_store = TableStore.load(persist_directory) if app.TABULAR_INGESTION else None
+    latencies, first_tokens, sources = [], [], {}
+    start = time.perf_counter()
+    for query in queries:
+        trainer = ModelTraining(
+            db=db, query=query, file_name=path, models=app.models, chain_factory=app.chain_factory,
+            use_cache=False, lexical_index=transformation.lexical_index, retrieval=app.retrieval_options({}),
+            table_store=table_store
+        )
+        began = time.perf_counter()
+        for event, data in trainer.streamContext():
+            pass
+        latencies.append(time.perf_counter() - began)
+        first_tokens.append(data.get("first_token_ms", data["total_ms"]))
+        source = trainer.answer_source or "generation"
+        sources[source] = sources.get(source, 0) + 1
+    return {
+        **latency_stats(latencies, time.perf_counter() - start),
+        "first_token_p50_ms": round(float(np.percentile(first_tokens, 50)), 1),
+        "answer_sources": sources
+    }
+
+def bench_api(app, client, path, queries, concurrency):
+    """POST /upload, then the queries on /query/invoke and /query-stream from concurrency threads"""
+    megabytes = os.path.getsize(path) / 1024**2
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        response = client.post("/upload", files={"file": (os.path.basename(path), f)})
+    upload_seconds = time.perf_counter() - start
+    if response.status_code != 200:
+        return [{"endpoint": "/upload", "error": f"{response.status_code}: {response.text[:300]}"}]
+    collection_id = response.json()["collection_id"]
+    results = [{
+        "endpoint": "/upload",
+        "seconds": round(upload_seconds, 3),
+        "mb_per_sec": round(megabytes / upload_seconds, 2),
+        "chunks": response.json()["embedding"]["chunks"]
+    }]
+
+    def invoke(query):
+        began = time.perf_counter()
+        response = client.post("/query/invoke", json={"input": {"query": query, "collection_id": collection_id, "use_cache": False}})
+        response.raise_for_status()
+        return time.perf_counter() - began
+
+    def stream(query):
+        began = time.perf_counter()
+        response = client.post("/query-stream", json={"query": query, "collection_id": collection_id, "use_cache": False})
+        response.raise_for_status()
+        return time.perf_counter() - began
+
+    for endpoint, run in (("/query/invoke", invoke), ("/query-stream", stream)):
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                latencies = list(executor.map(run, queries))
+            results.append({"endpoint": endpoint, "concurrency": concurrency, **latency_stats(latencies, time.perf_counter() - start)})
+        except Exception as e:
+            results.append({"endpoint": endpoint, **error_result(e)})
+    app.vector_store_registry.delete(collection_id)
+    return results
+
+def result_key(result):
+    return (result["suite"], result["extension"], result["size_mb"], result.get("endpoint"))
+
+def compare(results, baseline_path, tolerance):
+    """Prints the change of every tracked metric against an earlier run, flagging regressions"""
+    with open(baseline_path) as f:
+        baseline = {result_key(result): result for result in json.load(f)["results"]}
+    for result in results:
+        before = baseline.get(result_key(result))
+        if before is None:
+            continue
+        for metric in HIGHER_IS_BETTER + LOWER_IS_BETTER:
+            if not result.get(metric) or not before.get(metric):
+                continue
+            change = result[metric] / before[metric] - 1
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            print(json.dumps({
+                "key": list(result_key(result)), "metric": metric, "before": before[metric], "after": result[metric],
+                "change": round(change, 3), "regression": worse > tolerance
+            }))
+
+def load_app(workdir, services, store):
+    """Imports api.app with its caches, indexes and queues in workdir, talking to the fake services"""
+    os.environ.update(services.environment)
+    os.environ.update({
+        "EMBEDDING_BACKEND": "ollama",
+        "JOB_WORKERS": "0",
+        "INDEX_DIR": os.path.join(workdir, "indexes"),
+        "EMBED_CACHE_PATH": os.path.join(workdir, "cache", "embeddings.sqlite"),
+        "SUMMARY_CACHE_PATH": os.path.join(workdir, "cache", "summaries.sqlite"),
+        "JOB_DB_PATH": os.path.join(workdir, "cache", "jobs.sqlite"),
+        "UPLOAD_SESSION_DIR": os.path.join(workdir, "uploads"),
+        "METRICS_DIR": os.path.join(workdir, "metrics")
+    })
+    import api.app as app
+    if store is not None:
+        from langchain_community import vectorstores
+        for extension in app.vector_db:
+            app.vector_db[extension] = getattr(vectorstores, store)
+    return app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingestion and query benchmarks against local fake Ollama and Groq servers")
+    parser.add_argument("--extensions", nargs="*", default=EXTENSIONS)
+    parser.add_argument("--sizes-mb", nargs="*", type=float, default=[1, 4])
+    parser.add_argument("--suites", nargs="*", default=["ingestion", "model", "api"])
+    parser.add_argument("--queries", type=int, default=20, help="queries per file and suite")
+    parser.add_argument("--concurrency", type=int, default=4, help="client threads of the api suite")
+    parser.add_argument("--store", default=None, help="vector store class for every extension, e.g. FAISS")
+    parser.add_argument("--embed-ms", type=float, default=20, help="latency of every embedding request")
+    parser.add_argument("--embed-text-ms", type=float, default=0.5, help="added latency per embedded text")
+    parser.add_argument("--embed-parallel", type=int, default=0, help="embedding requests served at once, 0 for no limit")
+    parser.add_argument("--first-token-ms", type=float, default=150)
+    parser.add_argument("--token-ms", type=float, default=2)
+    parser.add_argument("--answer-tokens", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="write results as JSON to this file")
+    parser.add_argument("--compare", default=None, help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative change reported as a regression")
+    args = parser.parse_args()
+
+    services = FakeServices(
+        embed_ms=args.embed_ms, embed_text_ms=args.embed_text_ms, first_token_ms=args.first_token_ms,
+        token_ms=args.token_ms, answer_tokens=args.answer_tokens, embed_parallel=args.embed_parallel
+    )
+    words = vocabulary(5000, args.seed)
+    results = []
+    with services, tempfile.TemporaryDirectory() as workdir:
+        app = load_app(workdir, services, args.store)
+        client = None
+        if "api" in args.suites:
+            from fastapi.testclient import TestClient
+            client = TestClient(app.app)
+
+        for extension in args.extensions:
+            for size_mb in args.sizes_mb:
+                path = make_document(workdir, extension, size_mb, words, args.seed)
+                queries = make_queries(extension, args.queries, words, args.seed)
+                common = {"extension": extension, "size_mb": size_mb, "file_mb": round(os.path.getsize(path) / 1024**2, 2)}
+                persist_directory = os.path.join(workdir, "ingestion", os.path.basename(path))
+
+                ingested = None
+                if "ingestion" in args.suites or "model" in args.suites:
+                    try:
+                        result, db, transformation = bench_ingestion(app, path, persist_directory)
+                        ingested = (db, transformation) if db is not None else None
+                    except Exception as e:
+                        result = error_result(e)
+                    if "ingestion" in args.suites:
+                        results.append({"suite": "ingestion", **common, **result})
+                        print(json.dumps(results[-1]))
+
+                if "model" in args.suites and ingested is not None:
+                    try:
+                        result = bench_model(app, path, *ingested, persist_directory, queries)
+                    except Exception as e:
+                        result = error_result(e)
+                    results.append({"suite": "model", **common, **result})
+                    print(json.dumps(results[-1]))
+
+                if client is not None:
+                    try:
+                        api_results = bench_api(app, client, path, queries, args.concurrency)
+                    except Exception as e:
+                        api_results = [{"endpoint": "/upload", **error_result(e)}]
+                    for result in api_results:
+                        results.append({"suite": "api", **common, **result})
+                        print(json.dumps(results[-1]))
+                os.remove(path)
+        app.worker_pool.shutdown()
+
+    if args.compare:
+        compare(results, args.compare, args.tolerance)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "config": vars(args),
+                "environment": {"python": sys.version.split()[0], "platform": platform.platform(), "cpus": os.cpu_count()},
+                "results": results
+            }, f, indent=2)
@@ -0,0 +1,151 @@
+import re
+import json
+import time
+import zlib
+import threading
+import contextlib
+import multiprocessing
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+WORD = re.compile(r"\w+")
+
+# Output size of the models in `vector_embeddings`, other models get DEFAULT_DIMENSION
+DIMENSIONS = {"nomic-embed-text:v1.5": 768, "snowflake-arctic-embed:335m": 1024}
+DEFAULT_DIMENSION = 768
+
+def fake_embedding(text, dimension):
+    """Hashed bag of words: texts sharing words get similar vectors, the same text always the same one"""
+    vector = np.zeros(dimension, dtype=np.float32)
+    for word in WORD.findall(text.lower()):
+        digest = zlib.crc32(word.encode())
+        vector[digest % dimension] += 1.0 if digest & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+def fake_answer(prompt, tokens):
+    """tokens words taken from the end of the prompt, like an answer quoting the question"""
+    words = WORD.findall(prompt)[-tokens:] or ["answer"]
+    return [f"{words[number % len(words)]} " for number in range(tokens)]
+
+class FakeHandler(BaseHTTPRequestHandler):
+    """
+    POST /api/embed as served by Ollama and POST /openai/v1/chat/completions as served by
+    Groq (streamed or not). Latencies come from the server's `latency` dict.
+    """
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes, Nagle's algorithm would hold the body back
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def sendJson(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def sendChunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.rstrip("/").endswith("/api/embed"):
+            self.embed(request)
+        elif self.path.rstrip("/").endswith("/chat/completions"):
+            self.chat(request)
+        else:
+            self.send_error(404)
+
+    def embed(self, request):
+        latency = self.server.latency
+        texts = request.get("input", [])
+        texts = [texts] if isinstance(texts, str) else texts
+        with self.server.embed_slots:
+            time.sleep((latency["embed_ms"] + latency["embed_text_ms"] * len(texts)) / 1000)
+        dimension = DIMENSIONS.get(request.get("model"), DEFAULT_DIMENSION)
+        self.sendJson({
+            "model": request.get("model"),
+            "embeddings": [fake_embedding(text, dimension) for text in texts],
+            "prompt_eval_count": sum(len(text) // 4 for text in texts)
+        })
+
+    def chat(self, request):
+        latency = self.server.latency
+        prompt = " ".join(str(message.get("content", "")) for message in request.get("messages", []))
+        tokens = fake_answer(prompt, latency["answer_tokens"])
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(tokens), "total_tokens": len(prompt) // 4 + len(tokens)}
+        base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": request.get("model"), "system_fingerprint": None}
+        time.sleep(latency["first_token_ms"] / 1000)
+
+        if not request.get("stream"):
+            time.sleep(latency["token_ms"] * len(tokens) / 1000)
+            self.sendJson({
+                **base, "object": "chat.completion", "usage": usage,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop", "logprobs": None}]
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for number, token in enumerate(tokens):
+            if number:
+                time.sleep(latency["token_ms"] / 1000)
+            delta = {"role": "assistant", "content": token} if number == 0 else {"content": token}
+            chunk = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": None, "logprobs": None}]}
+            self.sendChunk(f"data: {json.dumps(chunk)}\n\n".encode())
+        last = {**base, "object": "chat.completion.chunk", "x_groq": {"usage": usage},
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop", "logprobs": None}]}
+        self.sendChunk(f"data: {json.dumps(last)}\n\ndata: [DONE]\n\n".encode())
+        self.sendChunk(b"")
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Hundreds of concurrent clients connect at once, the default backlog of 5 would reset them
+    request_queue_size = 1024
+
+def serve(latency, ports):
+    server = FakeServer(("127.0.0.1", 0), FakeHandler)
+    server.latency = latency
+    # Ollama queues requests beyond OLLAMA_NUM_PARALLEL, embed_parallel=0 serves all at once
+    server.embed_slots = threading.Semaphore(latency["embed_parallel"]) if latency["embed_parallel"] else contextlib.nullcontext()
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+class FakeServices():
+    """
+    Ollama and Groq stand-ins in a separate process, so the fakes never compete with the code
+    under test for the GIL. Use as a context manager; `environment` holds the variables that
+    point langchain_ollama and langchain_groq at them.
+
+    Every embedding request takes embed_ms plus embed_text_ms per text, at most embed_parallel
+    of them at a time. A chat completion sends answer_tokens tokens, the first after
+    first_token_ms and the others token_ms apart.
+    """
+    def __init__(self, embed_ms=20, embed_text_ms=0.5, first_token_ms=150, token_ms=2, answer_tokens=32, embed_parallel=0):
+        self.latency = {
+            "embed_ms": embed_ms, "embed_text_ms": embed_text_ms, "embed_parallel": embed_parallel,
+            "first_token_ms": first_token_ms, "token_ms": token_ms, "answer_tokens": answer_tokens
+        }
+        self.process = None
+        self.environment = {}
+
+    def __enter__(self):
+        context = multiprocessing.get_context("spawn")
+        ports = context.Queue()
+        self.process = context.Process(target=serve, args=(self.latency, ports), daemon=True)
+        self.process.start()
+        url = f"http://127.0.0.1:{ports.get(timeout=30)}"
+        self.environment = {"OLLAMA_HOST": url, "GROQ_API_BASE": url, "GROQ_API_KEY": "fake"}
+        return self
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.join()
@@ -0,0 +1,69 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+
+import pymupdf
+from langchain_community.document_loaders import PyMuPDFLoader
+from src.components.data_ingestion import DataIngestion
+
+SAMPLE_PDF = "Unit 5 pdf.pdf"
+PARAGRAPH = ("Retrieval augmented generation combines a retriever over a document collection with a "
+             "language model that answers questions using the retrieved passages. ") * 12
+
+def make_synthetic_pdf(path, pages):
+    pdf = pymupdf.open()
+    for number in range(pages):
+        page = pdf.new_page()
+        page.insert_textbox(pymupdf.Rect(40, 40, 555, 800), f"Page {number + 1}\n{PARAGRAPH}", fontsize=9)
+    pdf.save(path)
+    pdf.close()
+
+def time_call(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def bench_file(path, workers, repeat):
+    loaders = {".pdf": PyMuPDFLoader}
+    single_time, single_docs = time_call(lambda: PyMuPDFLoader(path).load(), repeat)
+    parallel_time, parallel_docs = time_call(
+        lambda: DataIngestion(file_name=path, loaders=loaders, pdf_workers=workers).loadFile(), repeat
+    )
+    return {
+        "file": os.path.basename(path),
+        "pages": len(single_docs),
+        "workers": workers,
+        "single_process_s": round(single_time, 3),
+        "parallel_s": round(parallel_time, 3),
+        "speedup": round(single_time / parallel_time, 2) if parallel_time else None,
+        "same_text": [d.page_content for d in single_docs] == [d.page_content for d in parallel_docs]
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare PyMuPDFLoader with parallel page-range parsing")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--pages", type=int, nargs="*", default=[200, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None, help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    if os.path.exists(SAMPLE_PDF):
+        results.append(bench_file(SAMPLE_PDF, args.workers, args.repeat))
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            path = os.path.join(tmp, f"synthetic_{pages}.pdf")
+            make_synthetic_pdf(path, pages)
+            results.append(bench_file(path, args.workers, args.repeat))
+
+    for result in results:
+        print(json.dumps(result))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
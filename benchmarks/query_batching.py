@@ -0,0 +1,85 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from benchmarks.fake_services import FakeServices
+from benchmarks.end_to_end import vocabulary, synthetic_text, make_queries, latency_stats
+
+MODEL = "nomic-embed-text:v1.5"
+
+def build_store(chunks, words, seed):
+    from langchain_community.vectorstores import FAISS
+    from src.components.embedding_backends import create_embeddings
+
+    text = synthetic_text(chunks * 1500, words, seed)
+    texts = [text[start:start + 1500] for start in range(0, len(text), 1500)]
+    embedder = create_embeddings(MODEL)
+    return FAISS.from_embeddings(list(zip(texts, embedder.embed_documents(texts))), embedder)
+
+def run(db, queries, concurrency, k, batcher):
+    """Embeds and searches every query like ModelTraining does, from concurrency threads"""
+    def retrieve(query):
+        began = time.perf_counter()
+        if batcher is None:
+            db.similarity_search_by_vector(db.embeddings.embed_query(query), k=k)
+        else:
+            batcher.search(db, batcher.embed(db.embeddings, query), k)
+        return time.perf_counter() - began
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(retrieve, queries))
+    return latency_stats(latencies, time.perf_counter() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query embedding and search throughput with and without QueryBatcher")
+    parser.add_argument("--chunks", type=int, default=20000, help="chunks in the FAISS store")
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--concurrency", nargs="*", type=int, default=[1, 8, 32, 64])
+    parser.add_argument("--k", type=int, default=8, help="like the k * 2 of hybrid retrieval")
+    parser.add_argument("--repeat-fraction", type=float, default=0.0, help="share of queries asked before, served by the cache")
+    parser.add_argument("--max-wait-ms", type=float, default=2)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--embed-ms", type=float, default=20)
+    parser.add_argument("--embed-text-ms", type=float, default=0.5)
+    parser.add_argument("--embed-parallel", type=int, default=4, help="like OLLAMA_NUM_PARALLEL, 0 for no limit")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    services = FakeServices(embed_ms=args.embed_ms, embed_text_ms=args.embed_text_ms, embed_parallel=args.embed_parallel)
+    results = []
+    with services:
+        os.environ.update(services.environment)
+        from src.components.query_batcher import QueryBatcher
+
+        words = vocabulary(5000, args.seed)
+        db = build_store(args.chunks, words, args.seed)
+        distinct = make_queries(".txt", args.queries, words, args.seed)
+        # Unique query texts, then a share of them repeated in random order
+        distinct = [f"{query} ({number})" for number, query in enumerate(distinct)]
+        repeats = int(len(distinct) * args.repeat_fraction)
+        rng = np.random.default_rng(args.seed)
+        queries = distinct[:len(distinct) - repeats] + list(rng.choice(distinct[:max(len(distinct) - repeats, 1)], repeats))
+
+        for concurrency in args.concurrency:
+            for batching in (False, True):
+                # A new batcher per run, so its cache only holds the run's own queries
+                batcher = QueryBatcher(
+                    max_wait_ms=args.max_wait_ms, max_batch_size=args.max_batch_size,
+                    cache_size=10000 if args.repeat_fraction else 0
+                ) if batching else None
+                result = {"concurrency": concurrency, "batching": batching, **run(db, queries, concurrency, args.k, batcher)}
+                if batcher is not None:
+                    result["mean_embed_batch"] = round(batcher.batched["embed"] / max(batcher.batches["embed"], 1), 2)
+                    result["mean_search_batch"] = round(batcher.batched["search"] / max(batcher.batches["search"], 1), 2)
+                    batcher.close()
+                results.append(result)
+                print(json.dumps(result))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from langchain_community.document_loaders import CSVLoader, UnstructuredExcelLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from src.components.table_store import TableLoader, TableStore
+from src.utils import count_tokens
+
+SAMPLE_XLSX = "notebooks/RTPof VAL 2nd HYS-2024_17-04-25.xlsx"
+QUERIES = ["how many rows are there", "total units by region", "average price of pear in South", "highest units"]
+
+def synthetic_table(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "order_id": np.arange(rows),
+        "region": rng.choice(["North", "South", "East", "West"], rows),
+        "product": rng.choice(["apple", "pear", "plum", "fig", "kiwi"], rows),
+        "units": rng.integers(1, 100, rows),
+        "price": rng.random(rows).round(2) * 10,
+        "note": rng.choice(["", "express delivery", "gift wrapped", "returned once"], rows)
+    })
+
+def load(path, loader, chunk_size, chunk_overlap, table_directory):
+    if loader == "table":
+        return TableLoader(path, max_tokens=chunk_size // 4, table_directory=table_directory).load()
+    if path.endswith(".csv"):
+        return CSVLoader(path).load()
+    return UnstructuredExcelLoader(path).load()
+
+def ingest(path, loader, chunk_size, chunk_overlap, table_directory):
+    start = time.perf_counter()
+    docs = load(path, loader, chunk_size, chunk_overlap, table_directory)
+    loaded = time.perf_counter() - start
+    chunks = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap).split_documents(docs)
+    result = {
+        "load_s": round(loaded, 3),
+        "split_s": round(time.perf_counter() - start - loaded, 3),
+        "documents": len(docs),
+        "chunks": len(chunks),
+        # What the embedding model has to read, the main cost of indexing
+        "embedding_tokens": sum(count_tokens(chunk.page_content) for chunk in chunks)
+    }
+    del docs, chunks
+
+    # Second pass for memory, tracemalloc slows every allocation down. It sees Python objects
+    # and NumPy buffers, not pyarrow's own allocator
+    tracemalloc.start()
+    try:
+        load(path, loader, chunk_size, chunk_overlap, table_directory)
+        result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024**2, 1)
+    finally:
+        tracemalloc.stop()
+    return result
+
+def bench_ingest(path, loader, chunk_size, chunk_overlap, table_directory):
+    try:
+        result = ingest(path, loader, chunk_size, chunk_overlap, table_directory)
+    except Exception as e:
+        result = {"error": str(e).splitlines()[-1][:300]}
+    return {"file": os.path.basename(path), "loader": loader, **result}
+
+def bench_queries(table_directory, repeat):
+    store = TableStore.load(table_directory)
+    results = []
+    for query in QUERIES:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            answer = store.answer(query)
+        results.append({
+            "query": query,
+            "ms_per_query": round((time.perf_counter() - start) * 1000 / repeat, 2),
+            "answer": answer.replace("\n", "; ")[:200] if answer else None
+        })
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare tabular ingestion with CSVLoader / UnstructuredExcelLoader")
+    parser.add_argument("--rows", nargs="*", type=int, default=[10000, 100000], help="sizes of the synthetic tables")
+    parser.add_argument("--formats", nargs="*", default=[".csv", ".xlsx"])
+    parser.add_argument("--loaders", nargs="*", default=["legacy", "table"])
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--chunk-overlap", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20, help="runs of every aggregate query")
+    parser.add_argument("--output", default=None, help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        files = [SAMPLE_XLSX] if os.path.exists(SAMPLE_XLSX) else []
+        for rows in args.rows:
+            frame = synthetic_table(rows)
+            for extension in args.formats:
+                path = os.path.join(workdir, f"synthetic-{rows}{extension}")
+                frame.to_csv(path, index=False) if extension == ".csv" else frame.to_excel(path, index=False)
+                files.append(path)
+
+        for path in files:
+            table_directory = os.path.join(workdir, os.path.basename(path) + ".tables")
+            for loader in args.loaders:
+                result = bench_ingest(path, loader, args.chunk_size, args.chunk_overlap, table_directory)
+                results.append(result)
+                print(json.dumps(result, ensure_ascii=False))
+            if "table" in args.loaders and path != SAMPLE_XLSX and os.path.exists(table_directory):
+                for result in bench_queries(table_directory, args.repeat):
+                    result["file"] = os.path.basename(path)
+                    results.append(result)
+                    print(json.dumps(result, ensure_ascii=False))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,87 @@
+import os
+import json
+import time
+import argparse
+
+import pymupdf
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from src.components.text_splitter import OffsetTextSplitter, text_codes, word_spans
+
+SAMPLE_PDF = "Unit 5 pdf.pdf"
+SAMPLE_TXT = "notebooks/speech.txt"
+
+def corpora(size_mb, block_size):
+    """Large inputs of different shapes, each a list of pages as the loaders produce them"""
+    target = int(size_mb * 1024 * 1024)
+    with pymupdf.open(SAMPLE_PDF) as pdf:
+        pages = [page.get_text() for page in pdf]
+    with open(SAMPLE_TXT) as f:
+        text = f.read()
+    paragraphs = (text + "\n\n") * (target // len(text) + 1)
+    return {
+        # PyMuPDFLoader: one document per page
+        "pdf_pages": pages * (target // sum(map(len, pages)) + 1),
+        # TextLoader: the whole file as one document
+        "text_file": [paragraphs[:target]],
+        # Streaming text ingestion: blocks of about 64 KB
+        "text_blocks": [paragraphs[offset:offset + block_size] for offset in range(0, target, block_size)],
+        # Extracted text without line breaks, the recursive splitter's worst case
+        "flat_text": [paragraphs[:target].replace("\n", " ")]
+    }
+
+def estimated_tokens(text):
+    tokens = word_spans(text_codes(text))[2]
+    return int(tokens[-1]) if len(tokens) else 0
+
+def bench(name, split, pages, repeat):
+    documents = [Document(page_content=page, metadata={"page": number}) for number, page in enumerate(pages)]
+    megabytes = sum(len(page.encode("utf-8")) for page in pages) / 1024**2
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = split(documents)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    sizes = [estimated_tokens(chunk.page_content) for chunk in chunks]
+    return {
+        "splitter": name,
+        "mb": round(megabytes, 1),
+        "seconds": round(best, 3),
+        "mb_per_sec": round(megabytes / best, 1),
+        "chunks": len(chunks),
+        "mean_tokens": round(sum(sizes) / max(len(sizes), 1), 1),
+        "max_tokens": max(sizes, default=0)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of the offset splitter against RecursiveCharacterTextSplitter")
+    parser.add_argument("--size-mb", type=float, default=50)
+    parser.add_argument("--chunk-size", type=int, default=2000, help="characters, recursive splitter")
+    parser.add_argument("--chunk-overlap", type=int, default=500, help="characters, recursive splitter")
+    parser.add_argument("--chunk-tokens", type=int, default=500, help="tokens, offset splitter")
+    parser.add_argument("--overlap-tokens", type=int, default=125, help="tokens, offset splitter")
+    parser.add_argument("--workers", nargs="*", type=int, default=[1, os.cpu_count() or 1], help="split threads")
+    parser.add_argument("--block-size", type=int, default=64 * 1024)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None, help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    recursive = RecursiveCharacterTextSplitter(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+    splitters = {"recursive": lambda documents: [chunk for document in documents for chunk in recursive.split_documents([document])]}
+    for workers in sorted(set(args.workers)):
+        offsets = OffsetTextSplitter(args.chunk_tokens, args.overlap_tokens, max_workers=workers)
+        splitters[f"offsets_{workers}"] = lambda documents, offsets=offsets: [
+            chunk for _, chunks in offsets.iterSplit(documents) for chunk in chunks
+        ]
+
+    results = []
+    for corpus, pages in corpora(args.size_mb, args.block_size).items():
+        for name, split in splitters.items():
+            result = {"corpus": corpus, **bench(name, split, pages, args.repeat)}
+            results.append(result)
+            print(json.dumps(result))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,89 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+
+import faiss
+import numpy as np
+from src.components.vector_compression import CompressedIndex
+
+def clustered_vectors(count, dimension, clusters, seed, latent=64):
+    # Embeddings of real chunks are clustered and have a low intrinsic dimension, uniform noise
+    # would make every compressed index look far worse than it is on real collections
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, latent)).astype(np.float32)
+    points = centers[rng.integers(0, clusters, size=count)] + 0.5 * rng.normal(size=(count, latent)).astype(np.float32)
+    projection = rng.normal(size=(latent, dimension)).astype(np.float32) / np.sqrt(latent)
+    vectors = points @ projection + 0.02 * rng.normal(size=(count, dimension)).astype(np.float32)
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+def recall(found, truth, k):
+    return float(np.mean([len(set(row[:k]) & set(expected[:k])) / k for row, expected in zip(found, truth)]))
+
+def timed_search(index, queries, k):
+    # One query at a time, like /query
+    start = time.perf_counter()
+    found = np.vstack([index.search(query[None, :], k)[1] for query in queries])
+    return found, (time.perf_counter() - start) * 1000 / len(queries)
+
+def bench(method, rescore, vectors, queries, truth, k, nprobe, directory):
+    start = time.perf_counter()
+    index = CompressedIndex.build(vectors, method, rescore=rescore, nprobe=nprobe)
+    build = time.perf_counter() - start
+    os.makedirs(directory, exist_ok=True)
+    index.save(directory)
+    index = CompressedIndex.load(directory)
+    found, latency = timed_search(index, queries, k)
+    return {
+        "method": method,
+        "rescore": rescore,
+        "build_s": round(build, 2),
+        f"recall@{k}": round(recall(found, truth, k), 4),
+        "memory_bytes": index.memoryBytes(),
+        "index_file_bytes": os.path.getsize(os.path.join(directory, "index.faiss")),
+        "disk_bytes": sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)),
+        "ms_per_query": round(latency, 3)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall, memory and latency of compressed FAISS indexes against a flat index")
+    parser.add_argument("--sizes", nargs="*", type=int, default=[50000, 200000])
+    parser.add_argument("--dimension", type=int, default=768, help="768 for nomic-embed-text, 1024 for snowflake-arctic-embed")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4, help="like RETRIEVAL_K")
+    parser.add_argument("--rescore", nargs="*", type=int, default=[1, 4], help="1 disables exact rescoring")
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            vectors = clustered_vectors(size + args.queries, args.dimension, max(16, size // 1000), args.seed)
+            vectors, queries = vectors[:size], vectors[size:]
+
+            flat = faiss.IndexFlatL2(args.dimension)
+            flat.add(vectors)
+            truth, latency = timed_search(flat, queries, args.k)
+            baseline = {
+                "vectors": size, "method": "flat", "rescore": None, f"recall@{args.k}": 1.0,
+                "memory_bytes": vectors.nbytes, "disk_bytes": vectors.nbytes, "ms_per_query": round(latency, 3)
+            }
+            results.append(baseline)
+            print(json.dumps(baseline))
+
+            for method in ("int8", "ivfpq"):
+                for rescore in args.rescore:
+                    result = bench(method, rescore, vectors, queries, truth, args.k, args.nprobe,
+                                   os.path.join(workdir, f"{size}-{method}-{rescore}"))
+                    result["vectors"] = size
+                    result["memory_ratio"] = round(result["memory_bytes"] / baseline["memory_bytes"], 4)
+                    result["disk_ratio"] = round(result["disk_bytes"] / baseline["disk_bytes"], 4)
+                    results.append(result)
+                    print(json.dumps(result))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
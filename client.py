@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+import json
 import os
 
 # Configure page
@@ -16,14 +17,18 @@ query_params = st.query_params
 current_page = query_params.get("page", "upload")
 
 # Initialize session state based on URL param
-if current_page == "query":
+if current_page == "query" and query_params.get("collection"):
     if 'file_uploaded' not in st.session_state:
         st.session_state.file_uploaded = True
+        st.session_state.collection_id = query_params.get("collection")
 else:
     # Default state
     if 'file_uploaded' not in st.session_state:
         st.session_state.file_uploaded = False
 
+if 'collection_id' not in st.session_state:
+    st.session_state.collection_id = None
+
 if 'response' not in st.session_state:
     st.session_state.response = None
 
@@ -123,8 +128,47 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # API endpoints
-UPLOAD_URL = "http://127.0.0.1:8000/upload"
-QUERY_URL = "http://127.0.0.1:8000/query/invoke"
+QUERY_STREAM_URL = "http://127.0.0.1:8000/query-stream"
+UPLOADS_URL = "http://127.0.0.1:8000/uploads"
+
+def upload_in_chunks(uploaded_file, progress, retries=3):
+    # Resumable upload: the file is read and sent one chunk at a time instead of copying
+    # it whole, and after a dropped connection sending resumes from what the server has
+    session = requests.post(UPLOADS_URL, json={"filename": uploaded_file.name, "size": uploaded_file.size})
+    session.raise_for_status()
+    session = session.json()
+    upload_id, chunk_size = session["upload_id"], session["chunk_size"]
+    
+    offset = 0
+    failures = 0
+    while offset < uploaded_file.size:
+        uploaded_file.seek(offset)
+        chunk = uploaded_file.read(chunk_size)
+        try:
+            response = requests.put(f"{UPLOADS_URL}/{upload_id}", params={"offset": offset}, data=chunk)
+        except requests.ConnectionError:
+            failures += 1
+            if failures > retries:
+                raise
+            offset = requests.get(f"{UPLOADS_URL}/{upload_id}").json()["received"]
+            continue
+        if response.status_code == 409:
+            offset = response.json()["detail"]["received"]
+            continue
+        response.raise_for_status()
+        offset = response.json()["received"]
+        progress.progress(offset / uploaded_file.size, text=f"Uploading... {offset / (1024**2):.1f}MB")
+    
+    return requests.post(f"{UPLOADS_URL}/{upload_id}/complete")
+
+def stream_events(response):
+    # Minimal server-sent events reader: yields (event, data) pairs
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            yield event, json.loads(line[len("data: "):])
 
 # Title
 st.markdown("<h1>📄 RAG File Reader & Summarizer</h1>", unsafe_allow_html=True)
@@ -147,13 +191,14 @@ if not st.session_state.file_uploaded:
             with st.spinner("⏳ Processing your file... Please wait"):
                 try:
                     # Send file to backend
-                    files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
-                    response = requests.post(UPLOAD_URL, files=files)
+                    response = upload_in_chunks(uploaded_file, st.progress(0.0, text="Uploading..."))
                     
                     if response.status_code == 200:
                         st.session_state.file_uploaded = True
+                        st.session_state.collection_id = response.json().get("collection_id")
                         # Update URL to persist state (Local Storage behavior)
                         st.query_params["page"] = "query"
+                        st.query_params["collection"] = st.session_state.collection_id
                         st.success("✅ File uploaded successfully! You can now ask questions.")
                         st.rerun()
                     else:
@@ -169,6 +214,7 @@ else:
     # Reset button
     if st.button("🔄 Upload New File"):
         st.session_state.file_uploaded = False
+        st.session_state.collection_id = None
         st.session_state.response = None
         # Clear URL params
         st.query_params.clear()
@@ -187,23 +233,34 @@ else:
         if query.strip() == "":
             st.warning("⚠️ Please enter a question")
         else:
-            with st.spinner("🤔 Thinking... Generating answer"):
-                try:
-                    # Send query to backend
-                    payload = {"input": {"query": query}}
-                    # Use 127.0.0.1 to avoid localhost issues
-                    response = requests.post(QUERY_URL, json=payload)
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        # LangServe returns output in 'output' field
-                        answer = result.get('output', 'No answer received')
-                        st.session_state.response = answer
-                    else:
+            try:
+                # Stream the answer so tokens show up as soon as they are generated
+                payload = {"query": query, "collection_id": st.session_state.collection_id}
+                status = st.empty()
+                status.info("🔎 Searching the document...")
+                placeholder = st.empty()
+                answer = ""
+                # Use 127.0.0.1 to avoid localhost issues
+                with requests.post(QUERY_STREAM_URL, json=payload, stream=True) as response:
+                    if response.status_code != 200:
+                        status.empty()
                         st.error(f"❌ Query failed: {response.text}")
-                
-                except Exception as e:
-                    st.error(f"❌ Error: {str(e)}")
+                    else:
+                        for event, data in stream_events(response):
+                            if event == "sources":
+                                status.info(f"🤔 Thinking... found {len(data)} relevant passages")
+                            elif event == "token":
+                                answer += data
+                                placeholder.markdown(answer + "▌")
+                            elif event == "error":
+                                st.error(f"❌ Query failed: {data}")
+                            elif event == "done":
+                                status.empty()
+                        placeholder.empty()
+                        st.session_state.response = answer or None
+            
+            except Exception as e:
+                st.error(f"❌ Error: {str(e)}")
     
     # Display response
     if st.session_state.response:
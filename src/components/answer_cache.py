@@ -0,0 +1,84 @@
+import json
+import math
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from src.logger import logging
+
+def normalize(vector):
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else list(vector)
+
+def options_key(options):
+    """Stable hash of the retrieval options an answer was generated with"""
+    encoded = json.dumps(options or {}, sort_keys=True, default=str)
+    return hashlib.sha1(encoded.encode()).hexdigest()
+
+class AnswerCache():
+    """
+    In-memory cache of generated answers per collection. A query whose embedding has at
+    least `similarity` cosine similarity with a cached query asked with the same retrieval
+    options (k, filter, mode...) gets the cached answer.
+    Entries expire after ttl seconds and the least recently used ones are dropped once
+    more than max_entries are stored.
+    """
+    def __init__(self, similarity=0.95, ttl=60 * 60, max_entries=1000):
+        self.similarity = similarity
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # (collection_id, entry_id) -> (normalized query embedding, options key, answer, created_at)
+        self.entries = OrderedDict()
+        self.collections = {}
+        self.next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def lookup(self, collection_id, query_embedding, options=None):
+        query_embedding = normalize(query_embedding)
+        options = options_key(options)
+        now = time.time()
+        with self.lock:
+            best_key, best_score = None, self.similarity
+            for key in list(self.collections.get(collection_id, ())):
+                embedding, entry_options, _, created_at = self.entries[key]
+                if now - created_at > self.ttl:
+                    self.remove(key)
+                    continue
+                if entry_options != options:
+                    continue
+                score = sum(x * y for x, y in zip(query_embedding, embedding))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(best_key)
+            logging.info(f"Answer cache hit for collection {collection_id} (similarity {best_score:.3f})")
+            return self.entries[best_key][2]
+
+    def store(self, collection_id, query_embedding, answer, options=None):
+        options = options_key(options)
+        with self.lock:
+            key = (collection_id, self.next_id)
+            self.next_id += 1
+            self.entries[key] = (normalize(query_embedding), options, answer, time.time())
+            self.collections.setdefault(collection_id, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        del self.entries[key]
+        keys = self.collections[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self.collections[key[0]]
+
+    def invalidate(self, collection_id):
+        """Drops every answer for a collection, called whenever it is deleted or re-indexed"""
+        with self.lock:
+            for key in list(self.collections.get(collection_id, ())):
+                self.remove(key)
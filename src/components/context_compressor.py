@@ -0,0 +1,100 @@
+import re
+
+from src.logger import logging
+from src.components.answer_cache import normalize
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+
+def overlap_length(left, right, min_overlap=20):
+    """Length of the longest suffix of `left` that is also a prefix of `right`"""
+    probe = right[:min_overlap]
+    if len(probe) < min_overlap:
+        return 0
+    position = left.find(probe)
+    while position != -1:
+        if right.startswith(left[position:]):
+            return len(left) - position
+        position = left.find(probe, position + 1)
+    return 0
+
+class ContextCompressor():
+    """
+    Shrinks retrieved chunks before they go into the prompt. Chunks from the same source
+    and page that overlap (neighbours produced by the splitter's chunk_overlap) are merged
+    into one passage with the shared text kept once, chunks contained in another are dropped.
+    With sentence_threshold set, sentences whose embedding has a lower cosine similarity
+    with the query are removed as well (this embeds every sentence, so it is off by default).
+    """
+    def __init__(self, min_overlap=20, sentence_threshold=None, embeddings=None):
+        self.min_overlap = min_overlap
+        self.sentence_threshold = sentence_threshold
+        self.embeddings = embeddings
+
+    def mergeGroup(self, texts):
+        # Chunks arrive in rank order, not document order, so any pair may be neighbours
+        merged = True
+        while merged and len(texts) > 1:
+            merged = False
+            for i in range(len(texts)):
+                for j in range(len(texts)):
+                    if i == j:
+                        continue
+                    left, right = texts[i], texts[j]
+                    if right in left:
+                        combined = left
+                    else:
+                        overlap = overlap_length(left, right, self.min_overlap)
+                        if not overlap:
+                            continue
+                        combined = left + right[overlap:]
+                    texts[min(i, j)] = combined
+                    del texts[max(i, j)]
+                    merged = True
+                    break
+                if merged:
+                    break
+        return texts
+
+    def merge(self, docs):
+        groups = {}
+        for doc in docs:
+            key = (doc.metadata.get("source"), doc.metadata.get("page"), doc.metadata.get("row"))
+            groups.setdefault(key, []).append(doc)
+
+        # Groups come out in the order of their best ranked chunk
+        merged = []
+        for group in groups.values():
+            for index, text in enumerate(self.mergeGroup([doc.page_content for doc in group])):
+                merged.append(group[0].model_copy(update={"page_content": text, "id": group[0].id if index == 0 else None}))
+        return merged
+
+    def dropSentences(self, docs, query_embedding):
+        sentences = [[part for part in SENTENCE_BOUNDARY.split(doc.page_content) if part.strip()] for doc in docs]
+        flat = [sentence for parts in sentences for sentence in parts]
+        if not flat:
+            return docs
+        query_embedding = normalize(query_embedding)
+        # Stores loaded from disk wrap their embedder in PrecomputedEmbeddings, which would keep every sentence's vector
+        embedder = getattr(self.embeddings, "embedder", self.embeddings)
+        scores = iter([
+            sum(x * y for x, y in zip(query_embedding, normalize(vector)))
+            for vector in embedder.embed_documents(flat)
+        ])
+
+        compressed = []
+        for doc, parts in zip(docs, sentences):
+            scored = [(sentence, next(scores)) for sentence in parts]
+            kept = [sentence for sentence, score in scored if score >= self.sentence_threshold]
+            if not kept and scored:
+                # A retrieved chunk keeps at least its most relevant sentence
+                kept = [max(scored, key=lambda item: item[1])[0]]
+            compressed.append(doc.model_copy(update={"page_content": " ".join(kept)}))
+        return compressed
+
+    def compress(self, docs, query_embedding=None):
+        compressed = self.merge(docs)
+        # Without a query embedding (lexical lookups) sentences are not scored, that would embed the query
+        if self.sentence_threshold is not None and self.embeddings is not None and query_embedding is not None:
+            compressed = self.dropSentences(compressed, query_embedding)
+        logging.info(f"Context compressed from {len(docs)} chunks to {len(compressed)} passages")
+        return compressed
@@ -1,33 +1,206 @@
 import os
 import sys
+import csv
+import codecs
+from collections import deque
+from functools import partial
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 
+import pymupdf
 from src.exception import CustomException
 from src.logger import logging
+from langchain_core.documents import Document
 from langchain_community.document_loaders import TextLoader, PyPDFLoader, UnstructuredExcelLoader
 from src.utils import get_file_type
+from src.components.table_store import TableLoader, TABLE_EXTENSIONS
+
+def pdf_metadata(pdf, file_name):
+    # Same keys PyMuPDFLoader puts on every page
+    metadata = {"producer": "PyMuPDF", "creator": "PyMuPDF", "creationdate": ""}
+    for key, value in pdf.metadata.items():
+        if not isinstance(value, (str, int)):
+            continue
+        if key in ("modDate", "creationDate"):
+            metadata[key] = value
+            key = key.lower()
+            try:
+                value = datetime.strptime(value.replace("'", ""), "D:%Y%m%d%H%M%S%z").isoformat("T")
+            except ValueError:
+                pass
+        metadata[key.lower()] = value.strip() if isinstance(value, str) else value
+    metadata.update({"source": file_name, "file_path": file_name, "total_pages": pdf.page_count})
+    return metadata
+
+def load_pdf_pages(file_name, start, end):
+    # Runs in a worker process: every worker opens the file itself and returns its pages
+    with pymupdf.open(file_name) as pdf:
+        metadata = pdf_metadata(pdf, file_name)
+        return [
+            Document(page_content=pdf[number].get_text().strip(), metadata={**metadata, "page": number})
+            for number in range(start, end)
+        ]
 
 class DataIngestion:
-    def __init__(self, file_name, loaders):
+    def __init__(self, file_name, loaders, pdf_workers=0, executor=None, table_chunk_tokens=None, table_directory=None):
         self.file_name = file_name
         self.loaders = loaders
-        
+        # PDFs are split into page ranges parsed in parallel when pdf_workers > 1 or an
+        # existing process pool is handed in through executor
+        self.pdf_workers = pdf_workers
+        self.executor = executor
+        # With table_chunk_tokens, .csv and .xlsx files are read as tables (see TableLoader)
+        # and stored in table_directory for aggregate queries
+        self.table_chunk_tokens = table_chunk_tokens
+        self.table_directory = table_directory
+        # Bytes of the file lazyLoadFile has read so far, for the progress of text and CSV files
+        self.bytes_read = 0
+
+    def getExtension(self):
+        ext = os.path.splitext(self.file_name)
+        extension = ext[1]
+
+        if(extension == ''):
+            extension = get_file_type(file_path=self.file_name)
+        logging.info("Extension of the file extracted successfully")
+        return extension
+
+    def getLoader(self):
+        if self.useTableLoader():
+            return partial(TableLoader, max_tokens=self.table_chunk_tokens, table_directory=self.table_directory)
+        return self.loaders.get(self.getExtension())
+
+    def useTableLoader(self):
+        return self.table_chunk_tokens is not None and self.getExtension() in TABLE_EXTENSIONS
+
+    def useParallelPdf(self):
+        return self.getExtension() == ".pdf" and (self.pdf_workers > 1 or self.executor is not None)
+
     def loadFile(self):
-        try:    
-            ext = os.path.splitext(self.file_name)
-            extension = ext[1]
-            
-            if(extension == ''):
-                extension = get_file_type(file_path=self.file_name)
-            logging.info("Extension of the file extracted successfully")
-            
-            loader = self.loaders.get(extension)
-            docs = loader(self.file_name).load()
+        try:
+            if self.useParallelPdf():
+                docs = list(self.parallelLoadPdf())
+            else:
+                loader = self.getLoader()
+                docs = loader(self.file_name).load()
             logging.info("Loading the data source done successfully")
             return docs
         except Exception as e:
             raise CustomException(e, sys)
 
+    def canLazyLoad(self):
+        """True for the formats lazyLoadFile reads piece by piece: PDF pages, blocks of text and CSV rows"""
+        return self.getExtension() == ".pdf" or self.canLoadFromStream()
+
+    def lazyLoadFile(self):
+        """
+        Returns a generator of documents instead of a full list. PDFs come one page at a time,
+        .txt files in blocks and .csv files row by row (see loadFromStream); other formats are
+        parsed whole by their loader.
+        """
+        try:
+            logging.info("Lazy loading of the data source started")
+            if self.useParallelPdf():
+                return self.parallelLoadPdf()
+            if self.canLoadFromStream():
+                return self.loadFromStream(self.readFile())
+            loader = self.getLoader()
+            return loader(self.file_name).lazy_load()
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def parallelLoadPdf(self, pages_per_task=None):
+        """
+        Yields PDF pages in page order while page ranges are parsed in a process pool.
+        Only a few ranges per worker are in flight so memory stays bounded.
+        """
+        with pymupdf.open(self.file_name) as pdf:
+            total_pages = pdf.page_count
+        workers = self.pdf_workers or getattr(self.executor, "_max_workers", 1)
+        if pages_per_task is None:
+            pages_per_task = max(1, min(32, total_pages // (workers * 4) or 1))
+        ranges = [(start, min(start + pages_per_task, total_pages)) for start in range(0, total_pages, pages_per_task)]
+        logging.info(f"Parsing {total_pages} PDF pages in {len(ranges)} ranges across {workers} workers")
+
+        executor = self.executor or ProcessPoolExecutor(max_workers=workers)
+        try:
+            pending = deque()
+            for start, end in ranges:
+                pending.append(executor.submit(load_pdf_pages, self.file_name, start, end))
+                if len(pending) >= workers * 2:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            if self.executor is None:
+                executor.shutdown(cancel_futures=True)
+
+    def readFile(self, block_size=1024 * 1024):
+        with open(self.file_name, "rb") as f:
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    return
+                self.bytes_read += len(block)
+                yield block
+
+    def progress(self):
+        """Fraction of a .txt or .csv file lazyLoadFile has read, None for other formats"""
+        if not self.bytes_read:
+            return None
+        return min(self.bytes_read / max(os.path.getsize(self.file_name), 1), 1.0)
+
+    def canLoadFromStream(self):
+        return self.getExtension() == ".txt" or (self.getExtension() == ".csv" and not self.useTableLoader())
+
+    def iterLines(self, chunks):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        pending = ""
+        for chunk in chunks:
+            pending += decoder.decode(chunk)
+            lines = pending.split("\n")
+            pending = lines.pop()
+            for line in lines:
+                yield line + "\n"
+        pending += decoder.decode(b"", final=True)
+        if pending:
+            yield pending
+
+    def loadFromStream(self, chunks, block_size=64 * 1024):
+        """
+        Parses .txt and .csv uploads while their bytes are still arriving. `chunks` is an
+        iterable of raw byte chunks. Text is emitted in blocks of about block_size characters
+        cut at line ends, CSV rows as one document each in the same format as CSVLoader.
+        """
+        if self.getExtension() == ".csv":
+            for row_number, row in enumerate(csv.DictReader(self.iterLines(chunks))):
+                content = "\n".join(
+                    f"{key.strip() if key is not None else key}: "
+                    f"{value.strip() if isinstance(value, str) else ','.join(map(str.strip, value)) if isinstance(value, list) else value}"
+                    for key, value in row.items()
+                )
+                yield Document(page_content=content, metadata={"source": self.file_name, "row": row_number})
+            return
+
+        block = []
+        size = 0
+        for line in self.iterLines(chunks):
+            block.append(line)
+            size += len(line)
+            if size >= block_size:
+                yield Document(page_content="".join(block), metadata={"source": self.file_name})
+                block = []
+                size = 0
+        if block:
+            yield Document(page_content="".join(block), metadata={"source": self.file_name})
+
 if __name__ == "__main__":
-    ingestion_obj = DataIngestion("Unit 5 pdf.pdf")
-    print(ingestion_obj.loadFile())
-    
\ No newline at end of file
+    from langchain_community.document_loaders import PyMuPDFLoader, CSVLoader
+
+    # python -m src.components.data_ingestion [file], benchmarks/end_to_end.py covers the whole pipeline
+    file_name = sys.argv[1] if len(sys.argv) > 1 else "Unit 5 pdf.pdf"
+    ingestion_obj = DataIngestion(file_name, loaders={".txt": TextLoader, ".pdf": PyMuPDFLoader, ".csv": CSVLoader})
+    docs = ingestion_obj.loadFile()
+    print(f"Loaded {len(docs)} documents from {file_name}")
+    if docs:
+        print(docs[0].page_content[:500])
@@ -1,37 +1,279 @@
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
 
 from src.exception import CustomException
 from src.logger import logging
+from langchain_core.embeddings import Embeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_ollama import OllamaEmbeddings
-from src.utils import get_file_type
+from src.utils import get_file_type, create_store, save_store, chunk_id, save_chunk_ids
+from src.components.lexical_index import LexicalIndex
+from src.components.embedding_backends import create_embeddings, cache_model_name, chunk_token_budget, embed_queries
+from src.components.text_splitter import OffsetTextSplitter
+from src.components.vector_compression import compress_store
+
+class PrecomputedEmbeddings(Embeddings):
+    """
+    Hands vectors that were already computed to the vector store, so stores
+    can be filled batch by batch without embedding the same text twice.
+    Queries (and any text not computed ahead) go to the wrapped embedder.
+    """
+    def __init__(self, embedder):
+        self.embedder = embedder
+        self.vectors = {}
+
+    def embed_documents(self, texts):
+        missing = [text for text in dict.fromkeys(texts) if text not in self.vectors]
+        if missing:
+            self.vectors.update(zip(missing, self.embedder.embed_documents(missing)))
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.embedder.embed_query(text)
+
+    def embed_queries(self, texts):
+        return embed_queries(self.embedder, texts)
 
 class DataTransformation():
-    def __init__(self, documents, file_name, databases, embeddings):
+    """
+    Splits, embeds and indexes documents. `documents` may be a list or any iterable
+    (e.g. DataIngestion.lazyLoadFile()); documents are consumed one at a time and only
+    a bounded number of chunk batches is held in memory at once.
+
+    Every chunk gets a content-addressed id. Passing existing_db and existing_ids updates
+    that store in place: only chunks with new ids are embedded and added, and ids that
+    are no longer produced are deleted.
+
+    A BM25 LexicalIndex over the same chunks is built alongside the store. When updating,
+    pass the collection's lexical_index so it is updated in place too.
+
+    embedding_backend picks where chunks are embedded (see create_embeddings), with
+    embedding_options passed on to the backend. compression (keyword arguments of
+    compress_store, e.g. {"method": "int8"}) quantizes FAISS stores once they are built.
+
+    text_splitter "recursive" cuts chunks of chunk_size characters, "tokens" uses
+    OffsetTextSplitter with chunks of chunk_tokens (capped by the embedding model's input
+    limit) overlapping by chunk_overlap_tokens, splitting split_workers pages at a time.
+
+    stats["stage_seconds"] holds the time the pipeline waited on loading, splitting,
+    embedding and indexing.
+    """
+    def __init__(self, documents, file_name, databases, embeddings, batch_size=64, max_workers=4, cache=None,
+                 persist_directory=None, progress_callback=None, existing_db=None, existing_ids=None,
+                 chunk_size=2000, chunk_overlap=500, lexical_index=None, embedding_backend="ollama",
+                 embedding_options=None, compression=None, text_splitter="recursive", chunk_tokens=500,
+                 chunk_overlap_tokens=125, split_workers=4):
         self.documents = documents
         self.file_name = file_name
         self.databases = databases
         self.embeddings = embeddings
-    
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.embedding_backend = embedding_backend
+        self.embedding_options = embedding_options or {}
+        self.compression = compression
+        self.text_splitter = text_splitter
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        self.split_workers = split_workers
+        self.max_workers = max_workers
+        self.cache = cache
+        self.persist_directory = persist_directory
+        self.progress_callback = progress_callback
+        self.existing_db = existing_db
+        self.existing_ids = set(existing_ids or ())
+        # An existing store without its lexical index gets none, a partial one would miss old chunks
+        self.lexical_index = lexical_index if lexical_index is not None or existing_db is not None else LexicalIndex()
+        self.chunk_ids = []
+        self.occurrences = {}
+        self.extension = None
+        self.position = (None, None)
+        self.stats = {}
+        self.stage_seconds = {}
+
+    def timed(self, stage, items):
+        """Yields from items, adding the time spent producing every item to stage_seconds[stage]"""
+        items = iter(items)
+        while True:
+            start = time.perf_counter()
+            item = next(items, None)
+            self.stage_seconds[stage] += time.perf_counter() - start
+            if item is None:
+                return
+            yield item
+
+    def createSplitter(self, model, embedder):
+        if self.text_splitter == "tokens":
+            # Local backends hold the model's tokenizer, tokens are then counted exactly
+            return OffsetTextSplitter(
+                max_tokens=chunk_token_budget(model, self.chunk_tokens),
+                overlap_tokens=self.chunk_overlap_tokens,
+                tokenizer=getattr(embedder, "tokenizer", None),
+                max_workers=self.split_workers
+            )
+        return RecursiveCharacterTextSplitter(chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
+
+    def splitDocuments(self, splitter):
+        """(document, chunks) pairs in document order"""
+        documents = self.timed("load", self.documents)
+        if isinstance(splitter, OffsetTextSplitter):
+            return splitter.iterSplit(documents)
+        return ((document, splitter.split_documents([document])) for document in documents)
+
+    def iterChunks(self, splitter):
+        # Splitting pulls the documents, so its time includes loading until transformDocuments subtracts it
+        for document, chunks in self.timed("split", self.splitDocuments(splitter)):
+            self.stats["documents"] += 1
+            # PyMuPDF pages carry their position, used for progress when the total is unknown
+            self.position = (document.metadata.get("page"), document.metadata.get("total_pages"))
+            for chunk in chunks:
+                text_id = chunk_id(chunk.page_content)
+                chunk.id = chunk_id(chunk.page_content, self.occurrences.get(text_id, 0))
+                self.occurrences[text_id] = self.occurrences.get(text_id, 0) + 1
+                self.chunk_ids.append(chunk.id)
+                if chunk.id in self.existing_ids:
+                    self.stats["unchanged"] += 1
+                    continue
+                yield chunk
+
+    def iterBatches(self, chunks):
+        batch = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def progress(self):
+        if isinstance(self.documents, list):
+            return self.stats["documents"] / max(len(self.documents), 1)
+        page, total_pages = self.position
+        if isinstance(page, int) and total_pages:
+            return (page + 1) / total_pages
+        return None
+
+    def embedBatch(self, embedder, model, batch):
+        texts = [doc.page_content for doc in batch]
+        vectors = self.cache.getMany(model, texts) if self.cache is not None else {}
+        hits = sum(1 for text in texts if text in vectors)
+
+        # Only chunks the cache has never seen for this model go to the embedding server
+        missing = [text for text in dict.fromkeys(texts) if text not in vectors]
+        if missing:
+            computed = embedder.embed_documents(missing)
+            vectors.update(zip(missing, computed))
+            if self.cache is not None:
+                self.cache.putMany(model, missing, computed)
+        return [vectors[text] for text in texts], hits
+
+    def addBatch(self, db, store, embedding, batch, vectors):
+        texts = [doc.page_content for doc in batch]
+        metadatas = [doc.metadata for doc in batch]
+        ids = [doc.id for doc in batch]
+        # Stores loaded from disk carry their own PrecomputedEmbeddings (see VectorStoreRegistry)
+        if db is not None and isinstance(db.embeddings, PrecomputedEmbeddings):
+            embedding = db.embeddings
+        embedding.vectors.update(zip(texts, vectors))
+        if db is None:
+            db = create_store(store, texts, embedding, metadatas, ids, self.persist_directory)
+        else:
+            db.add_texts(texts=texts, metadatas=metadatas, ids=ids)
+        embedding.vectors.clear()
+        if self.lexical_index is not None:
+            self.lexical_index.add(batch)
+        return db
+
+    def collectBatches(self, pending, db, store, embedding, return_when):
+        start = time.perf_counter()
+        done, _ = wait(pending, return_when=return_when)
+        self.stage_seconds["embed"] += time.perf_counter() - start
+        for future in done:
+            batch = pending.pop(future)
+            vectors, hits = future.result()
+            start = time.perf_counter()
+            db = self.addBatch(db, store, embedding, batch, vectors)
+            self.stage_seconds["index"] += time.perf_counter() - start
+            self.stats["chunks"] += len(batch)
+            self.stats["cache_hits"] += hits
+            self.stats["cache_misses"] += len(batch) - hits
+            if self.progress_callback is not None:
+                self.progress_callback(self.progress())
+        return db
+
     def transformDocuments(self):
         try:
             ext = os.path.splitext(self.file_name)
             extension = ext[1]
-            
+
             if extension == '':
                 extension = get_file_type(file_path=self.file_name)
-                
-            docs = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=500).split_documents(self.documents)
+            self.extension = extension
+
+            store = self.databases.get(extension)
+            model = self.embeddings.get(extension)
+            embedder = create_embeddings(model, self.embedding_backend, **self.embedding_options)
+            splitter = self.createSplitter(model, embedder)
+            embedding = PrecomputedEmbeddings(embedder)
+            db = self.existing_db
+            self.position = (None, None)
+            self.chunk_ids = []
+            self.occurrences = {}
+            self.stats = {"documents": 0, "chunks": 0, "batches": 0, "cache_hits": 0, "cache_misses": 0, "unchanged": 0}
+            self.stage_seconds = {"load": 0.0, "split": 0.0, "embed": 0.0, "index": 0.0}
+            start = time.perf_counter()
+
+            # Documents are split as they are loaded and at most two batches per worker are
+            # in flight, so memory stays bounded while results are added to the store as
+            # soon as they come back
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                pending = {}
+                for batch in self.iterBatches(self.iterChunks(splitter)):
+                    pending[executor.submit(self.embedBatch, embedder, cache_model_name(model, self.embedding_backend), batch)] = batch
+                    self.stats["batches"] += 1
+                    if len(pending) >= self.max_workers * 2:
+                        db = self.collectBatches(pending, db, store, embedding, FIRST_COMPLETED)
+                while pending:
+                    db = self.collectBatches(pending, db, store, embedding, ALL_COMPLETED)
             logging.info("Documents splitting done successfully")
-            if(len(docs) > 0):
-                try:
-                    db = self.databases.get(extension).from_documents(documents=docs[:20], embedding=OllamaEmbeddings(model=self.embeddings.get(extension)))
-                    logging.info("Documents splitting done successfully")
-                    logging.info("Chunks stored in vector database successfully")
-                    return db
-                except Exception as e:
-                    raise CustomException(e, sys)
+            self.stage_seconds["split"] -= self.stage_seconds["load"]
+
+            if db is None:
+                logging.info("No chunks produced from the documents")
+                return None
+
+            index_start = time.perf_counter()
+            removed = list(self.existing_ids - set(self.chunk_ids))
+            if removed:
+                db.delete(ids=removed)
+                if self.lexical_index is not None:
+                    self.lexical_index.delete(removed)
+            self.stats["added"] = self.stats["chunks"]
+            self.stats["removed"] = len(removed)
+            self.occurrences = {}
+
+            if self.compression:
+                db = compress_store(db, **self.compression)
+
+            if self.persist_directory is not None:
+                save_store(db, self.persist_directory)
+                save_chunk_ids(self.persist_directory, self.chunk_ids)
+                if self.lexical_index is not None:
+                    self.lexical_index.save(self.persist_directory)
+
+            self.stage_seconds["index"] += time.perf_counter() - index_start
+            self.stats["stage_seconds"] = {stage: round(seconds, 3) for stage, seconds in self.stage_seconds.items()}
+
+            elapsed = time.perf_counter() - start
+            self.stats["seconds"] = round(elapsed, 3)
+            self.stats["chunks_per_sec"] = round(self.stats["chunks"] / elapsed, 2) if elapsed > 0 else None
+            logging.info(f"Embedded {self.stats['chunks']} chunks in {self.stats['batches']} batches "
+                         f"({self.stats['chunks_per_sec']} chunks/sec, {self.stats['cache_hits']} cache hits)")
+            logging.info("Chunks stored in vector database successfully")
+            return db
         except Exception as e:
             raise CustomException(e, sys)
-    
\ No newline at end of file
+
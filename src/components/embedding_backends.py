@@ -0,0 +1,147 @@
+import os
+import sys
+import threading
+
+import numpy as np
+from src.exception import CustomException
+from src.logger import logging
+from langchain_core.embeddings import Embeddings
+from langchain_ollama import OllamaEmbeddings
+
+# Hugging Face checkpoints of the Ollama models in `vector_embeddings`, with the prefixes
+# both models were trained with for documents and queries
+LOCAL_MODELS = {
+    "nomic-embed-text:v1.5": {
+        "name": "nomic-ai/nomic-embed-text-v1.5",
+        "document_prefix": "search_document: ",
+        "query_prefix": "search_query: ",
+        "trust_remote_code": True
+    },
+    "snowflake-arctic-embed:335m": {
+        "name": "Snowflake/snowflake-arctic-embed-l",
+        "document_prefix": "",
+        "query_prefix": "Represent this sentence for searching relevant passages: ",
+        "trust_remote_code": False
+    }
+}
+
+# Longest input of each model in tokens, longer chunks are silently truncated by the server
+MODEL_TOKEN_LIMITS = {
+    "nomic-embed-text:v1.5": 8192,
+    "snowflake-arctic-embed:335m": 512
+}
+
+def chunk_token_budget(model, chunk_tokens):
+    """Tokens a chunk may hold for model, leaving room for special tokens and the document prefix"""
+    limit = MODEL_TOKEN_LIMITS.get(model)
+    return chunk_tokens if limit is None else min(chunk_tokens, limit - 16)
+
+class LocalEmbeddings(Embeddings):
+    """
+    In-process CPU embeddings with sentence-transformers (`backend="onnx"` runs the ONNX
+    export through onnxruntime). Texts are sorted by length and cut into batches of about
+    max_batch_tokens so short chunks are not padded to the longest one in a fixed-size batch.
+    Only one batch runs at a time: the model already uses `threads` cores, concurrent
+    batches from DataTransformation's thread pool would only compete for them.
+    """
+    def __init__(self, model, backend="torch", threads=None, max_batch_tokens=16384, max_batch_size=128):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise CustomException(ImportError("The local embedding backends need sentence-transformers "
+                                              "(pip install sentence-transformers[onnx])"), sys) from e
+        try:
+            config = LOCAL_MODELS.get(model, {"name": model, "document_prefix": "", "query_prefix": "",
+                                              "trust_remote_code": False})
+            self.document_prefix = config["document_prefix"]
+            self.query_prefix = config["query_prefix"]
+            self.max_batch_tokens = max_batch_tokens
+            self.max_batch_size = max_batch_size
+            self.threads = threads or os.cpu_count() or 1
+            self.lock = threading.Lock()
+
+            model_kwargs = {}
+            if backend == "onnx":
+                import onnxruntime
+                options = onnxruntime.SessionOptions()
+                options.intra_op_num_threads = self.threads
+                model_kwargs = {"provider": "CPUExecutionProvider", "session_options": options}
+            else:
+                import torch
+                torch.set_num_threads(self.threads)
+            self.model = SentenceTransformer(
+                config["name"], device="cpu", backend=backend,
+                trust_remote_code=config["trust_remote_code"], model_kwargs=model_kwargs
+            )
+            self.tokenizer = self.model.tokenizer
+            logging.info(f"Local {backend} embedding model {config['name']} loaded with {self.threads} threads")
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def batches(self, texts):
+        """Index batches over texts sorted by length, bounded by max_batch_tokens of padded input"""
+        lengths = [len(ids) for ids in self.tokenizer(texts, add_special_tokens=True, truncation=True)["input_ids"]]
+        order = sorted(range(len(texts)), key=lengths.__getitem__)
+        batch = []
+        for index in order:
+            # Sorted ascending, so the current text is the longest and sets the padded width
+            if batch and ((len(batch) + 1) * lengths[index] > self.max_batch_tokens or len(batch) == self.max_batch_size):
+                yield batch
+                batch = []
+            batch.append(index)
+        if batch:
+            yield batch
+
+    def embedArray(self, texts, prefix=""):
+        """Embeddings of texts as one float32 array of shape (len(texts), dimension)"""
+        texts = [prefix + text for text in texts]
+        with self.lock:
+            vectors = None
+            for batch in self.batches(texts):
+                encoded = self.model.encode([texts[i] for i in batch], batch_size=len(batch), convert_to_numpy=True,
+                                            normalize_embeddings=True)
+                if vectors is None:
+                    vectors = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+                vectors[batch] = encoded
+            return vectors if vectors is not None else np.empty((0, 0), dtype=np.float32)
+
+    def embed_documents(self, texts):
+        return self.embedArray(texts, self.document_prefix).tolist()
+
+    def embed_query(self, text):
+        return self.embedArray([text], self.query_prefix)[0].tolist()
+
+    def embed_queries(self, texts):
+        return self.embedArray(texts, self.query_prefix).tolist()
+
+# Loading a local model takes seconds and hundreds of MB, so one instance per process is shared
+local_models = {}
+local_models_lock = threading.Lock()
+
+def create_embeddings(model, backend="ollama", **options):
+    """
+    Embedder for `model` on the given backend: "ollama" (HTTP to the Ollama server),
+    "local" (sentence-transformers on CPU) or "onnx" (sentence-transformers with onnxruntime)
+    """
+    if backend == "ollama":
+        return OllamaEmbeddings(model=model)
+    if backend in ("local", "onnx"):
+        key = (model, backend)
+        with local_models_lock:
+            if key not in local_models:
+                local_models[key] = LocalEmbeddings(model, backend="onnx" if backend == "onnx" else "torch", **options)
+            return local_models[key]
+    raise ValueError(f"Unknown embedding backend {backend}")
+
+def embed_queries(embedder, texts):
+    """Query embeddings of several texts in one call where the backend allows it"""
+    if hasattr(embedder, "embed_queries"):
+        return embedder.embed_queries(texts)
+    if isinstance(embedder, OllamaEmbeddings):
+        # Ollama embeds queries and documents the same way
+        return embedder.embed_documents(texts)
+    return [embedder.embed_query(text) for text in texts]
+
+def cache_model_name(model, backend="ollama"):
+    # Vectors from different backends differ slightly, they must not share cache entries
+    return model if backend == "ollama" else f"{backend}:{model}"
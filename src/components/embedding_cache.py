@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+
+from src.exception import CustomException
+from src.logger import logging
+
+class EmbeddingCache():
+    """
+    On-disk cache of chunk embeddings keyed by (embedding model, sha256 of the chunk text).
+    Least recently used entries are evicted once the cache holds more than max_entries vectors.
+    The size is checked after every evict_every stored vectors, not on every put, so it can go
+    over max_entries by that much (per process sharing the file) in between.
+    """
+    def __init__(self, path, max_entries=500000, evict_every=None):
+        try:
+            self.path = path
+            self.max_entries = max_entries
+            self.evict_every = evict_every or max(1, max_entries // 100)
+            self.unchecked = 0
+            self.lock = threading.Lock()
+
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # Shared with the job worker processes, writers wait for each other instead of failing
+            self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (model, hash)
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+            self.conn.commit()
+            logging.info(f"Embedding cache opened at {path}")
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    @staticmethod
+    def hashText(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def getMany(self, model, texts):
+        """Returns {text: vector} for every text already in the cache"""
+        hashes = {self.hashText(text): text for text in texts}
+        found = {}
+        with self.lock:
+            keys = list(hashes)
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self.conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                    [model, *part]
+                ).fetchall()
+                for hash_, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[hashes[hash_]] = vector.tolist()
+                if rows:
+                    self.conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE model = ? AND hash IN ({placeholders})",
+                        [time.time(), model, *part]
+                    )
+            self.conn.commit()
+        return found
+
+    def putMany(self, model, texts, vectors):
+        now = time.time()
+        rows = [(model, self.hashText(text), array("f", vector).tobytes(), now) for text, vector in zip(texts, vectors)]
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self.unchecked += len(rows)
+            if self.unchecked >= self.evict_every:
+                self.unchecked = 0
+                self.evict()
+            self.conn.commit()
+
+    def evict(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,)
+            )
+            logging.info(f"Evicted {count - self.max_entries} entries from embedding cache")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,157 @@
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+from src.exception import CustomException
+from src.logger import logging
+
+class JobQueue():
+    """
+    Durable queue of background upload jobs stored in SQLite, shared by the API
+    process and any number of worker processes. Finished job records are kept
+    for ttl seconds and then removed.
+    """
+    def __init__(self, path, ttl=24 * 60 * 60):
+        try:
+            self.path = path
+            self.ttl = ttl
+            self.lock = threading.Lock()
+
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+            self.conn.row_factory = sqlite3.Row
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    file_size INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    progress REAL NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    worker TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    finished_at REAL,
+                    digest TEXT
+                )""")
+            # Queues created before uploads were hashed have no digest column yet
+            columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+            if "digest" not in columns:
+                self.conn.execute("ALTER TABLE jobs ADD COLUMN digest TEXT")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def toDict(self, row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def enqueue(self, file_path, filename, file_size, job_id=None, digest=None):
+        job_id = job_id or str(uuid.uuid4())
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO jobs (id, filename, file_path, file_size, status, stage, created_at, updated_at, digest) "
+                "VALUES (?, ?, ?, ?, 'queued', 'queued', ?, ?, ?)",
+                (job_id, filename, file_path, file_size, now, now, digest)
+            )
+        logging.info(f"Job {job_id} queued for {filename}")
+        return job_id
+
+    def claim(self, worker_id):
+        """Atomically hands the oldest queued job to this worker, or returns None"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self.conn.execute(
+                        "UPDATE jobs SET status = 'processing', worker = ?, updated_at = ? WHERE id = ?",
+                        (worker_id, time.time(), row["id"])
+                    )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = self.toDict(row)
+        job["status"] = "processing"
+        return job
+
+    def update(self, job_id, stage, progress):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET stage = ?, progress = ?, updated_at = ? WHERE id = ?",
+                (stage, round(progress, 1), time.time(), job_id)
+            )
+
+    def heartbeat(self, job_id):
+        """Marks a job as still running when its progress cannot be measured"""
+        with self.lock:
+            self.conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def complete(self, job_id, result):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'completed', stage = 'done', progress = 100, result = ?, "
+                "updated_at = ?, finished_at = ? WHERE id = ?",
+                (json.dumps(result), now, now, job_id)
+            )
+
+    def fail(self, job_id, error):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ?, finished_at = ? WHERE id = ?",
+                (error, now, now, job_id)
+            )
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self.toDict(row)
+
+    def depth(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def requeueStale(self, timeout):
+        """Puts jobs back in the queue when their worker stopped reporting progress"""
+        with self.lock:
+            count = self.conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, updated_at = ? "
+                "WHERE status = 'processing' AND updated_at < ?",
+                (time.time(), time.time() - timeout)
+            ).rowcount
+        if count:
+            logging.info(f"Requeued {count} stale jobs")
+        return count
+
+    def cleanup(self):
+        with self.lock:
+            count = self.conn.execute(
+                "DELETE FROM jobs WHERE status IN ('completed', 'failed') AND finished_at < ?",
+                (time.time() - self.ttl,)
+            ).rowcount
+        if count:
+            logging.info(f"Removed {count} expired job records")
+        return count
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,189 @@
+import os
+import re
+import sys
+import json
+import math
+import threading
+from collections import Counter
+
+from src.exception import CustomException
+from src.logger import logging
+from langchain_core.documents import Document
+
+LEXICAL_INDEX_FILE = "lexical.json"
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i", "in",
+    "is", "it", "me", "of", "on", "or", "the", "this", "that", "to", "was", "what", "when", "where",
+    "which", "who", "why", "with", "you", "your"
+}
+
+def tokenize(text):
+    return [token for token in re.findall(r"\w+", text.lower()) if token not in STOPWORDS]
+
+def is_identifier(word):
+    """Part numbers, codes and names: digits, "_" or an inner "-" ("AX-0042", "2023", "max_len"), or ALLCAPS ("SKU")"""
+    word = word.strip(".,;:!?()[]'\"")
+    if re.search(r"\d|_|\w-\w", word):
+        return True
+    return len(word) > 1 and word.isalpha() and word.isupper()
+
+# Words that make a query a question or an instruction, never a bare lookup
+QUESTION_WORDS = {
+    "what", "who", "whom", "whose", "why", "how", "when", "where", "which", "is", "are", "does", "do",
+    "can", "explain", "describe", "summarize", "summarise", "compare", "define", "tell", "list", "show", "give"
+}
+
+def is_keyword_query(query, max_terms=3):
+    """
+    True for lookups that do not need semantic search: quoted phrases and short queries made
+    mostly of identifiers such as part numbers ("AX-0042", "invoice 2023"). Questions and
+    instructions ("What happened in 1947?", "Explain the TCP handshake") go to hybrid retrieval,
+    where the lexical ranking still counts through rank fusion.
+    """
+    query = query.strip()
+    if len(query) > 2 and query[0] == query[-1] == '"':
+        return True
+    words = query.split()
+    if not words or len(words) > max_terms * 2 or query.endswith("?"):
+        return False
+    if any(word.strip(".,;:!()[]'\"").lower() in QUESTION_WORDS for word in words):
+        return False
+    terms = [word for word in words if word.strip(".,;:!()[]'\"").lower() not in STOPWORDS]
+    identifiers = sum(is_identifier(word) for word in terms)
+    return identifiers > 0 and identifiers * 2 >= len(terms)
+
+def matches_filter(metadata, metadata_filter):
+    for key, value in (metadata_filter or {}).items():
+        if metadata.get(key) not in (value if isinstance(value, list) else [value]):
+            return False
+    return True
+
+def document_key(doc):
+    return doc.id or doc.page_content
+
+def reciprocal_rank_fusion(rankings, weights, k=60, limit=None):
+    """Fuses ranked document lists, every document scores sum(weight / (k + rank))"""
+    scores = {}
+    documents = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc in enumerate(ranking, start=1):
+            key = document_key(doc)
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+            documents.setdefault(key, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [documents[key] for key in ranked[:limit]]
+
+class LexicalIndex():
+    """
+    Okapi BM25 over the chunks of one collection, kept next to its vector store as
+    lexical.json. Chunks are keyed by the same content-addressed ids as the store so
+    incremental updates can add and delete them in step.
+    """
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        # chunk id -> (text, metadata, number of terms)
+        self.documents = {}
+        # term -> {chunk id: term frequency}
+        self.postings = {}
+        self.total_length = 0
+        self.lock = threading.Lock()
+
+    def add(self, documents):
+        with self.lock:
+            for doc in documents:
+                if doc.id in self.documents:
+                    continue
+                terms = Counter(tokenize(doc.page_content))
+                length = sum(terms.values())
+                self.documents[doc.id] = (doc.page_content, doc.metadata, length)
+                self.total_length += length
+                for term, count in terms.items():
+                    self.postings.setdefault(term, {})[doc.id] = count
+
+    def delete(self, ids):
+        with self.lock:
+            for doc_id in ids:
+                entry = self.documents.pop(doc_id, None)
+                if entry is None:
+                    continue
+                self.total_length -= entry[2]
+                for term in set(tokenize(entry[0])):
+                    postings = self.postings.get(term)
+                    if postings is not None:
+                        postings.pop(doc_id, None)
+                        if not postings:
+                            del self.postings[term]
+
+    def search(self, query, k=4, metadata_filter=None):
+        """Returns up to k documents ranked by BM25 score, only documents sharing a term with the query"""
+        with self.lock:
+            count = len(self.documents)
+            if count == 0:
+                return []
+            average_length = self.total_length / count or 1
+            scores = {}
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    if metadata_filter and not matches_filter(self.documents[doc_id][1], metadata_filter):
+                        continue
+                    length = self.documents[doc_id][2]
+                    norm = frequency + self.k1 * (1 - self.b + self.b * length / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / norm
+            ranked = sorted(scores, key=scores.get, reverse=True)[:k]
+            return [
+                Document(id=doc_id, page_content=self.documents[doc_id][0], metadata=dict(self.documents[doc_id][1]))
+                for doc_id in ranked
+            ]
+
+    def getDocuments(self, ids):
+        """The chunks with these ids in the given order, ids that are not indexed are skipped"""
+        with self.lock:
+            return [
+                Document(id=doc_id, page_content=self.documents[doc_id][0], metadata=dict(self.documents[doc_id][1]))
+                for doc_id in ids if doc_id in self.documents
+            ]
+
+    def __len__(self):
+        return len(self.documents)
+
+    def save(self, directory):
+        try:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, LEXICAL_INDEX_FILE)
+            with self.lock:
+                data = {
+                    "k1": self.k1,
+                    "b": self.b,
+                    "documents": self.documents,
+                    "postings": self.postings
+                }
+                # Written next to the final file and swapped in, so readers never see half of it
+                with open(path + ".tmp", "w") as f:
+                    json.dump(data, f, default=str)
+            os.replace(path + ".tmp", path)
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    @classmethod
+    def load(cls, directory):
+        """Returns the index saved in directory, or None for collections built without one"""
+        path = os.path.join(directory, LEXICAL_INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            index = cls(k1=data["k1"], b=data["b"])
+            index.documents = {doc_id: tuple(entry) for doc_id, entry in data["documents"].items()}
+            index.postings = data["postings"]
+            index.total_length = sum(entry[2] for entry in index.documents.values())
+            logging.info(f"Lexical index with {len(index)} chunks loaded from {directory}")
+            return index
+        except Exception as e:
+            raise CustomException(e, sys)
@@ -0,0 +1,190 @@
+import os
+import json
+import math
+import bisect
+import threading
+
+from src.logger import logging
+
+# Seconds, from a fast query stage up to the embedding of a large file
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+def format_number(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class Metric():
+    """
+    A metric family: one value per combination of label values. function, when given,
+    is called at scrape time instead of keeping values, returning a number, or a dict
+    from label value tuples to numbers for labelled metrics.
+    """
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """Current values as {label value tuple: value}"""
+        if self.function is None:
+            with self.lock:
+                return dict(self.values)
+        values = self.function()
+        return values if isinstance(values, dict) else {(): values}
+
+    def render(self, values):
+        return [f"{self.name}{format_labels(self.labelnames, key)} {format_number(value)}" for key, value in values.items()]
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+class Histogram(Metric):
+    """Cumulative bucket counts, sum and count of the observed values per label combination"""
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value)
+
+    def samples(self):
+        with self.lock:
+            return {key: (list(counts), total) for key, (counts, total) in self.values.items()}
+
+    def render(self, values):
+        lines = []
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, [('le', format_number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {format_number(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class MetricsRegistry():
+    """
+    Counters, gauges and histograms rendered in the Prometheus text format.
+
+    Background jobs run in their own processes: they write their values to shared_directory
+    with dump(), and render() adds up the counters and histograms of every process found
+    there. Gauges are only read from the rendering process.
+    """
+    def __init__(self, shared_directory=None):
+        self.shared_directory = shared_directory
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=(), function=None):
+        return self.register(Counter(name, documentation, labelnames, function))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self):
+        """Values of the counters and histograms this process keeps, as JSON serializable lists"""
+        return {
+            name: [[list(key), value] for key, value in metric.samples().items()]
+            for name, metric in self.metrics.items()
+            if metric.type != "gauge" and metric.function is None
+        }
+
+    def dump(self):
+        """Writes this process's values for the process rendering /metrics"""
+        if self.shared_directory is None:
+            return
+        try:
+            os.makedirs(self.shared_directory, exist_ok=True)
+            path = os.path.join(self.shared_directory, f"{os.getpid()}.json")
+            with open(path + ".tmp", "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            # Metrics must never fail a job
+            logging.warning(f"Could not write metrics snapshot: {str(e)}")
+
+    def clearShared(self):
+        """Forgets the values of earlier processes, called once when the server starts"""
+        if self.shared_directory is None or not os.path.isdir(self.shared_directory):
+            return
+        for name in os.listdir(self.shared_directory):
+            os.remove(os.path.join(self.shared_directory, name))
+
+    def sharedSnapshots(self):
+        if self.shared_directory is None or not os.path.isdir(self.shared_directory):
+            return []
+        snapshots = []
+        for name in os.listdir(self.shared_directory):
+            if not name.endswith(".json") or name == f"{os.getpid()}.json":
+                continue
+            try:
+                with open(os.path.join(self.shared_directory, name)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logging.warning(f"Skipping metrics snapshot {name}: {str(e)}")
+        return snapshots
+
+    def render(self):
+        snapshots = self.sharedSnapshots()
+        lines = []
+        for name, metric in self.metrics.items():
+            values = metric.samples()
+            for snapshot in snapshots:
+                for key, value in snapshot.get(name, ()):
+                    key = tuple(key)
+                    if metric.type == "histogram":
+                        counts, total = values.get(key, ([0] * len(metric.buckets), 0.0))
+                        values[key] = ([a + b for a, b in zip(counts, value[0])], total + value[1])
+                    else:
+                        values[key] = values.get(key, 0) + value
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            lines.extend(metric.render(values))
+        return "\n".join(lines) + "\n"
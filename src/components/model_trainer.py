@@ -1,29 +1,27 @@
 import os
 import sys
+import time
+import threading
+from collections import OrderedDict
 
+import httpx
 from src.exception import CustomException
 from src.logger import logging
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_classic.chains.combine_documents import create_stuff_documents_chain
 from langchain_community.llms import Ollama
-from langchain_classic.chains import create_retrieval_chain
-from src.utils import get_file_type
+from src.utils import get_file_type, filter_kwargs, relevance_search, count_tokens
+from src.components.lexical_index import is_keyword_query, reciprocal_rank_fusion
+from src.components.context_compressor import ContextCompressor
+from src.components.summary_index import is_summary_query
+from src.components.table_store import is_aggregate_query
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
 
-class ModelTraining():
-    def __init__(self, db, query, file_name, models):
-        self.db = db
-        self.query = query
-        self.file_name = file_name
-        self.models = models
-    
-    def getContext(self):
-        try:
-            prompt = ChatPromptTemplate.from_template("""
-            You are a helpful assistant. You help the users to get their queries clarified. Answer to the user in very friendly, professional way don't 
-            answer the user in a very rude way. The user is gonna attach you a file it may be of any extension lile pdf/txt\excel etc. And they are gonna
-            ask you the queries based on that file only sometimes they might ask you to summarize the file. I am gonna provide you some steps like how to give 
+PROMPT_TEMPLATE = """
+            You are a helpful assistant. You help the users to get their queries clarified. Answer to the user in very friendly, professional way don't
+            answer the user in a very rude way. The user is gonna attach you a file it may be of any extension lile pdf/txt\\excel etc. And they are gonna
+            ask you the queries based on that file only sometimes they might ask you to summarize the file. I am gonna provide you some steps like how to give
             answer the user in a very friendly and professional way. Follow the below steps as it is don't miss any step.
 
             Step-1: Read the file very carefully and read it twice to understand the context, and main keywords which are present in the file.
@@ -36,35 +34,346 @@ class ModelTraining():
             {context}
             </context>
 
-            Question: {input}""")
-            
-            load_dotenv()
-            os.environ['GROQ_API_KEY'] = os.getenv("GROQ_API_KEY")
-            
-            ext = os.path.splitext(self.file_name)
-            extension = ext[1]
-            
-            if extension == '':
-                extension = get_file_type(file_path=self.file_name)
-                
-            logging.info("File extension loaded successfully")
-            llm = ChatGroq(
-                model=self.models.get(extension),
-                temperature=0,max_tokens=None,  
+            Question: {input}"""
+
+class ChainFactory():
+    """
+    Long lived holder of everything a query needs besides retrieval and generation:
+    the prompt, one ChatGroq client per model sharing a pooled HTTP client, the
+    document chain per model and the vector store per (model, collection) pair.
+    """
+    def __init__(self, max_chains=64):
+        load_dotenv()
+        self.prompt = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            timeout=None
+        )
+        self.max_chains = max_chains
+        self.llms = {}
+        self.document_chains = {}
+        self.chains = OrderedDict()
+        self.lock = threading.Lock()
+
+    def getLLM(self, model):
+        if model not in self.llms:
+            self.llms[model] = ChatGroq(
+                model=model,
+                temperature=0,max_tokens=None,
                 # reasoning_format="parsed",
                 timeout=None,
                 max_retries=2,
+                http_client=self.http_client,
             )
-            document_chain = create_stuff_documents_chain(llm=llm, prompt=prompt)        
-            retriever = self.db.as_retriever()
-            logging.info("Chain and Retriever initialized successfully")
-            retrieval_chain = create_retrieval_chain(retriever, document_chain)
-            response = retrieval_chain.invoke(
+            logging.info(f"LLM client created for {model}")
+        return self.llms[model]
+
+    def getChain(self, model, collection_id, db):
+        """Returns (vectorstore, document_chain) for the collection, building the chain on first use"""
+        key = (model, collection_id)
+        with self.lock:
+            cached = self.chains.get(key)
+            # A collection that was evicted and loaded again is a new store object
+            if cached is not None and cached[0] is db:
+                self.chains.move_to_end(key)
+                return cached
+
+            if model not in self.document_chains:
+                self.document_chains[model] = create_stuff_documents_chain(llm=self.getLLM(model), prompt=self.prompt)
+            self.chains[key] = (db, self.document_chains[model])
+            while len(self.chains) > self.max_chains:
+                self.chains.popitem(last=False)
+            logging.info("Chain initialized successfully")
+            return self.chains[key]
+
+    def invalidate(self, collection_id):
+        with self.lock:
+            for key in [key for key in self.chains if key[1] == collection_id]:
+                del self.chains[key]
+
+# mode is "vector", "lexical", "hybrid" (both fused with reciprocal rank fusion) or "auto",
+# which answers keyword lookups from the lexical index alone and uses hybrid otherwise.
+# search_type "mmr" diversifies the vector results among fetch_k candidates, score_threshold
+# drops vector results below that relevance, filter matches chunk metadata such as
+# {"page": 3} and max_context_tokens caps the size of the context put into the prompt.
+# compress merges overlapping neighbour chunks, sentence_threshold also drops sentences
+# less similar to the query than that (see ContextCompressor). With ingest-time summaries,
+# summaries answers summarize queries from them and coarse_sections narrows retrieval of
+# large documents to the pages of that many best matching sections (0 turns it off). tables
+# answers aggregate questions on .csv/.xlsx collections from the stored tables (see TableStore)
+DEFAULT_RETRIEVAL = {
+    "mode": "auto",
+    "vector_weight": 1.0,
+    "lexical_weight": 1.0,
+    "rrf_k": 60,
+    "k": 4,
+    "search_type": "similarity",
+    "fetch_k": 20,
+    "lambda_mult": 0.5,
+    "score_threshold": None,
+    "filter": None,
+    "max_context_tokens": None,
+    "compress": True,
+    "sentence_threshold": None,
+    "summaries": True,
+    "coarse_sections": 3,
+    "tables": True
+}
+
+class ModelTraining():
+    def __init__(self, db, query, file_name, models, chain_factory=None, collection_id=None,
+                 answer_cache=None, use_cache=True, lexical_index=None, retrieval=None, summary_index=None,
+                 table_store=None, query_batcher=None):
+        self.db = db
+        self.query = query
+        self.file_name = file_name
+        self.models = models
+        self.chain_factory = chain_factory
+        self.collection_id = collection_id
+        self.answer_cache = answer_cache
+        self.use_cache = use_cache and answer_cache is not None
+        self.lexical_index = lexical_index
+        self.retrieval = {**DEFAULT_RETRIEVAL, **(retrieval or {})}
+        self.summary_index = summary_index
+        self.table_store = table_store
+        # Shared across queries: batches their embeddings and FAISS searches and caches query embeddings
+        self.query_batcher = query_batcher
+        self.retrieval_mode = None
+        self.answer_source = None
+        self.coarse_pages = None
+        self.context_tokens = None
+        self.model = None
+        self.timings = {}
+
+    def prepareChain(self):
+        ext = os.path.splitext(self.file_name)
+        extension = ext[1]
+
+        if extension == '':
+            extension = get_file_type(file_path=self.file_name)
+
+        logging.info("File extension loaded successfully")
+        if self.chain_factory is None:
+            self.chain_factory = ChainFactory()
+        self.model = self.models.get(extension)
+        return self.chain_factory.getChain(self.model, self.collection_id, self.db)
+
+    def embedQuery(self, vectorstore):
+        if self.query_batcher is not None:
+            return self.query_batcher.embed(vectorstore.embeddings, self.query)
+        return vectorstore.embeddings.embed_query(self.query)
+
+    def vectorSearch(self, vectorstore, query_embedding, k, metadata_filter=None):
+        options = self.retrieval
+        kwargs = filter_kwargs(vectorstore, metadata_filter, k, options["fetch_k"])
+        if options["search_type"] == "mmr":
+            kwargs["fetch_k"] = max(kwargs.get("fetch_k", 0), options["fetch_k"], k)
+            return vectorstore.max_marginal_relevance_search_by_vector(
+                query_embedding, k=k, lambda_mult=options["lambda_mult"], **kwargs
+            )
+        if options["score_threshold"] is None:
+            if self.query_batcher is not None and not kwargs and self.query_batcher.canSearch(vectorstore):
+                return self.query_batcher.search(vectorstore, query_embedding, k)
+            return vectorstore.similarity_search_by_vector(query_embedding, k=k, **kwargs)
+        return [
+            doc for doc, score in relevance_search(vectorstore, query_embedding, k, **kwargs)
+            if score >= options["score_threshold"]
+        ]
+
+    def retrieve(self, vectorstore, query_embedding):
+        # The query is embedded once and reused for both the answer cache and the search
+        k = self.retrieval["k"]
+        # The coarse pages narrow this search only, self.retrieval stays as requested for the answer cache key
+        metadata_filter = self.retrieval["filter"]
+        if self.summary_index is not None and self.retrieval["coarse_sections"] and not metadata_filter:
+            self.coarse_pages = self.summary_index.coarsePages(query_embedding, self.retrieval["coarse_sections"])
+            if self.coarse_pages is not None:
+                metadata_filter = {"page": self.coarse_pages}
+        if self.lexical_index is None or self.retrieval["mode"] == "vector":
+            self.retrieval_mode = "vector"
+            return self.vectorSearch(vectorstore, query_embedding, k, metadata_filter)
+
+        # Both rankings are fetched deeper than k so documents ranked well by one side still fuse in
+        vector_docs = self.vectorSearch(vectorstore, query_embedding, k * 2, metadata_filter)
+        lexical_docs = self.lexical_index.search(self.query, k * 2, metadata_filter)
+        self.retrieval_mode = "hybrid"
+        return reciprocal_rank_fusion(
+            [vector_docs, lexical_docs],
+            [self.retrieval["vector_weight"], self.retrieval["lexical_weight"]],
+            k=self.retrieval["rrf_k"],
+            limit=k
+        )
+
+    def lexicalSearch(self, vectorstore):
+        """Documents for keyword lookups straight from the lexical index, None when the query needs embedding"""
+        mode = self.retrieval["mode"]
+        if self.lexical_index is None or mode not in ("lexical", "auto"):
+            return None
+        if mode == "auto" and not is_keyword_query(self.query):
+            return None
+        docs = self.lexical_index.search(self.query.strip('"'), self.retrieval["k"], self.retrieval["filter"])
+        # In auto mode a lookup without a single matching term still goes through semantic search
+        if not docs and mode == "auto":
+            return None
+        self.retrieval_mode = "lexical"
+        return docs
+
+    def packContext(self, docs):
+        """
+        Keeps documents in rank order while they fit in max_context_tokens, smaller lower ranked
+        ones still fill the remaining room. The best document is cut to size if it alone is too big.
+        """
+        budget = self.retrieval["max_context_tokens"]
+        tokens = [count_tokens(doc.page_content) for doc in docs]
+        if budget is None:
+            return docs
+
+        packed, used = [], 0
+        for doc, size in zip(docs, tokens):
+            if used + size <= budget:
+                packed.append(doc)
+                used += size
+            elif not packed:
+                text = doc.page_content[:budget * 4]
+                packed.append(doc.model_copy(update={"page_content": text}))
+                used = count_tokens(text)
+        return packed
+
+    def prepareContext(self, vectorstore, docs, query_embedding):
+        """Compresses and packs retrieved documents, recording the prompt size before and after"""
+        def tokens(docs):
+            return sum(count_tokens(doc.page_content) for doc in docs)
+
+        self.context_tokens = {"retrieved": tokens(docs)}
+        if self.retrieval["compress"]:
+            compressor = ContextCompressor(
+                sentence_threshold=self.retrieval["sentence_threshold"],
+                embeddings=vectorstore.embeddings
+            )
+            docs = compressor.compress(docs, query_embedding)
+            self.context_tokens["compressed"] = tokens(docs)
+        docs = self.packContext(docs)
+        self.context_tokens["packed"] = tokens(docs)
+
+        overhead = count_tokens(PROMPT_TEMPLATE) + count_tokens(self.query)
+        self.context_tokens["prompt_before"] = overhead + self.context_tokens["retrieved"]
+        self.context_tokens["prompt_after"] = overhead + self.context_tokens["packed"]
+        return docs
+
+    def search(self, vectorstore, marks):
+        """Returns (stored or cached answer or None, retrieved documents, query embedding or None)"""
+        if self.table_store is not None and self.retrieval["tables"] and is_aggregate_query(self.query):
+            answer = self.table_store.answer(self.query)
+            if answer is not None:
+                self.answer_source = "table"
+                marks["table"] = time.perf_counter()
+                return answer, [], None
+
+        if self.summary_index is not None and self.retrieval["summaries"] and is_summary_query(self.query):
+            self.answer_source = "summary"
+            marks["summary"] = time.perf_counter()
+            return self.summary_index.answer(self.query), [], None
+
+        docs = self.lexicalSearch(vectorstore)
+        if docs is not None:
+            marks["retrieval"] = time.perf_counter()
+            return None, self.prepareContext(vectorstore, docs, None), None
+
+        query_embedding = self.embedQuery(vectorstore)
+        marks["embedding"] = time.perf_counter()
+
+        if self.use_cache:
+            answer = self.answer_cache.lookup(self.collection_id, query_embedding, self.retrieval)
+            if answer is not None:
+                self.answer_source = "cache"
+                marks["cache"] = time.perf_counter()
+                return answer, [], query_embedding
+
+        docs = self.retrieve(vectorstore, query_embedding)
+        marks["retrieval"] = time.perf_counter()
+        return None, self.prepareContext(vectorstore, docs, query_embedding), query_embedding
+
+    def recordTimings(self, marks):
+        names = list(marks)
+        self.timings = {
+            f"{name}_ms": round((marks[name] - marks[previous]) * 1000, 1)
+            for previous, name in zip(names, names[1:])
+        }
+        self.timings["total_ms"] = round((marks[names[-1]] - marks[names[0]]) * 1000, 1)
+        if self.retrieval_mode is not None:
+            self.timings["retrieval_mode"] = self.retrieval_mode
+        if self.context_tokens is not None:
+            self.timings["context_tokens"] = self.context_tokens
+        if self.answer_source is not None:
+            self.timings["answer_source"] = self.answer_source
+        if self.coarse_pages is not None:
+            self.timings["coarse_pages"] = len(self.coarse_pages)
+
+    def getContext(self):
+        try:
+            marks = {"start": time.perf_counter()}
+            vectorstore, document_chain = self.prepareChain()
+            marks["setup"] = time.perf_counter()
+
+            answer, docs, query_embedding = self.search(vectorstore, marks)
+            if answer is not None:
+                self.recordTimings(marks)
+                self.timings["cache_hit"] = self.answer_source == "cache"
+                return answer
+
+            answer = document_chain.invoke(
                 {
-                    "input": self.query
+                    "input": self.query,
+                    "context": docs
                 }
             )
-            logging.info("Chain and Retriever combined and response produced successfully")
-            return response['answer']
+            marks["generation"] = time.perf_counter()
+
+            if self.answer_cache is not None and query_embedding is not None:
+                self.answer_cache.store(self.collection_id, query_embedding, answer, self.retrieval)
+            self.recordTimings(marks)
+            self.timings["answer_tokens"] = count_tokens(answer)
+            logging.info(f"Chain and Retriever combined and response produced successfully {self.timings}")
+            return answer
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def streamContext(self):
+        """
+        Yields ("sources", documents) once retrieval is done, then ("token", text) for
+        every generated piece of the answer and finally ("done", timings)
+        """
+        try:
+            marks = {"start": time.perf_counter()}
+            vectorstore, document_chain = self.prepareChain()
+            marks["setup"] = time.perf_counter()
+
+            answer, docs, query_embedding = self.search(vectorstore, marks)
+            if answer is not None:
+                self.recordTimings(marks)
+                self.timings["cache_hit"] = self.answer_source == "cache"
+                yield "sources", []
+                yield "token", answer
+                yield "done", self.timings
+                return
+            yield "sources", docs
+
+            tokens = []
+            first_token = None
+            for token in document_chain.stream({"input": self.query, "context": docs}):
+                if first_token is None:
+                    first_token = time.perf_counter()
+                tokens.append(token)
+                yield "token", token
+            marks["generation"] = time.perf_counter()
+
+            answer = "".join(tokens)
+            if self.answer_cache is not None and query_embedding is not None:
+                self.answer_cache.store(self.collection_id, query_embedding, answer, self.retrieval)
+            self.recordTimings(marks)
+            self.timings["answer_tokens"] = count_tokens(answer)
+            self.timings["first_token_ms"] = round(((first_token or marks["generation"]) - marks["start"]) * 1000, 1)
+            logging.info(f"Streamed response produced successfully {self.timings}")
+            yield "done", self.timings
         except Exception as e:
-            raise CustomException(e, sys)
\ No newline at end of file
+            raise CustomException(e, sys)
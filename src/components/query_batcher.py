@@ -0,0 +1,162 @@
+import time
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import faiss
+import numpy as np
+from src.logger import logging
+from src.components.embedding_backends import embed_queries
+
+def embedder_key(embeddings):
+    """Identifies the model behind an embedder, stores loaded from disk wrap theirs in PrecomputedEmbeddings"""
+    embedder = getattr(embeddings, "embedder", embeddings)
+    model = getattr(embedder, "model", None)
+    return (type(embedder).__name__, model if isinstance(model, str) else id(embedder))
+
+class QueryEmbeddingCache():
+    """LRU cache of query embeddings keyed by (embedder key, query text)"""
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            vector = self.entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return vector
+
+    def put(self, key, vector):
+        with self.lock:
+            self.entries[key] = vector
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+class QueryBatcher():
+    """
+    Micro-batches the query embeddings and FAISS searches of concurrent queries. Requests
+    arriving within max_wait_ms of each other (up to max_batch_size) are run together: one
+    embedding call per model and one matrix search per (store, k). At most max_in_flight
+    batches run at once; while they do, new requests queue up and form the next, larger batch.
+    When nothing else is running a request is sent right away, so a lone query never waits.
+
+    Query embeddings are also kept in an LRU cache of cache_size entries (0 disables it).
+    """
+    def __init__(self, max_wait_ms=2, max_batch_size=32, max_in_flight=4, cache_size=10000):
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.cache = QueryEmbeddingCache(cache_size) if cache_size else None
+        self.requests = queue.Queue()
+        self.slots = threading.Semaphore(max_in_flight)
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="query-batch")
+        # Per kind of request: batches run and requests they held
+        self.batches = {"embed": 0, "search": 0}
+        self.batched = {"embed": 0, "search": 0}
+        self.running = 0
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.dispatch, name="query-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, kind, key, target, payload):
+        future = Future()
+        self.requests.put((kind, key, target, payload, future))
+        return future.result()
+
+    def embed(self, embeddings, text):
+        """Query embedding of text, from the cache or batched with other queries for the same model"""
+        key = embedder_key(embeddings)
+        if self.cache is not None:
+            vector = self.cache.get((key, text))
+            if vector is not None:
+                return vector
+        vector = self.submit("embed", key, embeddings, text)
+        if self.cache is not None:
+            self.cache.put((key, text), vector)
+        return vector
+
+    @staticmethod
+    def canSearch(vectorstore):
+        return type(vectorstore).__name__ == "FAISS"
+
+    def search(self, vectorstore, embedding, k):
+        """Same documents as vectorstore.similarity_search_by_vector(embedding, k) without a filter"""
+        return self.submit("search", (id(vectorstore), k), vectorstore, embedding)
+
+    def dispatch(self):
+        while True:
+            self.slots.acquire()
+            request = self.requests.get()
+            if request is None:
+                return
+            batch = [request]
+            with self.lock:
+                idle = self.running == 0
+                self.running += 1
+            # Only wait for more requests while other batches are running
+            deadline = time.monotonic() + (0 if idle else self.max_wait)
+            while len(batch) < self.max_batch_size:
+                try:
+                    request = self.requests.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if request is None:
+                    # Closing, the batch collected so far still runs
+                    self.requests.put(None)
+                    break
+                batch.append(request)
+            self.executor.submit(self.run, batch)
+
+    def run(self, batch):
+        try:
+            groups = {}
+            for request in batch:
+                groups.setdefault((request[0], request[1]), []).append(request)
+            for (kind, key), requests in groups.items():
+                try:
+                    target = requests[0][2]
+                    payloads = [request[3] for request in requests]
+                    if kind == "embed":
+                        unique = list(dict.fromkeys(payloads))
+                        vectors = dict(zip(unique, embed_queries(target, unique)))
+                        results = [vectors[text] for text in payloads]
+                    else:
+                        results = self.searchMany(target, payloads, key[1])
+                    with self.lock:
+                        self.batches[kind] += 1
+                        self.batched[kind] += len(requests)
+                    for request, result in zip(requests, results):
+                        request[4].set_result(result)
+                except Exception as e:
+                    logging.error(f"Batched query {kind} failed: {str(e)}")
+                    for request in requests:
+                        request[4].set_exception(e)
+        finally:
+            with self.lock:
+                self.running -= 1
+            self.slots.release()
+
+    @staticmethod
+    def searchMany(vectorstore, embeddings, k):
+        # What FAISS.similarity_search_by_vector does for one vector, for a matrix of them
+        vectors = np.array(embeddings, dtype=np.float32)
+        if vectorstore._normalize_L2:
+            faiss.normalize_L2(vectors)
+        _, indices = vectorstore.index.search(vectors, k)
+        return [
+            [vectorstore.docstore.search(vectorstore.index_to_docstore_id[i]) for i in row if i != -1]
+            for row in indices
+        ]
+
+    def close(self):
+        self.requests.put(None)
+        self.thread.join()
+        self.executor.shutdown()
@@ -0,0 +1,187 @@
+import sys
+import time
+import threading
+from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor
+
+from src.exception import CustomException
+from src.logger import logging
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from src.components.summary_cache import SummaryCache
+from src.components.context_compressor import overlap_length
+from src.utils import count_tokens
+
+MAP_PROMPT = """
+            Summarize the following part of a document for someone who has not read it. Keep names, numbers,
+            dates and key facts. Answer with the summary only.
+
+            <text>
+            {text}
+            </text>"""
+
+REDUCE_PROMPT = """
+            The following are summaries of consecutive parts of one document, in order. Combine them into a
+            single coherent summary of the whole, keeping the key facts, names and numbers. Answer with the
+            summary only.
+
+            <summaries>
+            {text}
+            </summaries>"""
+
+class DocumentSummarizer():
+    """
+    Map-reduce summary of a whole document. Chunks are grouped into passages of at most
+    group_tokens, every passage is summarized (map) and the summaries are combined level by
+    level until one remains (reduce). All LLM calls of a level run on max_workers threads.
+
+    Group boundaries depend on the chunk ids only (a group ends after a chunk whose id hashes
+    to 0 modulo group_chunks), so after an edit most groups are unchanged and their cached
+    summaries are reused.
+    """
+    def __init__(self, llm, model, cache=None, max_workers=4, group_tokens=3000, group_chunks=4):
+        self.llm = llm
+        self.model = model
+        self.cache = cache
+        self.max_workers = max_workers
+        self.group_tokens = group_tokens
+        self.group_chunks = group_chunks
+        self.chains = {
+            "map": ChatPromptTemplate.from_template(MAP_PROMPT) | llm | StrOutputParser(),
+            "reduce": ChatPromptTemplate.from_template(REDUCE_PROMPT) | llm | StrOutputParser()
+        }
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def groupChunks(self, docs):
+        groups, group, tokens = [], [], 0
+        for doc in docs:
+            size = count_tokens(doc.page_content)
+            if group and tokens + size > self.group_tokens:
+                groups.append(group)
+                group, tokens = [], 0
+            group.append(doc)
+            tokens += size
+            if int(SummaryCache.hashKey(doc.id or doc.page_content)[:8], 16) % self.group_chunks == 0:
+                groups.append(group)
+                group, tokens = [], 0
+        if group:
+            groups.append(group)
+        return groups
+
+    def joinChunks(self, docs):
+        # Neighbouring chunks share chunk_overlap characters, the LLM only needs them once
+        text = ""
+        for doc in docs:
+            overlap = overlap_length(text, doc.page_content) if text else 0
+            text = f"{text}\n{doc.page_content}" if text and not overlap else text + doc.page_content[overlap:]
+        return text
+
+    def summarizeOne(self, kind, key, text):
+        if self.cache is not None:
+            summary = self.cache.get(self.model, key)
+            if summary is not None:
+                with self.lock:
+                    self.stats["cache_hits"] += 1
+                return summary
+        summary = self.chains[kind].invoke({"text": text}).strip()
+        with self.lock:
+            self.stats["llm_calls"] += 1
+        if self.cache is not None:
+            self.cache.put(self.model, key, summary)
+        return summary
+
+    def summarizeMany(self, kind, items):
+        """items are (cache key, text) pairs, summaries come back in the same order"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(lambda item: self.summarizeOne(kind, *item), items))
+
+    def batchSummaries(self, summaries):
+        batches, batch, tokens = [], [], 0
+        for summary in summaries:
+            size = count_tokens(summary)
+            # Every batch takes at least two summaries so each level is smaller than the last
+            if len(batch) >= 2 and tokens + size > self.group_tokens:
+                batches.append(batch)
+                batch, tokens = [], 0
+            batch.append(summary)
+            tokens += size
+        if len(batch) == 1 and batches:
+            batches[-1].append(batch[0])
+        elif batch:
+            batches.append(batch)
+        return batches
+
+    def reduce(self, summaries):
+        while len(summaries) > 1:
+            self.stats["levels"] += 1
+            items = [(SummaryCache.hashKey("reduce", REDUCE_PROMPT, *batch), "\n\n".join(batch))
+                     for batch in self.batchSummaries(summaries)]
+            summaries = self.summarizeMany("reduce", items)
+        return summaries[0] if summaries else ""
+
+    def mapGroups(self, groups):
+        items = [(SummaryCache.hashKey("map", MAP_PROMPT, *(doc.id or doc.page_content for doc in group)),
+                  self.joinChunks(group))
+                 for group in groups]
+        return self.summarizeMany("map", items)
+
+    def combine(self, parts):
+        """Summaries of consecutive parts merged into one with a single reduce call each"""
+        items = [(SummaryCache.hashKey("reduce", REDUCE_PROMPT, *batch), "\n\n".join(batch)) for batch in parts if len(batch) > 1]
+        combined = iter(self.summarizeMany("reduce", items))
+        return [batch[0] if len(batch) == 1 else next(combined) for batch in parts]
+
+    def summarizeSections(self, docs):
+        """
+        Returns (pages, sections, document summary) for ingest-time summaries. pages are
+        (page number, summary) pairs, one per page for paged documents and one per passage
+        otherwise (page None). sections are (list of page numbers, summary) pairs covering
+        consecutive pages of about group_tokens of page summaries.
+        """
+        try:
+            start = time.perf_counter()
+            self.stats = {"chunks": len(docs), "groups": 0, "levels": 1, "llm_calls": 0, "cache_hits": 0}
+            if any("page" in doc.metadata for doc in docs):
+                units = [(page, self.groupChunks(list(chunks)))
+                         for page, chunks in groupby(docs, key=lambda doc: doc.metadata.get("page"))]
+            else:
+                units = [(None, [group]) for group in self.groupChunks(docs)]
+
+            groups = [group for _, unit_groups in units for group in unit_groups]
+            self.stats["groups"] = len(groups)
+            summaries = iter(self.mapGroups(groups))
+            # Pages longer than one passage get their passage summaries combined
+            page_summaries = self.combine([[next(summaries) for _ in unit_groups] for _, unit_groups in units])
+            pages = [(page, summary) for (page, _), summary in zip(units, page_summaries)]
+
+            batches = self.batchSummaries(page_summaries)
+            self.stats["levels"] += 1
+            section_summaries = self.combine(batches)
+            sections, position = [], 0
+            for batch, summary in zip(batches, section_summaries):
+                sections.append(([page for page, _ in pages[position:position + len(batch)]], summary))
+                position += len(batch)
+
+            document = self.reduce(section_summaries)
+            self.stats["pages"] = len(pages)
+            self.stats["sections"] = len(sections)
+            self.stats["seconds"] = round(time.perf_counter() - start, 3)
+            logging.info(f"Summarized {len(pages)} pages into {len(sections)} sections {self.stats}")
+            return pages, sections, document
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def summarize(self, docs):
+        """docs are the chunks of one document in document order"""
+        try:
+            start = time.perf_counter()
+            self.stats = {"chunks": len(docs), "groups": 0, "levels": 1, "llm_calls": 0, "cache_hits": 0}
+            groups = self.groupChunks(docs)
+            self.stats["groups"] = len(groups)
+            summary = self.reduce(self.mapGroups(groups))
+            self.stats["seconds"] = round(time.perf_counter() - start, 3)
+            logging.info(f"Summarized {len(docs)} chunks in {len(groups)} groups {self.stats}")
+            return summary
+        except Exception as e:
+            raise CustomException(e, sys)
@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import threading
+
+from src.exception import CustomException
+from src.logger import logging
+
+class SummaryCache():
+    """
+    On-disk cache of intermediate summaries keyed by (LLM model, sha256 of what was summarized).
+    Map summaries are keyed by the content-addressed ids of their chunks, so summarizing an
+    edited document again only pays for the groups whose chunks changed.
+    Like EmbeddingCache, the size is only checked after every evict_every stored summaries.
+    """
+    def __init__(self, path, max_entries=100000, evict_every=None):
+        try:
+            self.path = path
+            self.max_entries = max_entries
+            self.evict_every = evict_every or max(1, max_entries // 100)
+            self.unchecked = 0
+            self.lock = threading.Lock()
+            self.hits = 0
+            self.misses = 0
+
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # Shared with the job worker processes, writers wait for each other instead of failing
+            self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS summaries (
+                    model TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (model, hash)
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_last_used ON summaries (last_used)")
+            self.conn.commit()
+            logging.info(f"Summary cache opened at {path}")
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    @staticmethod
+    def hashKey(*parts):
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, model, key):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT summary FROM summaries WHERE model = ? AND hash = ?", (model, key)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE summaries SET last_used = ? WHERE model = ? AND hash = ?", (time.time(), model, key))
+            self.conn.commit()
+            return row[0]
+
+    def put(self, model, key, summary):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?)", (model, key, summary, time.time()))
+            self.unchecked += 1
+            if self.unchecked >= self.evict_every:
+                self.unchecked = 0
+                self.evict()
+            self.conn.commit()
+
+    def evict(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM summaries WHERE rowid IN (SELECT rowid FROM summaries ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,)
+            )
+            logging.info(f"Evicted {count - self.max_entries} entries from summary cache")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,105 @@
+import os
+import re
+import sys
+import json
+import time
+
+from src.exception import CustomException
+from src.logger import logging
+from src.components.answer_cache import normalize
+
+SUMMARY_INDEX_FILE = "summaries.json"
+
+# Requests for a summary ("Summarize page 3", "give me an overview"), not questions that merely
+# mention one ("What does the executive summary say about revenue?")
+SUMMARY_QUERY = re.compile(
+    r"^\s*(please\s+|(can|could|would) you\s+)?"
+    r"(summari[sz]e|give (me )?an? (short |brief )?(summary|overview)|tl;?dr|(what are|list) the (main|key) points)\b",
+    re.IGNORECASE
+)
+PAGE_REFERENCE = re.compile(r"\bpage\s+(\d+)\b", re.IGNORECASE)
+
+def is_summary_query(query):
+    return SUMMARY_QUERY.match(query) is not None
+
+class SummaryIndex():
+    """
+    Summaries generated at ingest time and stored next to a collection's vector store as
+    summaries.json: one per page (or passage), one per section of consecutive pages and
+    one for the whole document. Section summaries are embedded, so for large documents
+    they double as a coarse index that narrows retrieval down to the relevant pages.
+    """
+    def __init__(self, pages, sections, document, section_embeddings=None, stats=None):
+        self.pages = pages
+        self.sections = sections
+        self.document = document
+        self.section_embeddings = [normalize(vector) for vector in section_embeddings or []]
+        self.stats = stats or {}
+
+    @classmethod
+    def build(cls, summarizer, docs, embeddings=None):
+        pages, sections, document = summarizer.summarizeSections(docs)
+        section_embeddings = None
+        if embeddings is not None and any(page is not None for page, _ in pages):
+            section_embeddings = embeddings.embed_documents([summary for _, summary in sections])
+        return cls(pages, sections, document, section_embeddings, dict(summarizer.stats))
+
+    def answer(self, query):
+        """Stored summary for a summarize query: the page it names (numbered from 1) or the whole document"""
+        match = PAGE_REFERENCE.search(query)
+        if match is not None:
+            for page, summary in self.pages:
+                if page is not None and page + 1 == int(match.group(1)):
+                    return summary
+        return self.document
+
+    def coarsePages(self, query_embedding, sections=3):
+        """Pages of the sections whose summaries are most similar to the query, None for small documents"""
+        if not self.section_embeddings or len(self.sections) <= sections * 2:
+            return None
+        query_embedding = normalize(query_embedding)
+        scores = [sum(x * y for x, y in zip(query_embedding, vector)) for vector in self.section_embeddings]
+        best = sorted(range(len(scores)), key=scores.__getitem__, reverse=True)[:sections]
+        return sorted(page for index in best for page in self.sections[index][0])
+
+    def save(self, directory):
+        try:
+            path = os.path.join(directory, SUMMARY_INDEX_FILE)
+            with open(path + ".tmp", "w") as f:
+                json.dump({
+                    "pages": self.pages,
+                    "sections": self.sections,
+                    "document": self.document,
+                    "section_embeddings": self.section_embeddings,
+                    "stats": self.stats,
+                    "created_at": time.time()
+                }, f)
+            os.replace(path + ".tmp", path)
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    @classmethod
+    def load(cls, directory):
+        """Returns the summaries saved in directory, or None if none were generated"""
+        path = os.path.join(directory, SUMMARY_INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            logging.info(f"Summaries of {len(data['pages'])} pages loaded from {directory}")
+            return cls(
+                [tuple(page) for page in data["pages"]],
+                [tuple(section) for section in data["sections"]],
+                data["document"],
+                data["section_embeddings"],
+                data["stats"]
+            )
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    @staticmethod
+    def remove(directory):
+        path = os.path.join(directory, SUMMARY_INDEX_FILE)
+        if os.path.exists(path):
+            os.remove(path)
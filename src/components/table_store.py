@@ -0,0 +1,294 @@
+import os
+import re
+import sys
+import json
+import importlib.util
+
+import numpy as np
+import pandas as pd
+from src.exception import CustomException
+from src.logger import logging
+from langchain_core.documents import Document
+from langchain_core.document_loaders import BaseLoader
+from src.components.lexical_index import tokenize
+from src.components.text_splitter import text_codes, word_spans
+
+TABLE_EXTENSIONS = (".csv", ".xlsx")
+TABLE_DIR = "tables"
+# python-calamine reads .xlsx several times faster than openpyxl, which stays the fallback
+EXCEL_ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else None
+
+AGGREGATES = [
+    ("nunique", re.compile(r"\b(unique|distinct|different)\b", re.IGNORECASE)),
+    ("count", re.compile(r"\b(how many|count|number of)\b", re.IGNORECASE)),
+    ("mean", re.compile(r"\b(average|mean|avg)\b", re.IGNORECASE)),
+    ("sum", re.compile(r"\b(total|sum)\b", re.IGNORECASE)),
+    ("max", re.compile(r"\b(max|maximum|highest|largest|most|top)\b", re.IGNORECASE)),
+    ("min", re.compile(r"\b(min|minimum|lowest|smallest|least)\b", re.IGNORECASE))
+]
+ROWS = re.compile(r"\b(rows|records|entries|lines)\b", re.IGNORECASE)
+GROUP_BY = re.compile(r"\b(?:by|per|for each|each)\s+(.+)$", re.IGNORECASE)
+AGGREGATE_NAMES = {"count": "Number of rows", "nunique": "Distinct values of", "mean": "Average", "sum": "Total",
+                   "max": "Highest", "min": "Lowest"}
+
+def is_aggregate_query(query):
+    return any(pattern.search(query) for _, pattern in AGGREGATES)
+
+def terms(text):
+    # Plurals match their singular, "unit names" finds the "Unit Name" column
+    return {token[:-1] if len(token) > 3 and token.endswith("s") else token for token in tokenize(text)}
+
+def format_value(value):
+    if isinstance(value, (float, np.floating)) and not pd.isna(value):
+        return f"{value:,.2f}".rstrip("0").rstrip(".")
+    return str(value)
+
+def clean_header(values):
+    """Column names from a header row: whitespace collapsed, blanks named by position, duplicates numbered"""
+    names, seen = [], {}
+    for position, value in enumerate(values):
+        name = " ".join(str(value).split()) if pd.notna(value) else ""
+        name = name or f"column_{position + 1}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}_{seen[name]}"
+        else:
+            seen[name] = 1
+        names.append(name)
+    return names
+
+def normalize_columns(frame):
+    """Mostly numeric columns become numbers (integers where possible), all others strings"""
+    for column in frame.columns:
+        values = frame[column]
+        present = values.notna().sum()
+        numbers = values if pd.api.types.is_numeric_dtype(values) else pd.to_numeric(values, errors="coerce")
+        if present and numbers.notna().sum() >= 0.9 * present:
+            whole = numbers.dropna()
+            frame[column] = numbers.astype("Int64") if (whole == whole.round()).all() else numbers.astype("float64")
+        else:
+            # One row per line in the chunks, line breaks inside cells are flattened
+            frame[column] = values.astype("string").str.replace(r"\s+", " ", regex=True).str.strip()
+    return frame
+
+def split_header(raw, scan_rows=30):
+    """
+    Spreadsheets often start with title and address lines before the real header. The header
+    is the first row among the first scan_rows with the most filled cells, rows above it are
+    returned as preamble text.
+    """
+    filled = raw.head(scan_rows).notna().sum(axis=1)
+    header = int(filled.idxmax()) if len(filled) else 0
+    preamble = [" ".join(str(value) for value in row if pd.notna(value)) for row in raw.iloc[:header].itertuples(index=False)]
+    frame = raw.iloc[header + 1:].copy()
+    frame.columns = clean_header(raw.iloc[header]) if len(raw) else []
+    return [line for line in preamble if line.strip()], frame
+
+def read_tables(file_name):
+    """Returns (sheet name, preamble lines, DataFrame) for every non-empty sheet of a .csv or .xlsx file"""
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension == ".csv":
+        try:
+            sheets = {"csv": pd.read_csv(file_name, engine="pyarrow")}
+        except Exception:
+            # pyarrow's reader is strict about ragged rows, the C reader is not
+            sheets = {"csv": pd.read_csv(file_name, on_bad_lines="skip")}
+        sheets = {name: [[], frame] for name, frame in sheets.items()}
+    else:
+        sheets = {name: list(split_header(raw)) for name, raw in pd.read_excel(file_name, sheet_name=None, header=None, engine=EXCEL_ENGINE).items()}
+
+    tables = []
+    for name, (preamble, frame) in sheets.items():
+        frame = frame.dropna(axis=0, how="all").dropna(axis=1, how="all").reset_index(drop=True)
+        if frame.empty and not preamble:
+            continue
+        frame.columns = clean_header(frame.columns)
+        tables.append((str(name), preamble, normalize_columns(frame)))
+    return tables
+
+def row_texts(frame, separator=" | "):
+    """Every row as one line of cell values, built column by column"""
+    if frame.empty:
+        return pd.Series([], dtype="string")
+    columns = [frame[column].astype("string").fillna("") for column in frame.columns]
+    return columns[0].str.cat(columns[1:], sep=separator)
+
+def table_documents(name, preamble, frame, source, max_tokens=500):
+    """
+    Documents of a table: the preamble lines (if any), then groups of consecutive rows of
+    about max_tokens each, all starting with the column names so every chunk stands alone
+    """
+    if preamble:
+        yield Document(page_content="\n".join(preamble), metadata={"source": source, "sheet": name})
+    if frame.empty:
+        return
+    header = f"Sheet: {name}\nColumns: {' | '.join(frame.columns)}\n"
+    rows = row_texts(frame)
+    body = "\n".join(rows.tolist())
+    row_ends = np.cumsum(rows.str.len().to_numpy(dtype=np.int64) + 1) - 1
+    # Tokens estimated like OffsetTextSplitter does, so the splitter leaves these chunks whole:
+    # the running token count at the end of every row
+    _, word_ends, tokens = word_spans(text_codes(body))
+    row_tokens = np.concatenate(([0], tokens))[np.searchsorted(word_ends, row_ends, side="right")]
+    budget = max(1, max_tokens - int(word_spans(text_codes(header))[2][-1]))
+    start = 0
+    while start < len(row_ends):
+        before = row_tokens[start - 1] if start else 0
+        end = max(start + 1, int(np.searchsorted(row_tokens, before + budget, side="right")))
+        offset = row_ends[start - 1] + 1 if start else 0
+        yield Document(
+            page_content=header + body[offset:row_ends[end - 1]],
+            metadata={"source": source, "sheet": name, "row_start": start, "row_end": end - 1}
+        )
+        start = end
+
+class TableLoader(BaseLoader):
+    """
+    Columnar loader for .csv and .xlsx files. Instead of one document per row (CSVLoader) or
+    per sheet element (UnstructuredExcelLoader), rows are grouped into token-bounded chunks
+    with the column names repeated on top. With a table_directory the parsed tables are also
+    stored there as Parquet for TableStore.
+    """
+    def __init__(self, file_path, max_tokens=500, table_directory=None):
+        self.file_path = file_path
+        self.max_tokens = max_tokens
+        self.table_directory = table_directory
+
+    def lazy_load(self):
+        try:
+            tables = read_tables(self.file_path)
+            logging.info(f"Read {len(tables)} tables with {sum(len(frame) for _, _, frame in tables)} rows from {self.file_path}")
+            if self.table_directory is not None:
+                TableStore([(name, frame) for name, _, frame in tables]).save(self.table_directory)
+        except Exception as e:
+            raise CustomException(e, sys)
+        for name, preamble, frame in tables:
+            yield from table_documents(name, preamble, frame, self.file_path, self.max_tokens)
+
+class TableStore():
+    """
+    Raw tables of a .csv/.xlsx collection, stored as tables/<n>.parquet next to its vector
+    store. Aggregate questions ("how many ...", "total ... by ...", "highest ...") are
+    answered here with pandas instead of from a few retrieved chunks by the LLM.
+    """
+    def __init__(self, tables):
+        self.tables = tables
+        self.categories = {}
+
+    def matchColumn(self, frame, text, numeric=False):
+        """Column whose name shares the largest part of its words with text, None if none does"""
+        words = terms(text)
+        best, best_score = None, 0
+        for column in frame.columns:
+            if numeric and not pd.api.types.is_numeric_dtype(frame[column]):
+                continue
+            names = terms(column)
+            score = len(names & words) / len(names) if names else 0
+            if score > best_score:
+                best, best_score = column, score
+        return best
+
+    def tableCategories(self, name, frame, max_values=1000):
+        """(column, value, words) of the text columns with at most max_values distinct values, computed once per table"""
+        if name not in self.categories:
+            categories = []
+            for column in frame.columns:
+                if pd.api.types.is_numeric_dtype(frame[column]):
+                    continue
+                values = frame[column].dropna().unique()
+                if len(values) > max_values:
+                    continue
+                for value in values:
+                    # Cells like "गुन्टूर /Guntur" match on any of their parts
+                    for part in str(value).split("/"):
+                        words = " ".join(tokenize(part))
+                        if len(words) >= 3:
+                            categories.append((column, value, f" {words} "))
+            self.categories[name] = categories
+        return self.categories[name]
+
+    def matchFilters(self, name, frame, query, skip):
+        """Equality filters for the category values named in the query, e.g. a district name"""
+        lowered = f" {' '.join(tokenize(query))} "
+        filters = {}
+        for column, value, words in self.tableCategories(name, frame):
+            if column not in skip and column not in filters and words in lowered:
+                filters[column] = value
+        return filters
+
+    def pickTable(self, query):
+        words = terms(query)
+        return max(self.tables, key=lambda table: len(words & terms(" ".join(table[1].columns))), default=None)
+
+    def answer(self, query):
+        """Answer computed from the stored tables, None when the query is not an aggregate this can resolve"""
+        operation = next((operation for operation, pattern in AGGREGATES if pattern.search(query)), None)
+        table = self.pickTable(query)
+        if operation is None or table is None:
+            return None
+        name, frame = table
+
+        match = GROUP_BY.search(query)
+        group = self.matchColumn(frame, match.group(1)) if match else None
+        target_text = query[:match.start()] if match else query
+        target = None
+        if operation in ("mean", "sum", "max", "min"):
+            target = self.matchColumn(frame, target_text, numeric=True)
+            if target is None:
+                return None
+        elif operation == "nunique":
+            target = self.matchColumn(frame, target_text)
+            if target is None:
+                return None
+
+        filters = self.matchFilters(name, frame, target_text, {group, target})
+        if operation == "count" and group is None and not filters and not ROWS.search(query):
+            # "how many times does ..." is a question about the text, not a row count
+            return None
+        rows = frame
+        for column, value in filters.items():
+            rows = rows[rows[column] == value]
+        scope = f" where {', '.join(f'{column} = {value}' for column, value in filters.items())}" if filters else ""
+        label = f"{AGGREGATE_NAMES[operation]} {target}" if target else AGGREGATE_NAMES[operation]
+
+        if group is not None and group != target:
+            grouped = rows.groupby(group, dropna=True)
+            values = grouped.size() if target is None else grouped[target].agg(operation)
+            values = values.sort_values(ascending=operation == "min").head(20)
+            lines = [f"{key}: {format_value(value)}" for key, value in values.items()]
+            return f"{label} by {group} in {name}{scope}:\n" + "\n".join(lines)
+
+        if target is None:
+            return f"{label} in {name}{scope}: {len(rows)}"
+        value = getattr(rows[target], operation)()
+        answer = f"{label} in {name}{scope}: {format_value(value)}"
+        if operation in ("max", "min") and pd.notna(value):
+            row = rows[rows[target] == value].head(1).to_dict("records")[0]
+            answer += " (" + ", ".join(f"{column}: {format_value(cell)}" for column, cell in row.items() if pd.notna(cell)) + ")"
+        return answer
+
+    def save(self, directory):
+        try:
+            path = os.path.join(directory, TABLE_DIR)
+            os.makedirs(path, exist_ok=True)
+            for position, (_, frame) in enumerate(self.tables):
+                frame.to_parquet(os.path.join(path, f"{position}.parquet"), index=False)
+            with open(os.path.join(path, "tables.json"), "w") as f:
+                json.dump([name for name, _ in self.tables], f)
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    @classmethod
+    def load(cls, directory):
+        """Returns the tables stored in directory, or None for collections of other formats"""
+        path = os.path.join(directory, TABLE_DIR)
+        if not os.path.exists(os.path.join(path, "tables.json")):
+            return None
+        try:
+            with open(os.path.join(path, "tables.json")) as f:
+                names = json.load(f)
+            tables = [(name, pd.read_parquet(os.path.join(path, f"{position}.parquet"))) for position, name in enumerate(names)]
+            logging.info(f"{len(tables)} tables loaded from {directory}")
+            return cls(tables)
+        except Exception as e:
+            raise CustomException(e, sys)
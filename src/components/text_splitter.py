@@ -0,0 +1,172 @@
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from src.exception import CustomException
+from langchain_core.documents import Document
+
+SENTENCE_ENDS = (ord("."), ord("!"), ord("?"))
+
+def text_codes(text):
+    """Code points of text as a NumPy array, one byte per character for ASCII text"""
+    if text.isascii():
+        return np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+def word_spans(codes):
+    """(starts, ends) of the whitespace separated words, with about 4 characters per token as in count_tokens"""
+    blank = np.concatenate(([True], codes <= 32, [True]))
+    edges = (blank[1:] != blank[:-1]).nonzero()[0]
+    starts, ends = edges[0::2], edges[1::2]
+    return starts, ends, np.cumsum(np.maximum((ends - starts + 2) // 4, 1))
+
+def boundary_levels(codes, starts, ends):
+    """
+    How good a cut before every span is: 3 after a blank line, 2 after a line break,
+    1 after the end of a sentence, 0 between words and -1 inside a word
+    """
+    newlines = (codes == 10).nonzero()[0]
+    breaks = np.searchsorted(newlines, starts[1:]) - np.searchsorted(newlines, ends[:-1])
+    levels = np.where(starts[1:] > ends[:-1], 0, -1)
+    last = codes[ends[:-1] - 1]
+    levels[((last == SENTENCE_ENDS[0]) | (last == SENTENCE_ENDS[1]) | (last == SENTENCE_ENDS[2])) & (levels == 0)] = 1
+    levels[breaks == 1] = 2
+    levels[breaks >= 2] = 3
+    return np.concatenate(([3], levels))
+
+class OffsetTextSplitter():
+    """
+    Splits every page in one pass over its code points and returns (start, end) offsets,
+    text is only copied for the final chunks. Chunks hold at most max_tokens tokens and end at
+    the best boundary in their second half: a blank line, else a line break, else a sentence
+    end, else a word. The next chunk starts about overlap_tokens before, on a sentence start
+    where there is one.
+
+    Tokens are counted with the embedding model's tokenizer when one is given (a Hugging Face
+    fast tokenizer, as held by LocalEmbeddings) and estimated from word lengths otherwise.
+    Pages, and segments of long pages, are split on max_workers threads, NumPy and the
+    tokenizer release the GIL.
+    """
+    def __init__(self, max_tokens=500, overlap_tokens=125, tokenizer=None, max_workers=4, segment_size=1 << 20):
+        self.max_tokens = max(1, max_tokens)
+        self.segment_size = segment_size
+        self.overlap_tokens = min(overlap_tokens, self.max_tokens // 2)
+        self.tokenizer = tokenizer
+        self.max_workers = max_workers
+
+    def spans(self, text, codes):
+        if self.tokenizer is None:
+            return word_spans(codes)
+        offsets = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)["offset_mapping"]
+        offsets = np.array(offsets, dtype=np.int64).reshape(-1, 2)
+        offsets = offsets[offsets[:, 1] > offsets[:, 0]]
+        return offsets[:, 0], offsets[:, 1], np.arange(1, len(offsets) + 1)
+
+    def segments(self, text):
+        """
+        (start, end) of segments of at most segment_size characters, cut at a blank line, line
+        break or space, so arrays stay small even when a whole file is one document
+        """
+        start = 0
+        while start < len(text):
+            end = min(len(text), start + self.segment_size)
+            if end < len(text):
+                for separator in ("\n\n", "\n", " "):
+                    cut = text.rfind(separator, start + self.segment_size // 2, end)
+                    if cut != -1:
+                        end = cut + 1
+                        break
+            yield start, end
+            start = end
+
+    def splitSegment(self, text):
+        codes = text_codes(text)
+        starts, ends, tokens = self.spans(text, codes)
+        count = len(starts)
+        if count == 0:
+            return []
+        if tokens[-1] <= self.max_tokens:
+            # Most pages fit in one chunk, no boundaries needed
+            return [(int(starts[0]), int(ends[-1]))]
+
+        # For every span: where the longest chunk starting there ends, where an overlap ending
+        # there starts, and the nearest cut of each level before and after it
+        levels = boundary_levels(codes, starts, ends)
+        index = np.arange(count)
+        fits = tokens.searchsorted(np.concatenate(([0], tokens[:-1])) + self.max_tokens, side="right")
+        overlaps = tokens.searchsorted(tokens - self.overlap_tokens, side="right")
+        previous_cut = {level: np.maximum.accumulate(np.where(levels >= level, index, -1)) for level in (3, 2, 1, 0)}
+        next_cut = {level: np.minimum.accumulate(np.where(levels >= level, index, count)[::-1])[::-1] for level in (1, 0)}
+
+        chunks = []
+        first = 0
+        while first < count:
+            # Spans first..last-1 fit in the budget
+            last = max(first + 1, int(fits[first]))
+            if last < count:
+                for level in (3, 2, 1, 0):
+                    cut = int(previous_cut[level][last])
+                    if cut > first + (last - first) // 2:
+                        last = cut
+                        break
+            chunks.append((int(starts[first]), int(ends[last - 1])))
+            if last >= count:
+                break
+
+            following = int(overlaps[last - 1])
+            for level in (1, 0):
+                cut = int(next_cut[level][following])
+                if cut < last:
+                    following = cut
+                    break
+            first = max(first + 1, following)
+        return chunks
+
+    def segmentOffsets(self, text, start, end):
+        return [
+            (start + chunk_start, start + chunk_end)
+            for chunk_start, chunk_end in self.splitSegment(text[start:end] if end - start < len(text) else text)
+        ]
+
+    def splitOffsets(self, text):
+        """(start, end) character offsets of the chunks of text"""
+        return [chunk for start, end in self.segments(text) for chunk in self.segmentOffsets(text, start, end)]
+
+    def chunkDocuments(self, document, offsets):
+        text = document.page_content
+        return [
+            Document(page_content=text[start:end], metadata={**document.metadata, "start_index": start})
+            for start, end in offsets
+        ]
+
+    def splitDocument(self, document):
+        return self.chunkDocuments(document, self.splitOffsets(document.page_content))
+
+    def split_documents(self, documents):
+        return [chunk for document in documents for chunk in self.splitDocument(document)]
+
+    def iterSplit(self, documents):
+        """
+        Yields (document, chunks) in document order while the following segments are split on
+        the thread pool, so one large file uses every worker too. documents may be lazy, only a
+        few segments per worker are read ahead.
+        """
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="split") as executor:
+                pending = deque()
+                queued = 0
+                for document in documents:
+                    text = document.page_content
+                    futures = [executor.submit(self.segmentOffsets, text, start, end) for start, end in self.segments(text)]
+                    pending.append((document, futures))
+                    queued += len(futures)
+                    while pending and queued >= self.max_workers * 2:
+                        document, futures = pending.popleft()
+                        queued -= len(futures)
+                        yield document, self.chunkDocuments(document, [chunk for future in futures for chunk in future.result()])
+                while pending:
+                    document, futures = pending.popleft()
+                    yield document, self.chunkDocuments(document, [chunk for future in futures for chunk in future.result()])
+        except Exception as e:
+            raise CustomException(e, sys)
@@ -0,0 +1,134 @@
+import os
+import sys
+import json
+import time
+import uuid
+import hashlib
+import threading
+
+from src.exception import CustomException
+from src.logger import logging
+
+class UploadOffsetError(Exception):
+    def __init__(self, received):
+        super().__init__(f"Expected chunk at offset {received}")
+        self.received = received
+
+class UploadSessions():
+    """
+    Resumable chunked uploads. A client creates a session, sends the file in chunks with
+    the byte offset of each one and can ask how much was received to resume after a
+    dropped connection. Data is appended to root_dir/<upload_id>.part and hashed with
+    SHA-256 as it arrives, so the digest is ready as soon as the last chunk lands.
+
+    Sessions that received nothing for ttl seconds are removed, checked at most every
+    cleanup_interval seconds when a new session is created.
+    """
+    def __init__(self, root_dir, max_file_size, ttl=24 * 60 * 60, cleanup_interval=60 * 60):
+        self.root_dir = root_dir
+        self.max_file_size = max_file_size
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self.last_cleanup = 0
+        self.hashers = {}
+        self.lock = threading.Lock()
+        os.makedirs(root_dir, exist_ok=True)
+
+    def partPath(self, upload_id):
+        return os.path.join(self.root_dir, f"{upload_id}.part")
+
+    def infoPath(self, upload_id):
+        return os.path.join(self.root_dir, f"{upload_id}.json")
+
+    def create(self, filename, size):
+        if size > self.max_file_size:
+            raise ValueError(f"File too large. Maximum size is {self.max_file_size / (1024**3):.1f}GB")
+        if time.time() - self.last_cleanup > self.cleanup_interval:
+            self.cleanup()
+        upload_id = str(uuid.uuid4())
+        info = {"upload_id": upload_id, "filename": filename, "size": size, "created_at": time.time()}
+        with open(self.infoPath(upload_id), "w") as f:
+            json.dump(info, f)
+        open(self.partPath(upload_id), "wb").close()
+        self.hashers[upload_id] = hashlib.sha256()
+        logging.info(f"Upload session {upload_id} created for {filename}")
+        return self.get(upload_id)
+
+    def get(self, upload_id):
+        if not upload_id or os.path.basename(upload_id) != upload_id or not os.path.exists(self.infoPath(upload_id)):
+            return None
+        with open(self.infoPath(upload_id)) as f:
+            info = json.load(f)
+        info["received"] = os.path.getsize(self.partPath(upload_id))
+        return info
+
+    def hasher(self, upload_id):
+        # After a restart the running hash is rebuilt from the bytes already on disk
+        if upload_id not in self.hashers:
+            hasher = hashlib.sha256()
+            with open(self.partPath(upload_id), "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    hasher.update(block)
+            self.hashers[upload_id] = hasher
+        return self.hashers[upload_id]
+
+    def append(self, upload_id, offset, data):
+        """Appends a chunk and returns the number of bytes received so far"""
+        with self.lock:
+            info = self.get(upload_id)
+            if info is None:
+                raise KeyError(upload_id)
+            received = info["received"]
+            if offset + len(data) <= received:
+                # Retry of a chunk that already arrived
+                return received
+            if offset != received:
+                raise UploadOffsetError(received)
+            if received + len(data) > info["size"]:
+                raise ValueError("Chunk goes past the declared file size")
+            hasher = self.hasher(upload_id)
+            with open(self.partPath(upload_id), "ab") as f:
+                f.write(data)
+            hasher.update(data)
+            return received + len(data)
+
+    def finish(self, upload_id, target_path):
+        """Moves a complete upload to target_path and returns (info, sha256 hex digest)"""
+        try:
+            with self.lock:
+                info = self.get(upload_id)
+                if info is None:
+                    raise KeyError(upload_id)
+                if info["received"] != info["size"]:
+                    raise UploadOffsetError(info["received"])
+                digest = self.hasher(upload_id).hexdigest()
+                os.replace(self.partPath(upload_id), target_path)
+                os.remove(self.infoPath(upload_id))
+                self.hashers.pop(upload_id, None)
+            return info, digest
+        except (KeyError, UploadOffsetError):
+            raise
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def cleanup(self):
+        """Removes sessions abandoned for more than ttl seconds"""
+        now = time.time()
+        self.last_cleanup = now
+        for name in os.listdir(self.root_dir):
+            if name.endswith(".json"):
+                upload_id = name[:-len(".json")]
+                with self.lock:
+                    info = self.get(upload_id)
+                    if info is None:
+                        continue
+                    # A slow upload still receiving chunks is kept, whenever it was created
+                    part_path = self.partPath(upload_id)
+                    last_activity = max(info["created_at"], os.path.getmtime(part_path) if os.path.exists(part_path) else 0)
+                    if now - last_activity <= self.ttl:
+                        continue
+                    for path in (part_path, self.infoPath(upload_id)):
+                        if os.path.exists(path):
+                            os.remove(path)
+                    self.hashers.pop(upload_id, None)
+                logging.info(f"Upload session {upload_id} expired")
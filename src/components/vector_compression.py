@@ -0,0 +1,191 @@
+import os
+import sys
+import json
+import math
+
+import faiss
+import numpy as np
+from src.exception import CustomException
+from src.logger import logging
+
+COMPRESSION_FILE = "compression.json"
+VECTORS_FILE = "vectors.npy"
+
+def pq_subquantizers(dimension):
+    # About 8 dimensions per sub-quantizer, the count has to divide the dimension
+    target = max(1, dimension // 8)
+    for m in range(target, 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+class CompressedIndex():
+    """
+    Drop-in for the faiss index inside langchain's FAISS store. Vectors are searched in
+    compressed form (int8 scalar quantization, or IVF-PQ for large collections) and the best
+    `rescore` * k candidates are re-ranked with distances computed from float16 copies of the
+    vectors, half the size of the float32 ones an uncompressed store keeps. Both are
+    memory-mapped when loaded, so only the compressed codes and the pages of vectors actually
+    touched by rescoring end up in RAM.
+
+    merge_from accepts flat indexes and other CompressedIndex instances, their vectors are
+    encoded with this index's already trained quantizer.
+    """
+    def __init__(self, index, vectors, method, rescore=4, nprobe=16):
+        self.index = index
+        # Stores saved before float16 rescoring vectors existed load float32 ones, both work
+        self.vectors = vectors
+        self.method = method
+        self.rescore = rescore
+        self.nprobe = nprobe
+        self.metric_type = index.metric_type
+        if hasattr(index, "nprobe"):
+            index.nprobe = nprobe
+
+    @classmethod
+    def build(cls, vectors, method, metric_type=faiss.METRIC_L2, rescore=4, nprobe=16):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        count, dimension = vectors.shape
+        if method == "ivfpq":
+            nlist = max(1, min(int(4 * math.sqrt(count)), count // 39))
+            quantizer = faiss.IndexFlat(dimension, metric_type)
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_subquantizers(dimension), 8, metric_type)
+        elif method == "int8":
+            index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, metric_type)
+        else:
+            raise ValueError(f"Unknown vector compression {method}")
+        index.train(vectors)
+        index.add(vectors)
+        logging.info(f"Built {method} index over {count} vectors of dimension {dimension}")
+        return cls(index, vectors.astype(np.float16), method, rescore, nprobe)
+
+    @property
+    def ntotal(self):
+        return self.index.ntotal
+
+    @property
+    def d(self):
+        return self.index.d
+
+    def writable(self):
+        # Memory-mapped data is read only, it is copied into memory before the first change
+        if not self.vectors.flags.writeable:
+            self.vectors = np.array(self.vectors)
+            self.index = faiss.clone_index(self.index)
+            if hasattr(self.index, "nprobe"):
+                self.index.nprobe = self.nprobe
+
+    def search(self, queries, k):
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        candidates = min(self.ntotal, max(k, k * self.rescore))
+        distances = np.full((len(queries), k), np.inf if self.metric_type == faiss.METRIC_L2 else -np.inf, dtype=np.float32)
+        labels = np.full((len(queries), k), -1, dtype=np.int64)
+        if candidates == 0:
+            return distances, labels
+
+        _, found = self.index.search(queries, candidates)
+        for row, (query, ids) in enumerate(zip(queries, found)):
+            ids = ids[ids >= 0]
+            if len(ids) == 0:
+                continue
+            # Sorted ids read the memory-mapped vectors in file order
+            ids = np.sort(ids)
+            exact = self.vectors[ids].astype(np.float32)
+            if self.metric_type == faiss.METRIC_L2:
+                scores = ((exact - query) ** 2).sum(axis=1)
+                order = np.argsort(scores)[:k]
+            else:
+                scores = exact @ query
+                order = np.argsort(-scores)[:k]
+            distances[row, :len(order)] = scores[order]
+            labels[row, :len(order)] = ids[order]
+        return distances, labels
+
+    def reconstruct(self, i):
+        return np.array(self.vectors[i], dtype=np.float32)
+
+    def add(self, vectors):
+        self.writable()
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.vectors = np.concatenate([self.vectors, vectors.astype(self.vectors.dtype)])
+        self.index.add(vectors)
+
+    def remove_ids(self, ids):
+        # langchain's FAISS expects the remaining vectors to be renumbered 0..n-1 like a flat index,
+        # so the codes are rebuilt from the kept vectors with the already trained quantizer
+        self.writable()
+        keep = np.ones(self.ntotal, dtype=bool)
+        keep[np.asarray(ids, dtype=np.int64)] = False
+        self.vectors = np.ascontiguousarray(self.vectors[keep])
+        self.index.reset()
+        self.index.add(np.ascontiguousarray(self.vectors, dtype=np.float32))
+        return int((~keep).sum())
+
+    def merge_from(self, other, add_id=0):
+        # Like faiss, the other index's vectors are appended after ours; the ids stay sequential
+        if other.d != self.d:
+            raise ValueError(f"Cannot merge an index of dimension {other.d} into one of dimension {self.d}")
+        if other.metric_type != self.metric_type:
+            raise ValueError("Cannot merge indexes with different distance metrics")
+        if isinstance(other, CompressedIndex):
+            vectors = np.asarray(other.vectors, dtype=np.float32)
+        else:
+            vectors = other.reconstruct_n(0, other.ntotal)
+        if len(vectors):
+            self.add(vectors)
+
+    def memoryBytes(self):
+        """Bytes held in RAM: the compressed codes and quantizers, plus the rescoring vectors unless memory-mapped"""
+        size = self.ntotal * self.index.code_size
+        if self.method == "ivfpq":
+            # Inverted list ids, coarse centroids and the product quantizer's codebooks
+            size += self.ntotal * 8 + self.index.nlist * self.d * 4 + self.index.pq.centroids.size() * 4
+        return size if isinstance(self.vectors, np.memmap) else size + self.vectors.nbytes
+
+    def save(self, directory):
+        try:
+            # A loaded index maps these very files, they are written aside and swapped in
+            index_path = os.path.join(directory, "index.faiss")
+            vectors_path = os.path.join(directory, VECTORS_FILE)
+            faiss.write_index(self.index, index_path + ".tmp")
+            with open(vectors_path + ".tmp", "wb") as f:
+                np.save(f, self.vectors)
+            os.replace(index_path + ".tmp", index_path)
+            os.replace(vectors_path + ".tmp", vectors_path)
+            with open(os.path.join(directory, COMPRESSION_FILE), "w") as f:
+                json.dump({"method": self.method, "rescore": self.rescore, "nprobe": self.nprobe}, f)
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    @classmethod
+    def load(cls, directory):
+        """Returns the memory-mapped index saved in directory, or None for uncompressed stores"""
+        path = os.path.join(directory, COMPRESSION_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                config = json.load(f)
+            index = faiss.read_index(os.path.join(directory, "index.faiss"), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+            return cls(index, vectors, config["method"], config["rescore"], config["nprobe"])
+        except Exception as e:
+            raise CustomException(e, sys)
+
+def compress_store(db, method, rescore=4, nprobe=16, ivfpq_min_vectors=50000):
+    """
+    Replaces the flat index of a FAISS store with a CompressedIndex. method is "int8",
+    "ivfpq" or "auto" (IVF-PQ from ivfpq_min_vectors vectors on, int8 below). Other
+    stores and already compressed ones are returned unchanged.
+    """
+    if type(db).__name__ != "FAISS" or isinstance(db.index, CompressedIndex) or db.index.ntotal == 0:
+        return db
+    count = db.index.ntotal
+    if method == "auto":
+        method = "ivfpq" if count >= ivfpq_min_vectors else "int8"
+    if method == "ivfpq" and count < 256 * 39:
+        # PQ needs enough vectors to train its 256 centroids per sub-quantizer
+        method = "int8"
+    vectors = db.index.reconstruct_n(0, count)
+    db.index = CompressedIndex.build(vectors, method, db.index.metric_type, rescore, nprobe)
+    return db
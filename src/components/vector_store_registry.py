@@ -0,0 +1,348 @@
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+from src.exception import CustomException
+from src.logger import logging
+from src.utils import load_store, load_chunk_ids
+from src.components.data_transformation import PrecomputedEmbeddings
+from src.components.lexical_index import LexicalIndex
+from src.components.summary_index import SummaryIndex
+from src.components.table_store import TableStore
+from src.components.embedding_backends import create_embeddings
+from src.components.vector_compression import CompressedIndex, VECTORS_FILE
+
+class VectorStoreRegistry():
+    """
+    Named collections of vector stores persisted under root_dir/<collection_id>, each with a
+    collection.json manifest. Loaded stores are kept in an LRU and evicted once their combined
+    estimated memory footprint goes over memory_budget_mb: the size on disk, except that
+    compressed FAISS indexes count the bytes CompressedIndex.memoryBytes() reports.
+
+    root_dir/index.sqlite maps the content hash of the source file plus the pipeline settings
+    (pipeline_config, embedding model, store type) to the collection built from it, so identical
+    uploads reuse it. Least recently used collections are deleted from disk once all of them
+    together take more than disk_budget_mb. on_delete(collection_id) is called for every removal.
+    """
+    def __init__(self, root_dir, databases, embeddings, memory_budget_mb=2048, disk_budget_mb=None,
+                 pipeline_config=None, on_delete=None, embedding_backend="ollama", embedding_options=None):
+        try:
+            self.root_dir = root_dir
+            self.databases = databases
+            self.embeddings = embeddings
+            self.memory_budget = memory_budget_mb * 1024 * 1024
+            self.disk_budget = disk_budget_mb * 1024 * 1024 if disk_budget_mb else None
+            self.pipeline_config = pipeline_config or {}
+            self.embedding_backend = embedding_backend
+            self.embedding_options = embedding_options or {}
+            self.on_delete = on_delete
+            self.loaded = OrderedDict()
+            self.update_locks = {}
+            self.lock = threading.Lock()
+            os.makedirs(root_dir, exist_ok=True)
+
+            self.conn = sqlite3.connect(os.path.join(root_dir, "index.sqlite"), timeout=30,
+                                        check_same_thread=False, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS collections (
+                    collection_id TEXT PRIMARY KEY,
+                    index_key TEXT,
+                    size_bytes INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_collections_key ON collections (index_key)")
+            self.indexExisting()
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def indexKey(self, digest, extension):
+        if not digest:
+            return None
+        config = {
+            "sha256": digest,
+            "extension": extension,
+            "embedding_model": self.embeddings.get(extension),
+            "vector_db": self.databases.get(extension).__name__,
+            "embedding_backend": self.embedding_backend,
+            **self.pipeline_config
+        }
+        return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def indexExisting(self):
+        # Collections written before the index existed (or by a crashed process) are picked up here
+        known = {row[0] for row in self.conn.execute("SELECT collection_id FROM collections")}
+        for collection_id in os.listdir(self.root_dir):
+            if collection_id not in known:
+                manifest = self.manifest(collection_id)
+                if manifest is not None:
+                    self.indexCollection(manifest)
+
+    def indexCollection(self, manifest):
+        collection_id = manifest["collection_id"]
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO collections VALUES (?, ?, ?, ?)",
+                (collection_id, manifest.get("index_key"), self.diskSize(collection_id), time.time())
+            )
+
+    def path(self, collection_id):
+        return os.path.join(self.root_dir, collection_id)
+
+    def manifestPath(self, collection_id):
+        return os.path.join(self.path(collection_id), "collection.json")
+
+    def newCollection(self):
+        collection_id = str(uuid.uuid4())
+        return collection_id, self.path(collection_id)
+
+    def register(self, collection_id, filename, extension, stats=None, digest=None):
+        try:
+            previous = self.manifest(collection_id)
+            manifest = {
+                "collection_id": collection_id,
+                "filename": filename,
+                "file_name": f"{collection_id}{extension}",
+                "extension": extension,
+                "embedding_model": self.embeddings.get(extension),
+                "vector_db": self.databases.get(extension).__name__,
+                "created_at": previous["created_at"] if previous else time.time(),
+                "updated_at": time.time(),
+                "sha256": digest,
+                "index_key": self.indexKey(digest, extension),
+                "embedding_backend": self.embedding_backend,
+                "pipeline": self.pipeline_config,
+                "stats": stats or {}
+            }
+            self.writeManifest(collection_id, manifest)
+            self.indexCollection(manifest)
+            logging.info(f"Collection {collection_id} registered for {filename}")
+            self.enforceDiskBudget(keep=collection_id)
+            return manifest
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def writeManifest(self, collection_id, manifest):
+        os.makedirs(self.path(collection_id), exist_ok=True)
+        with open(self.manifestPath(collection_id), "w") as f:
+            json.dump(manifest, f)
+
+    def findByDigest(self, digest, extension):
+        """Returns the manifest of a collection built from an identical file with the same pipeline settings"""
+        index_key = self.indexKey(digest, extension)
+        if index_key is None:
+            return None
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT collection_id FROM collections WHERE index_key = ? ORDER BY last_used DESC", (index_key,)
+            ).fetchall()
+        for (collection_id,) in rows:
+            manifest = self.manifest(collection_id)
+            if manifest is not None:
+                self.touch(collection_id)
+                return manifest
+            self.forget(collection_id)
+        return None
+
+    def touch(self, collection_id):
+        with self.lock:
+            self.conn.execute("UPDATE collections SET last_used = ? WHERE collection_id = ?", (time.time(), collection_id))
+
+    def forget(self, collection_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM collections WHERE collection_id = ?", (collection_id,))
+
+    def enforceDiskBudget(self, keep=None):
+        if self.disk_budget is None:
+            return
+        with self.lock:
+            used = self.conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM collections").fetchone()[0]
+            candidates = self.conn.execute(
+                "SELECT collection_id, size_bytes FROM collections WHERE collection_id != ? ORDER BY last_used",
+                (keep or "",)
+            ).fetchall()
+        for collection_id, size in candidates:
+            if used <= self.disk_budget:
+                break
+            logging.info(f"Collection {collection_id} evicted from disk, {used / (1024**2):.1f}MB in use")
+            self.delete(collection_id)
+            used -= size
+
+    def manifest(self, collection_id):
+        # Ids come from clients, only accept plain names that map to a directory we created
+        if not collection_id or os.path.basename(collection_id) != collection_id:
+            return None
+        path = self.manifestPath(collection_id)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def chunkIds(self, collection_id):
+        return load_chunk_ids(self.path(collection_id))
+
+    def documentChunks(self, collection_id):
+        """Every chunk of a collection in document order, None if it has no lexical index to read them from"""
+        ids = self.chunkIds(collection_id)
+        lexical_index = self.lexicalIndex(collection_id)
+        if ids is None or lexical_index is None:
+            return None
+        return lexical_index.getDocuments(ids)
+
+    def diskSize(self, collection_id):
+        total = 0
+        for dirpath, _, filenames in os.walk(self.path(collection_id)):
+            for name in filenames:
+                total += os.path.getsize(os.path.join(dirpath, name))
+        return total
+
+    def memorySize(self, collection_id, db):
+        size = self.diskSize(collection_id)
+        index = getattr(db, "index", None)
+        if isinstance(index, CompressedIndex):
+            # The compressed index files are memory-mapped, only part of them is resident
+            for name in ("index.faiss", VECTORS_FILE):
+                path = os.path.join(self.path(collection_id), name)
+                if os.path.exists(path):
+                    size -= os.path.getsize(path)
+            size += index.memoryBytes()
+        return size
+
+    def put(self, collection_id, db, lexical_index=None):
+        if lexical_index is None:
+            lexical_index = LexicalIndex.load(self.path(collection_id))
+        entry = {
+            "db": db,
+            "size": self.memorySize(collection_id, db),
+            "lexical": lexical_index,
+            "summaries": SummaryIndex.load(self.path(collection_id)),
+            "tables": TableStore.load(self.path(collection_id))
+        }
+        with self.lock:
+            self.loaded[collection_id] = entry
+            self.loaded.move_to_end(collection_id)
+            self.evict()
+
+    def get(self, collection_id):
+        """Returns (db, manifest) or (None, None) if the collection does not exist"""
+        try:
+            manifest = self.manifest(collection_id)
+            if manifest is None:
+                return None, None
+            self.touch(collection_id)
+            with self.lock:
+                if collection_id in self.loaded:
+                    self.loaded.move_to_end(collection_id)
+                    return self.loaded[collection_id]["db"], manifest
+
+            extension = manifest["extension"]
+            # Wrapped so incremental updates can hand precomputed vectors to the loaded store
+            # Queries are embedded with the backend the collection was built with
+            backend = manifest.get("embedding_backend", "ollama")
+            options = self.embedding_options if backend == self.embedding_backend else {}
+            embedding = PrecomputedEmbeddings(create_embeddings(self.embeddings.get(extension), backend, **options))
+            db = load_store(self.databases.get(extension), self.path(collection_id), embedding)
+            logging.info(f"Collection {collection_id} loaded from disk")
+            self.put(collection_id, db)
+            return db, manifest
+        except Exception as e:
+            raise CustomException(e, sys)
+
+    def lexicalIndex(self, collection_id):
+        """BM25 index of a collection, None if it was built before lexical indexing existed"""
+        with self.lock:
+            if collection_id in self.loaded:
+                return self.loaded[collection_id]["lexical"]
+        if self.manifest(collection_id) is None:
+            return None
+        return LexicalIndex.load(self.path(collection_id))
+
+    def summaryIndex(self, collection_id):
+        """Ingest-time summaries of a collection, None if they were not generated"""
+        with self.lock:
+            if collection_id in self.loaded:
+                return self.loaded[collection_id]["summaries"]
+        if self.manifest(collection_id) is None:
+            return None
+        return SummaryIndex.load(self.path(collection_id))
+
+    def tableStore(self, collection_id):
+        """Raw tables of a .csv/.xlsx collection, None for other formats or row-per-document ingestion"""
+        with self.lock:
+            if collection_id in self.loaded:
+                return self.loaded[collection_id]["tables"]
+        if self.manifest(collection_id) is None:
+            return None
+        return TableStore.load(self.path(collection_id))
+
+    def setSummaryIndex(self, collection_id, summary_index):
+        """Stores new summaries for a collection, None removes stale ones"""
+        if summary_index is None:
+            SummaryIndex.remove(self.path(collection_id))
+        else:
+            summary_index.save(self.path(collection_id))
+        with self.lock:
+            if collection_id in self.loaded:
+                self.loaded[collection_id]["summaries"] = summary_index
+
+    def updateLock(self, collection_id):
+        """asyncio.Lock held while a collection is re-indexed, one update of a collection runs at a time"""
+        with self.lock:
+            if collection_id not in self.update_locks:
+                self.update_locks[collection_id] = asyncio.Lock()
+            return self.update_locks[collection_id]
+
+    def evict(self):
+        used = sum(entry["size"] for entry in self.loaded.values())
+        # Always keep the most recently used store, even if it alone is over budget
+        while used > self.memory_budget and len(self.loaded) > 1:
+            collection_id, entry = self.loaded.popitem(last=False)
+            used -= entry["size"]
+            logging.info(f"Collection {collection_id} evicted from memory")
+
+    def list(self):
+        collections = []
+        for collection_id in os.listdir(self.root_dir):
+            manifest = self.manifest(collection_id)
+            if manifest is not None:
+                manifest["loaded"] = collection_id in self.loaded
+                collections.append(manifest)
+        return sorted(collections, key=lambda m: m["created_at"], reverse=True)
+
+    def delete(self, collection_id):
+        if self.manifest(collection_id) is None:
+            self.forget(collection_id)
+            return False
+        with self.lock:
+            self.loaded.pop(collection_id, None)
+            self.update_locks.pop(collection_id, None)
+        shutil.rmtree(self.path(collection_id), ignore_errors=True)
+        self.forget(collection_id)
+        if self.on_delete is not None:
+            self.on_delete(collection_id)
+        logging.info(f"Collection {collection_id} deleted")
+        return True
+
+    def status(self):
+        with self.lock:
+            count, disk_used = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM collections").fetchone()
+            return {
+                "collections": count,
+                "loaded_collections": len(self.loaded),
+                "memory_used_mb": round(sum(entry["size"] for entry in self.loaded.values()) / (1024**2), 2),
+                "memory_budget_mb": round(self.memory_budget / (1024**2), 2),
+                "disk_used_mb": round(disk_used / (1024**2), 2),
+                "disk_budget_mb": round(self.disk_budget / (1024**2), 2) if self.disk_budget else None
+            }
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,84 @@
+import sys
+import asyncio
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from src.exception import CustomException
+from src.logger import logging
+from src.components.data_ingestion import DataIngestion
+
+class QueueFullError(Exception):
+    pass
+
+def load_documents(file_name, loaders, options):
+    # Runs inside a worker process. CustomException carries the sys module and
+    # cannot be pickled back to the parent, so hand back a plain error instead.
+    try:
+        return DataIngestion(file_name=file_name, loaders=loaders, **options).loadFile()
+    except Exception as e:
+        raise RuntimeError(str(e))
+
+class WorkerPool():
+    """
+    Keeps blocking ingestion work off the event loop: parsing runs in a process pool
+    (CPU bound), embedding and indexing run in a thread pool (waiting on the embedding server).
+    At most max_queue_depth uploads may be queued or running at the same time.
+    """
+    def __init__(self, process_workers=2, thread_workers=4, max_queue_depth=16):
+        self.process_workers = process_workers
+        self.thread_workers = thread_workers
+        self.max_queue_depth = max_queue_depth
+        self.process_pool = None
+        self.thread_pool = None
+        self.depth = 0
+        self.lock = threading.Lock()
+
+    def getProcessPool(self):
+        if self.process_pool is None:
+            self.process_pool = ProcessPoolExecutor(max_workers=self.process_workers)
+        return self.process_pool
+
+    def getThreadPool(self):
+        if self.thread_pool is None:
+            self.thread_pool = ThreadPoolExecutor(max_workers=self.thread_workers, thread_name_prefix="embed")
+        return self.thread_pool
+
+    @contextmanager
+    def reserve(self):
+        with self.lock:
+            if self.depth >= self.max_queue_depth:
+                raise QueueFullError(f"Too many files are being processed ({self.depth}). Try again later.")
+            self.depth += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.depth -= 1
+
+    async def parse(self, file_name, loaders, **options):
+        """options are passed on to DataIngestion, e.g. table_chunk_tokens"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.getProcessPool(), load_documents, file_name, loaders, options)
+
+    async def run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.getThreadPool(), fn, *args)
+
+    def status(self):
+        return {
+            "queue_depth": self.depth,
+            "max_queue_depth": self.max_queue_depth,
+            "process_workers": self.process_workers,
+            "thread_workers": self.thread_workers
+        }
+
+    def shutdown(self):
+        try:
+            if self.process_pool is not None:
+                self.process_pool.shutdown(wait=False, cancel_futures=True)
+            if self.thread_pool is not None:
+                self.thread_pool.shutdown(wait=False, cancel_futures=True)
+            logging.info("Worker pools shut down")
+        except Exception as e:
+            raise CustomException(e, sys)
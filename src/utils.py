@@ -1,8 +1,13 @@
 import magic
 import os
 import sys
+import re
+import json
+import pickle
+import hashlib
 
 from langchain_community.llms import Ollama
+from src.components.vector_compression import CompressedIndex
 
 def get_file_type(file_path):
     mime = magic.from_file(file_path, mime=True)
@@ -20,3 +25,121 @@ def get_file_type(file_path):
     else:
         return None
 
+def persist_kwargs(store, path):
+    # Extra arguments that make a vector store write itself to `path` while it is built
+    if path is None:
+        return {}
+    if store.__name__ == "Chroma":
+        return {"persist_directory": path}
+    if store.__name__ == "LanceDB":
+        return {"uri": path}
+    return {}
+
+def create_store(store, texts, embedding, metadatas, ids, path=None):
+    # LanceDB.from_texts cannot take ids, so it is created empty and filled with add_texts
+    if store.__name__ == "LanceDB":
+        db = store(embedding=embedding, **persist_kwargs(store, path))
+        db.add_texts(texts, metadatas=metadatas, ids=ids)
+        return db
+    return store.from_texts(texts=texts, embedding=embedding, metadatas=metadatas, ids=ids,
+                            **persist_kwargs(store, path))
+
+def save_store(db, path):
+    # Chroma and LanceDB already live on disk, FAISS has to be written out
+    if type(db).__name__ == "FAISS":
+        if not isinstance(db.index, CompressedIndex):
+            db.save_local(path)
+            return
+        # Same files as save_local, plus the full vectors next to the compressed index
+        os.makedirs(path, exist_ok=True)
+        db.index.save(path)
+        with open(os.path.join(path, "index.pkl"), "wb") as f:
+            pickle.dump((db.docstore, db.index_to_docstore_id), f)
+
+def load_store(store, path, embedding):
+    if store.__name__ == "FAISS":
+        index = CompressedIndex.load(path)
+        if index is None:
+            return store.load_local(path, embedding, allow_dangerous_deserialization=True)
+        with open(os.path.join(path, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return store(embedding_function=embedding, index=index, docstore=docstore, index_to_docstore_id=index_to_docstore_id)
+    if store.__name__ == "Chroma":
+        return store(persist_directory=path, embedding_function=embedding)
+    if store.__name__ == "LanceDB":
+        return store(uri=path, embedding=embedding)
+    return None
+
+CHUNK_IDS_FILE = "chunks.json"
+
+def chunk_id(text, occurrence=0):
+    # Content address of a chunk, repeated chunks in one document get an occurrence suffix
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return digest if occurrence == 0 else f"{digest}-{occurrence}"
+
+def save_chunk_ids(path, ids):
+    with open(os.path.join(path, CHUNK_IDS_FILE), "w") as f:
+        json.dump(ids, f)
+
+def load_chunk_ids(path):
+    file_path = os.path.join(path, CHUNK_IDS_FILE)
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path) as f:
+        return json.load(f)
+
+def filter_kwargs(db, metadata_filter, k, fetch_k):
+    """
+    Store specific arguments restricting a search to chunks whose metadata equals every
+    value in metadata_filter (a list value matches any of its items)
+    """
+    if not metadata_filter:
+        return {}
+    name = type(db).__name__
+    if name == "FAISS":
+        # FAISS filters after the search, so more candidates are fetched for the filter to pick from
+        return {"filter": metadata_filter, "fetch_k": max(fetch_k, k * 10)}
+    if name == "Chroma":
+        clauses = [
+            {key: {"$in": value} if isinstance(value, list) else value}
+            for key, value in metadata_filter.items()
+        ]
+        return {"filter": clauses[0] if len(clauses) == 1 else {"$and": clauses}}
+    if name == "LanceDB":
+        # The filter is a SQL predicate: keys must be plain field names and strings are quoted SQL literals
+        def literal(value):
+            if isinstance(value, str):
+                return "'" + value.replace("'", "''") + "'"
+            if isinstance(value, bool):
+                return "true" if value else "false"
+            if isinstance(value, (int, float)):
+                return str(value)
+            raise ValueError(f"Unsupported filter value {value!r}")
+        for key in metadata_filter:
+            if not re.fullmatch(r"\w+", str(key)):
+                raise ValueError(f"Invalid filter key {key!r}")
+        clauses = [
+            f"metadata.{key} IN ({', '.join(map(literal, value))})" if isinstance(value, list)
+            else f"metadata.{key} = {literal(value)}"
+            for key, value in metadata_filter.items()
+        ]
+        return {"filter": " AND ".join(clauses)}
+    return {"filter": metadata_filter}
+
+def relevance_search(db, embedding, k, **kwargs):
+    """Returns (document, relevance score in [0, 1]) pairs, higher is more similar"""
+    name = type(db).__name__
+    if name == "FAISS":
+        results = db.similarity_search_with_score_by_vector(embedding, k=k, **kwargs)
+    elif name == "LanceDB":
+        # Its *_with_relevance_scores variant drops the filter
+        results = db.similarity_search_by_vector(embedding, k, score=True, **kwargs)
+    else:
+        results = db.similarity_search_by_vector_with_relevance_scores(embedding, k=k, **kwargs)
+    # The stores above return distances, turned into relevance the same way langchain does
+    relevance = db._select_relevance_score_fn()
+    return [(doc, relevance(float(score))) for doc, score in results]
+
+def count_tokens(text):
+    # Rough estimate (about 4 characters per token for English) that needs no tokenizer
+    return (len(text) + 3) // 4
@@ -0,0 +1,26 @@
+import pytest
+
+from src.components.lexical_index import is_keyword_query
+
+@pytest.mark.parametrize("query", [
+    '"net revenue"',
+    "AX-0042",
+    "AX-0042 specs",
+    "invoice 2023",
+    "max_len default"
+])
+def test_lookups(query):
+    assert is_keyword_query(query)
+
+@pytest.mark.parametrize("query", [
+    "What is RAG?",
+    "Explain the TCP handshake",
+    "What happened in 1947?",
+    "Summarize the Q3 2023 results",
+    "summarize this file",
+    "Who wrote it",
+    "explain the conclusion",
+    "what item has part AX-0042?"
+])
+def test_questions(query):
+    assert not is_keyword_query(query)
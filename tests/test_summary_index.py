@@ -0,0 +1,24 @@
+import pytest
+
+from src.components.summary_index import is_summary_query
+
+@pytest.mark.parametrize("query", [
+    "Summarize this file",
+    "summarise page 3",
+    "Can you summarize the document?",
+    "Please give me a brief overview",
+    "Give an overview of chapter 2",
+    "tl;dr",
+    "What are the key points?"
+])
+def test_summarize_requests(query):
+    assert is_summary_query(query)
+
+@pytest.mark.parametrize("query", [
+    "What does the executive summary say about Q3 revenue?",
+    "Is there an overview table of the results?",
+    "Which key points did the auditor raise about inventory?",
+    "Who wrote the summary?"
+])
+def test_questions_mentioning_a_summary(query):
+    assert not is_summary_query(query)